@@ -0,0 +1,38 @@
+# backend/app/api/metrics.py
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from ..core.exchange_manager import exchange_pool
+from ..core.metrics import registry
+from ..core.screening_scheduler import screening_scheduler
+from ..core.security import verify_api_key
+from ..core.task_journal import task_journal
+from ..core.task_registry import task_registry
+from ..core.tracing import trace_store
+from ..logic.kline_store import kline_store
+from ..logic.market_data import market_data_cache
+from ..logic.order_events import order_event_hub
+from ..logic.position_book import position_book
+from ..logic.rate_limiter import shared_rate_limiter
+from ..logic.sim_exchange import simulated_venue
+
+router = APIRouter(tags=["Metrics"], dependencies=[Depends(verify_api_key)])
+
+# 各子系统已有的统计 (与 /api/status/* 相同的数据) 在导出时一并转为指标
+registry.register_stats('exchange_pool', "交易所连接池统计", exchange_pool.get_stats)
+registry.register_stats('rate_limiter', "共享限频器统计", shared_rate_limiter.get_stats)
+registry.register_stats('user_stream', "用户数据流统计", order_event_hub.get_stats)
+registry.register_stats('market_data', "行情推送缓存统计", market_data_cache.get_stats)
+registry.register_stats('position_book', "内存持仓簿统计", position_book.get_stats)
+registry.register_stats('kline_store', "本地K线仓库统计", kline_store.get_stats)
+registry.register_stats('screening', "再平衡筛选预计算统计", screening_scheduler.get_stats)
+registry.register_stats('sim_exchange', "离线模拟交易所统计", simulated_venue.get_stats)
+registry.register_stats('tracing', "执行追踪仓库统计", trace_store.get_stats)
+registry.register_stats('task_registry', "后台任务注册表统计", task_registry.get_stats)
+registry.register_stats('task_journal', "任务日志统计", task_journal.get_stats)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """以 Prometheus 文本格式导出全部指标 (交易所调用延迟、错误和重试、成交时间、任务耗时、WebSocket)"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
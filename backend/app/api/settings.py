@@ -9,6 +9,7 @@ from ..config.config import save_settings, COIN_LISTS_FILE, AVAILABLE_COINS, AVA
 from ..core.dependencies import get_settings_dependency
 from ..core.exchange_manager import get_exchange_dependency # 新增：导入交易所依赖
 from ..core.security import verify_api_key
+from ..logic.markets_cache import refresh_markets_for_unknown_symbol
 from ..logic.utils import resolve_full_symbol # 新增：导入符号解析工具
 from ..models.schemas import SettingsResponse, CoinPoolsUpdate, AddCoinRequest
 
@@ -71,8 +72,11 @@ async def add_new_coin_to_pool(
     if not coin_upper:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="币种代码不能为空。")
 
-    # 步骤1：校验币种是否存在于交易所
-    if not resolve_full_symbol(exchange, coin_upper):
+    # 步骤1：校验币种是否存在于交易所 (本地市场缓存中没有时刷新一次，兼容新上线的合约)
+    full_symbol = resolve_full_symbol(exchange, coin_upper)
+    if not full_symbol and await refresh_markets_for_unknown_symbol(exchange):
+        full_symbol = resolve_full_symbol(exchange, coin_upper)
+    if not full_symbol:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"在币安交易所中未找到币种 '{coin_upper}' 的有效交易对。"
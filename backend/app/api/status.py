@@ -1,12 +1,95 @@
 # backend/app/api/status.py
 from fastapi import APIRouter, Depends
 
+from ..core.exchange_manager import exchange_pool
+from ..core.screening_scheduler import screening_scheduler
 from ..core.security import verify_api_key
+from ..core.task_journal import task_journal
+from ..core.task_registry import task_registry
+from ..core.websocket_manager import manager as websocket_manager
+from ..core.work_scheduler import work_scheduler
 from ..core.trading_service import trading_service
+from ..logic.kline_store import kline_store
+from ..logic.market_data import market_data_cache
+from ..logic.order_events import order_event_hub
+from ..logic.position_book import position_book
+from ..logic.rate_limiter import shared_rate_limiter
+from ..logic.sim_exchange import simulated_venue
 
 router = APIRouter(prefix="/api", tags=["Status"], dependencies=[Depends(verify_api_key)])
 
 @router.get("/status")
 async def get_service_status():
     """获取后端交易服务的当前运行状态"""
-    return trading_service.get_current_status()
\ No newline at end of file
+    return trading_service.get_current_status()
+
+@router.get("/status/tasks")
+async def get_task_registry_stats():
+    """获取任务注册表的统计信息 (运行中的任务数、币种锁的争用和等待时间)"""
+    return task_registry.get_stats()
+
+
+@router.get("/status/task-journal")
+async def get_task_journal_stats():
+    """获取任务日志的统计信息 (写入批次、写入队列深度、重启后恢复的任务数)"""
+    return task_journal.get_stats()
+
+
+@router.get("/status/scheduler")
+async def get_work_scheduler_stats():
+    """获取工作调度器的状态 (各优先级类别的执行数、排队数和排队时间)"""
+    return work_scheduler.get_stats()
+
+
+@router.get("/status/websocket")
+async def get_websocket_stats():
+    """获取界面推送的状态 (各连接的待发送队列长度、丢弃的日志数、合并的进度消息数、断开的慢客户端数)"""
+    return websocket_manager.get_stats()
+
+
+@router.get("/status/exchange-pool")
+async def get_exchange_pool_stats():
+    """获取交易所连接池的统计信息 (命中、重建、在途请求等)"""
+    return exchange_pool.get_stats()
+
+
+@router.get("/status/user-stream")
+async def get_user_stream_stats():
+    """获取用户数据流 (订单推送) 的连接状态"""
+    return order_event_hub.get_stats()
+
+
+@router.get("/status/market-data")
+async def get_market_data_stats():
+    """获取行情推送缓存的状态 (订阅数量、命中率)"""
+    return market_data_cache.get_stats()
+
+
+@router.get("/status/position-book")
+async def get_position_book_stats():
+    """获取内存持仓簿的状态 (快照时间、增量事件数、对账漂移)"""
+    return position_book.get_stats()
+
+
+@router.get("/status/rate-limit")
+async def get_rate_limit_stats():
+    """获取共享限频器的状态 (本分钟已用权重、下单计数、排队深度)"""
+    return shared_rate_limiter.get_stats()
+
+
+@router.get("/status/kline-store")
+async def get_kline_store_stats():
+    """获取本地K线仓库的统计信息 (命中、增量下载、全量下载)"""
+    return kline_store.get_stats()
+
+
+@router.get("/status/screening")
+async def get_screening_stats():
+    """获取再平衡筛选预计算的状态 (数据时间、预计算条件数、命中次数)"""
+    return screening_scheduler.get_stats()
+
+
+@router.get("/status/sim-exchange")
+async def get_sim_exchange_stats():
+    """获取离线模拟交易所的统计信息 (请求数、成交、部分成交、注入的限频错误)"""
+    return simulated_venue.get_stats()
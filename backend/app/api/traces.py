@@ -0,0 +1,32 @@
+# backend/app/api/traces.py
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from ..core.security import verify_api_key
+from ..core.tracing import trace_store
+
+router = APIRouter(prefix="/api", tags=["Traces"], dependencies=[Depends(verify_api_key)])
+
+
+@router.get("/traces")
+async def list_traces(limit: int = Query(10, ge=1, le=50)):
+    """最近 limit 个后台任务的追踪摘要 (条目数、各结果计数、最慢的条目)，最新的在前"""
+    return [task.summary() for task in trace_store.recent_tasks(limit)]
+
+
+@router.get("/traces/phases")
+async def get_phase_breakdown(limit: int = Query(10, ge=1, le=50),
+                              kind: Optional[str] = Query(None, pattern="^(open|close)$")):
+    """最近 limit 个任务中各执行阶段耗时的分位数 (p50/p90/p99)，可按开仓/平仓过滤"""
+    return trace_store.phase_breakdown(limit, kind)
+
+
+@router.get("/traces/{task_id}")
+async def get_task_traces(task_id: str, symbol: Optional[str] = None):
+    """单个任务的完整时间线：每个计划条目的各阶段 (单调时钟时间戳、偏移、耗时)"""
+    task = trace_store.get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"追踪 {task_id} 不存在或已被淘汰。")
+    traces = [t for t in task.traces if not symbol or t.symbol.upper().startswith(symbol.upper())]
+    return {**task.summary(), 'items': [trace.to_dict() for trace in traces]}
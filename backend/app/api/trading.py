@@ -1,4 +1,6 @@
 # backend/app/api/trading.py (最终完整版)
+from typing import Optional
+
 from fastapi import APIRouter, BackgroundTasks, Depends
 
 from ..core.security import verify_api_key
@@ -13,9 +15,10 @@ def start_trading_task(plan: TradePlanRequest, background_tasks: BackgroundTasks
     return trading_service.start_trading(plan, background_tasks)
 
 @router.post("/stop")
-async def stop_trading_task():
-    print("--- 📢 API HIT: /api/trading/stop ---")
-    return await trading_service.stop_trading()
+async def stop_trading_task(task_id: Optional[str] = None):
+    """停止指定的任务 (task_id 由启动接口返回)；不带 task_id 时停止全部运行中的任务。"""
+    print(f"--- 📢 API HIT: /api/trading/stop (task_id={task_id}) ---")
+    return await trading_service.stop_trading(task_id)
 
 @router.post("/sync-sltp")
 def sync_sltp_task(settings: SyncSltpRequest, background_tasks: BackgroundTasks):
@@ -13,6 +13,7 @@ else:
 
 USER_SETTINGS_FILE = _PROJECT_ROOT / 'user_settings.json'
 COIN_LISTS_FILE = _PROJECT_ROOT / 'coin_lists.json'
+CACHE_DIR = _PROJECT_ROOT / 'cache'
 # --- 路径定义结束 ---
 
 STABLECOIN_PREFERENCE = ['USDC', 'USDT']
@@ -49,6 +50,36 @@ DEFAULT_CONFIG: Dict[str, Any] = {
     # --- 新增配置项 ---
     'rebalance_volume_ma_days': 20,  # 计算成交量均线的天数
     'rebalance_volume_spike_ratio': 3.0,  # 成交量放大过滤倍数
+    'rebalance_benchmark': 'BTC',  # 相对强度基准：单个币种或逗号分隔的等权篮子，如 BTC,ETH
+    'sltp_sync_mode': 'reconcile',  # reconcile: 只改动与目标不一致的SL/TP挂单; replace: 全部撤销后重下
+    'markets_cache_dir': '',  # 市场信息缓存目录，留空则使用项目根目录下的 cache/
+    'markets_cache_max_age_seconds': 6 * 3600,  # 市场信息缓存的最大有效期，过期后在后台刷新
+    'market_data_idle_seconds': 1800,  # 行情推送中超过该时长未被使用、且没有持仓的交易对会被取消订阅
+    'kline_cache_dir': '',  # K线仓库目录，留空则使用项目根目录下的 cache/
+    'kline_cache_ttl_seconds': 300,  # K线仓库在此时间内更新过则直接使用本地数据，不再请求交易所
+    'sweep_max_workers': 0,  # 参数扫描的进程数，0 表示使用全部 CPU 核心
+    'sweep_max_combinations': 500,  # 单次参数扫描允许的最大组合数
+    'exchange_mode': 'live',  # live: 连接币安; simulated: 使用离线模拟交易所 (压测/性能分析，切换后需重启服务)
+    'sim_seed': 42,  # 模拟交易所的随机种子，修改后模拟账户 (持仓、订单) 重置
+    'sim_latency_ms': 50,  # 模拟交易所每个请求的平均延迟 (毫秒)
+    'sim_latency_jitter_ms': 20,  # 请求延迟的标准差 (毫秒)
+    'sim_fill_probability': 0.2,  # 未被价格穿过的挂单每秒成交的概率
+    'sim_partial_fill_probability': 0.3,  # 挂单成交时只部分成交的概率
+    'sim_rate_limit_error_rate': 0.0,  # 请求被限频 (HTTP 429) 拒绝的概率
+    'sim_volatility_multiplier': 1.0,  # 盘口价格波动率相对于日线波动率的倍数
+    'adaptive_concurrency': True,  # 按交易所延迟和限频错误自动调整任务并发数；关闭时固定为开仓 5、平仓 10
+    'open_concurrency_min': 2,  # 开仓类任务 (自动开仓、再平衡) 的并发下限
+    'open_concurrency_max': 20,  # 开仓类任务的并发上限
+    'close_concurrency_min': 2,  # 平仓类任务 (平仓、同步SL/TP) 的并发下限
+    'close_concurrency_max': 30,  # 平仓类任务的并发上限
+    'concurrency_latency_target_ms': 1500,  # 交易所调用的平均延迟超过该值时停止增加并发
+    'task_journal_dir': '',  # 任务日志 (SQLite) 目录，留空则使用项目根目录下的 cache/
+    'resume_tasks_on_startup': True,  # 启动时按任务日志与交易所对账，继续执行上次未完成的开仓/再平衡子项
+    'task_resume_max_age_seconds': 6 * 3600,  # 超过该时间未更新的未完成任务不再恢复 (计划已过时)
+    'websocket_log_queue_size': 500,  # 每个界面连接待发送日志的上限
+    'websocket_event_queue_size': 200,  # 每个界面连接待发送事件 (进度/状态按任务合并为最新一条) 的上限，超过时断开该连接
+    'websocket_overflow_policy': 'drop_oldest',  # 日志队列满时: drop_oldest 丢弃最旧的日志; disconnect 断开该连接 (界面会自动重连)
+    'websocket_send_timeout_seconds': 10,  # 单条消息发送超过该时间的连接视为卡住并断开
 }
 
 # 内存中全局变量
@@ -85,6 +116,17 @@ def load_coin_lists() -> None:
             print(f"--- [ERROR] Failed to decode JSON from {COIN_LISTS_FILE}: {e} ---")
 
 
+def get_cache_dir(settings: Dict[str, Any], key: str) -> Path:
+    """返回配置项 key 指定的缓存目录，未配置时使用默认的 CACHE_DIR。"""
+    configured = settings.get(key)
+    return Path(configured) if configured else CACHE_DIR
+
+
+def is_simulated_exchange(settings: Dict[str, Any]) -> bool:
+    """是否使用离线模拟交易所 (不需要 API Key，也不连接币安的数据流)。"""
+    return settings.get('exchange_mode') == 'simulated'
+
+
 def load_settings() -> Dict[str, Any]:
     """
     加载用户配置，如果不存在则使用默认值。
@@ -0,0 +1,166 @@
+# backend/app/core/adaptive_concurrency.py
+import asyncio
+import contextvars
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import ccxt.async_support as ccxt
+
+from .metrics import add_call_listener, registry
+
+# 交易所过载的信号：触发并发上限的乘性下降
+_OVERLOAD_ERRORS = (ccxt.DDoSProtection, ccxt.RequestTimeout, ccxt.ExchangeNotAvailable)
+# 计入错误率的异常 (其余如 post-only 被拒、余额不足属于业务结果，不反映交易所的负载)
+_UNHEALTHY_ERRORS = (ccxt.NetworkError,)
+
+_EWMA_ALPHA = 0.2
+# 错误率 (指数加权) 超过该值时暂停增长
+_MAX_HEALTHY_ERROR_RATE = 0.05
+# 两次下降之间的最小间隔：同一批在途请求往往同时失败，只按一次过载处理
+_DECREASE_COOLDOWN_SECONDS = 2.0
+
+concurrency_limit_gauge = registry.gauge(
+    'task_concurrency_limit', "后台任务当前的并发上限 (自适应调整)", ('task',))
+concurrency_in_flight_gauge = registry.gauge(
+    'task_concurrency_in_flight', "后台任务正在执行的子项数", ('task',))
+concurrency_adjustments = registry.counter(
+    'task_concurrency_adjustments_total', "并发上限的调整次数", ('task', 'direction'))
+
+_current_limiter: contextvars.ContextVar[Optional['AdaptiveConcurrencyLimiter']] = contextvars.ContextVar(
+    'concurrency_limiter', default=None)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 并发控制，替代固定大小的信号量：
+    - 有子项排队、交易所调用的延迟和错误率都正常时，每完成一次调用上限增加 1/上限 (约每轮在途请求 +1)；
+    - 遇到限频 (DDoSProtection/RateLimitExceeded)、超时或交易所不可用时上限减半；
+    - 上限始终在 [min_limit, max_limit] 内，adaptive=False 时固定为初始值。
+    调用信号来自 metrics 中的交易所埋点，按 contextvars 归属到发起调用的子项所在的限制器。
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int, latency_target: float = 1.5,
+                 adaptive: bool = True, backoff: float = 0.5):
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.adaptive = adaptive
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._latency_ewma: Optional[float] = None
+        self._error_ewma = 0.0
+        self._last_decrease = float('-inf')
+        self._stats = {"increases": 0, "decreases": 0, "overload_errors": 0, "calls": 0,
+                       "peak_limit": self.limit, "lowest_limit": self.limit}
+        concurrency_limit_gauge.set(self.limit, name)
+
+    @classmethod
+    def fixed(cls, name: str, limit: int) -> 'AdaptiveConcurrencyLimiter':
+        return cls(name, limit, limit, limit, adaptive=False)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    # --- 名额 ---
+    async def acquire(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self._take()
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已分配但任务被取消，归还给下一个等待者
+                self.release()
+            elif waiter in self._waiters:
+                # 已被取消的等待者也可能先被 _wake 弹出
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        concurrency_in_flight_gauge.set(self.in_flight, self.name)
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def _take(self):
+        self.in_flight += 1
+        concurrency_in_flight_gauge.set(self.in_flight, self.name)
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._take()
+                waiter.set_result(None)
+
+    # --- 调整 ---
+    def bind(self):
+        """把本限制器设为当前 asyncio 任务 (一个子项) 的调用信号接收者。"""
+        _current_limiter.set(self)
+
+    def on_call(self, duration: float, error: Optional[BaseException]):
+        self._stats["calls"] += 1
+        if not self.adaptive:
+            return
+        self._latency_ewma = duration if self._latency_ewma is None else (
+            _EWMA_ALPHA * duration + (1 - _EWMA_ALPHA) * self._latency_ewma)
+        self._error_ewma = _EWMA_ALPHA * isinstance(error, _UNHEALTHY_ERRORS) + (1 - _EWMA_ALPHA) * self._error_ewma
+        if isinstance(error, _OVERLOAD_ERRORS):
+            self._stats["overload_errors"] += 1
+            self._decrease()
+        elif error is None and self._waiters and self._healthy():
+            self._set_limit(self._limit + 1 / self._limit, 'up')
+
+    def _healthy(self) -> bool:
+        return self._latency_ewma <= self.latency_target and self._error_ewma <= _MAX_HEALTHY_ERROR_RATE
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < _DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self._set_limit(self._limit * self.backoff, 'down')
+
+    def _set_limit(self, value: float, direction: str):
+        previous = self.limit
+        self._limit = min(max(value, self.min_limit), self.max_limit)
+        if self.limit == previous:
+            return
+        self._stats["increases" if direction == 'up' else "decreases"] += 1
+        self._stats["peak_limit"] = max(self._stats["peak_limit"], self.limit)
+        self._stats["lowest_limit"] = min(self._stats["lowest_limit"], self.limit)
+        concurrency_adjustments.inc(self.name, direction)
+        concurrency_limit_gauge.set(self.limit, self.name)
+        if direction == 'up':
+            self._wake()
+        # 下降时不打断在途子项，完成后按新上限放行
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats, "limit": self.limit, "in_flight": self.in_flight, "waiting": len(self._waiters),
+            "latency_ewma_ms": None if self._latency_ewma is None else round(self._latency_ewma * 1000, 1),
+            "error_rate_ewma": round(self._error_ewma, 4), "adaptive": self.adaptive,
+        }
+
+
+def _observe_call(method: str, duration: float, error: Optional[BaseException]):
+    limiter = _current_limiter.get()
+    if limiter is not None:
+        limiter.on_call(duration, error)
+
+
+add_call_listener(_observe_call)
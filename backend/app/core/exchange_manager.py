@@ -1,48 +1,234 @@
-# backend/app/core/exchange_manager.py (最终健壮版)
+# backend/app/core/exchange_manager.py (连接池版)
 import asyncio
 import contextlib
+import ssl
+import time
+from typing import Any, Dict, Optional, Tuple
 
-from ..config.config import load_settings
+import aiohttp
+import certifi
+import ccxt.async_support as ccxt
+
+from .metrics import instrument_exchange
+from ..config.config import is_simulated_exchange, load_settings
 from ..logic.exchange_logic_async import initialize_exchange_async
+from ..logic.markets_cache import refresh_markets_if_stale
+from ..logic.sim_exchange import initialize_simulated_exchange_async
+
+# 决定是否需要重建客户端的配置项，其余配置变化不影响已建立的连接
+_FINGERPRINT_KEYS = ('api_key', 'api_secret', 'use_testnet', 'enable_proxy', 'proxy_url', 'exchange_mode', 'sim_seed',
+                     'sim_latency_ms', 'sim_latency_jitter_ms', 'sim_fill_probability', 'sim_partial_fill_probability',
+                     'sim_rate_limit_error_rate', 'sim_volatility_multiplier')
+
+
+def _settings_fingerprint(settings: Dict[str, Any]) -> Tuple:
+    return tuple(settings.get(key) for key in _FINGERPRINT_KEYS)
+
+
+class _PooledClient:
+    """池中的一个 ccxt 实例及其租用计数。"""
+
+    def __init__(self, exchange: ccxt.binanceusdm, fingerprint: Tuple):
+        self.exchange = exchange
+        self.fingerprint = fingerprint
+        self.leases = 0
+        self.created_at = time.time()
+        self.retired = False
+
+
+class ExchangePool:
+    """
+    进程级的交易所客户端池。
+    所有 HTTP 请求和后台任务共享同一个已加载市场的 ccxt 实例和同一个 aiohttp 连接器 (keep-alive)，
+    只有当 api_key / use_testnet / 代理 配置变化或健康检查连续失败时才重建。
+    """
+
+    def __init__(self, health_check_interval: float = 60.0, max_health_failures: int = 3):
+        self._client: Optional[_PooledClient] = None
+        self._retired: list[_PooledClient] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._build_lock: Optional[asyncio.Lock] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._health_check_interval = health_check_interval
+        self._max_health_failures = max_health_failures
+        self._health_failures = 0
+        self._stats = {"hits": 0, "builds": 0, "rebuilds": 0, "build_errors": 0, "health_failures": 0}
+
+    # --- 生命周期 ---
+    async def start(self):
+        self._ensure_session()
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_check_loop())
+
+    async def warm_up(self):
+        """启动时预先建立客户端 (优先使用本地市场缓存)，让首个请求无需等待。"""
+        try:
+            async with self.acquire():
+                pass
+        except Exception as e:
+            print(f"--- [WARNING] 预热交易所客户端失败，将在首次请求时重试: {e} ---")
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._health_task
+            self._health_task = None
+        clients = self._retired + ([self._client] if self._client else [])
+        self._client, self._retired = None, []
+        for client in clients:
+            await self._close_client(client)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+                limit=100,
+                keepalive_timeout=60,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
 
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """共享的 aiohttp 会话，也供 WebSocket 数据流等子系统复用。"""
+        return self._ensure_session()
+
+    # --- 租用 ---
+    async def _get_client(self, timeout: float) -> _PooledClient:
+        settings = load_settings()
+        fingerprint = _settings_fingerprint(settings)
+        client = self._client
+        if client and client.fingerprint == fingerprint and not client.retired:
+            self._stats["hits"] += 1
+            return client
+
+        if self._build_lock is None:
+            self._build_lock = asyncio.Lock()
+        async with self._build_lock:
+            client = self._client
+            if client and client.fingerprint == fingerprint and not client.retired:
+                self._stats["hits"] += 1
+                return client
+
+            new_client = await self._build_client(settings, fingerprint, timeout)
+            if client is not None:
+                self._stats["rebuilds"] += 1
+                print("--- [INFO] 交易所配置已变化或连接不健康，交易所客户端已重建。 ---")
+                self._retire(client)
+            self._client = new_client
+            self._health_failures = 0
+            return new_client
+
+    async def _build_client(self, settings: Dict[str, Any], fingerprint: Tuple, timeout: float) -> _PooledClient:
+        if is_simulated_exchange(settings):
+            # 模拟交易所在进程内运行，不经过共享限频器和连接池会话
+            exchange = await initialize_simulated_exchange_async(settings)
+            self._stats["builds"] += 1
+            return _PooledClient(instrument_exchange(exchange), fingerprint)
+        try:
+            exchange = await asyncio.wait_for(
+                initialize_exchange_async(
+                    api_key=settings.get('api_key'),
+                    api_secret=settings.get('api_secret'),
+                    use_testnet=settings.get('use_testnet'),
+                    enable_proxy=settings.get('enable_proxy'),
+                    proxy_url=settings.get('proxy_url'),
+                    session=self._ensure_session()
+                ),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            self._stats["build_errors"] += 1
+            print(f"--- ❌ FATAL: 获取交易所连接在 {timeout} 秒内超时！请检查API Key/Secret、网络或代理设置。---")
+            raise ConnectionAbortedError(f"获取交易所连接超时 ({timeout}s)")
+        except Exception as e:
+            self._stats["build_errors"] += 1
+            print(f"--- ❌ FATAL: 初始化交易所时发生未知错误: {e} ---")
+            raise
+        self._stats["builds"] += 1
+        return _PooledClient(instrument_exchange(exchange), fingerprint)
+
+    def _retire(self, client: _PooledClient):
+        """旧实例在所有租用方归还后再关闭，避免中断正在进行的请求。"""
+        client.retired = True
+        if client.leases == 0:
+            asyncio.create_task(self._close_client(client))
+        else:
+            self._retired.append(client)
+
+    async def _release(self, client: _PooledClient):
+        client.leases -= 1
+        if client.retired and client.leases == 0 and client in self._retired:
+            self._retired.remove(client)
+            await self._close_client(client)
+
+    @staticmethod
+    async def _close_client(client: _PooledClient):
+        try:
+            await client.exchange.close()
+        except Exception as e:
+            print(f"--- [WARNING] 关闭交易所客户端时出错: {e} ---")
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, timeout: float = 20):
+        client = await self._get_client(timeout)
+        client.leases += 1
+        try:
+            yield client.exchange
+        finally:
+            await self._release(client)
+
+    def invalidate(self):
+        """将当前实例标记为失效，下一次租用时重建。"""
+        if self._client is not None:
+            self._client.retired = True
+
+    # --- 健康检查 ---
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self._health_check_interval)
+            client = self._client
+            if client is None:
+                continue
+            try:
+                await client.exchange.fetch_time()
+                self._health_failures = 0
+                refresh_markets_if_stale(client.exchange)
+            except Exception as e:
+                self._health_failures += 1
+                self._stats["health_failures"] += 1
+                print(f"--- [WARNING] 交易所健康检查失败 ({self._health_failures}/{self._max_health_failures}): {e} ---")
+                if self._health_failures >= self._max_health_failures and client is self._client:
+                    self.invalidate()
+                    self._health_failures = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        client = self._client
+        return {
+            **self._stats,
+            "in_flight": (client.leases if client else 0) + sum(c.leases for c in self._retired),
+            "retired_pending_close": len(self._retired),
+            "client_age_seconds": round(time.time() - client.created_at, 1) if client else None,
+            "healthy": client is not None and self._health_failures == 0,
+        }
+
+
+exchange_pool = ExchangePool()
 
-# --- 核心修改在这里 ---
-async def get_exchange_with_timeout(timeout=20):
-    """获取交易所实例，并设置一个总的连接和加载市场的超时。"""
-    settings = load_settings()
-    try:
-        # 将整个初始化过程包裹在 asyncio.wait_for 中
-        exchange = await asyncio.wait_for(
-            initialize_exchange_async(
-                api_key=settings.get('api_key'),
-                api_secret=settings.get('api_secret'),
-                use_testnet=settings.get('use_testnet'),
-                enable_proxy=settings.get('enable_proxy'),
-                proxy_url=settings.get('proxy_url')
-            ),
-            timeout=timeout
-        )
-        return exchange
-    except asyncio.TimeoutError:
-        print(f"--- ❌ FATAL: 获取交易所连接在 {timeout} 秒内超时！请检查API Key/Secret、网络或代理设置。---")
-        raise ConnectionAbortedError(f"获取交易所连接超时 ({timeout}s)")
-    except Exception as e:
-        print(f"--- ❌ FATAL: 初始化交易所时发生未知错误: {e} ---")
-        raise
 
 async def get_exchange_dependency():
-    """FastAPI 依赖项"""
-    exchange = await get_exchange_with_timeout()
-    try:
+    """FastAPI 依赖项：从连接池租用共享实例。"""
+    async with exchange_pool.acquire() as exchange:
         yield exchange
-    finally:
-        await exchange.close()
+
 
 @contextlib.asynccontextmanager
 async def get_exchange_for_task():
-    """为后台任务提供一个安全的交易所实例上下文。"""
-    exchange = await get_exchange_with_timeout()
-    try:
+    """为后台任务提供一个共享交易所实例的租用上下文。"""
+    async with exchange_pool.acquire() as exchange:
         yield exchange
-    finally:
-        await exchange.close()
\ No newline at end of file
@@ -0,0 +1,136 @@
+# backend/app/core/market_stream.py
+import asyncio
+import contextlib
+import json
+from typing import List, Optional
+
+import aiohttp
+
+from .exchange_manager import exchange_pool
+from ..config.config import load_settings
+from ..logic.market_data import MarketDataCache, market_data_cache
+from ..logic.position_book import position_book
+
+MAINNET_STREAM_URL = "wss://fstream.binance.com/stream"
+TESTNET_STREAM_URL = "wss://stream.binancefuture.com/stream"
+# 币安限制每条订阅消息的参数数量和每秒的消息数，这里保守地分批发送
+_SUBSCRIBE_BATCH_SIZE = 100
+_SUBSCRIBE_INTERVAL = 0.25
+# 清理闲置订阅的间隔
+_PRUNE_INTERVAL = 300.0
+
+
+def _stream_names(market_ids: List[str]) -> List[str]:
+    names = []
+    for market_id in market_ids:
+        lower = market_id.lower()
+        names.extend([f"{lower}@bookTicker", f"{lower}@markPrice@1s"])
+    return names
+
+
+class MarketDataStream:
+    """
+    维护币安合约的组合行情流 (combined streams)，把 bookTicker / markPrice 推送写入 MarketDataCache。
+    cache.track() 新增的交易对会在已建立的连接上动态 SUBSCRIBE，断线重连时重新订阅全部交易对；
+    定期取消订阅长时间未被使用、也没有持仓的交易对，订阅集合不会随运行时间无限增长。
+    """
+
+    def __init__(self, cache: MarketDataCache, stream_url: Optional[str] = None, reconnect_delay: float = 5.0,
+                 max_reconnect_delay: float = 60.0):
+        self._cache = cache
+        self._stream_url = stream_url
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._task: Optional[asyncio.Task] = None
+        self._prune_task: Optional[asyncio.Task] = None
+        self._pending: Optional[asyncio.Queue] = None
+        self._request_id = 0
+        cache.on_track(self._on_track)
+        cache.on_untrack(self._on_untrack)
+
+    def _on_track(self, market_ids: List[str]):
+        if self._pending is not None:
+            self._pending.put_nowait(("SUBSCRIBE", market_ids))
+
+    def _on_untrack(self, market_ids: List[str]):
+        if self._pending is not None:
+            self._pending.put_nowait(("UNSUBSCRIBE", market_ids))
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._pending = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+            self._prune_task = asyncio.create_task(self._prune_loop())
+
+    async def stop(self):
+        for task in (self._task, self._prune_task):
+            if task:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        self._task = self._prune_task = None
+        self._cache.set_connected(False)
+
+    async def _subscribe(self, ws: aiohttp.ClientWebSocketResponse, market_ids: List[str],
+                         method: str = "SUBSCRIBE"):
+        names = _stream_names(market_ids)
+        for i in range(0, len(names), _SUBSCRIBE_BATCH_SIZE):
+            self._request_id += 1
+            await ws.send_str(json.dumps(
+                {"method": method, "params": names[i:i + _SUBSCRIBE_BATCH_SIZE], "id": self._request_id}))
+            await asyncio.sleep(_SUBSCRIBE_INTERVAL)
+
+    async def _subscription_loop(self, ws: aiohttp.ClientWebSocketResponse):
+        while True:
+            method, market_ids = await self._pending.get()
+            await self._subscribe(ws, market_ids, method)
+
+    async def _prune_loop(self):
+        """定期取消订阅闲置的交易对；持仓簿有快照时，当前持仓的交易对始终保留。"""
+        while True:
+            await asyncio.sleep(_PRUNE_INTERVAL)
+            idle_seconds = float(load_settings().get('market_data_idle_seconds', 1800))
+            removed = self._cache.prune(position_book.held_market_ids(), idle_seconds)
+            if removed:
+                print(f"--- [INFO] 行情推送取消订阅 {len(removed)} 个闲置交易对。 ---")
+
+    async def _run(self):
+        delay = self._reconnect_delay
+        while True:
+            settings = load_settings()
+            url = self._stream_url or (TESTNET_STREAM_URL if settings.get('use_testnet') else MAINNET_STREAM_URL)
+            proxy = settings.get('proxy_url') if settings.get('enable_proxy') else None
+            subscription_task = None
+            try:
+                async with exchange_pool.session.ws_connect(url, heartbeat=60, proxy=proxy) as ws:
+                    # 重连后之前排队的增量订阅已包含在全量订阅中
+                    while not self._pending.empty():
+                        self._pending.get_nowait()
+                    tracked = sorted(self._cache.tracked)
+                    if tracked:
+                        await self._subscribe(ws, tracked)
+                    self._cache.set_connected(True)
+                    delay = self._reconnect_delay
+                    subscription_task = asyncio.create_task(self._subscription_loop(ws))
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            if msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                                break
+                            continue
+                        payload = json.loads(msg.data)
+                        data = payload.get('data')
+                        if data:
+                            self._cache.handle_event(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"--- [WARNING] 行情数据流连接异常，{delay:.0f} 秒后重连: {e} ---")
+            finally:
+                self._cache.set_connected(False)
+                if subscription_task:
+                    subscription_task.cancel()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_reconnect_delay)
+
+
+market_data_stream = MarketDataStream(market_data_cache)
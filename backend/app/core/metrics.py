@@ -0,0 +1,326 @@
+# backend/app/core/metrics.py
+import bisect
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 延迟类直方图的默认桶 (秒)：覆盖本地处理 (毫秒级) 到交易所慢请求和限频等待 (数十秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 任务/成交等待类直方图的桶 (秒)
+DURATION_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# 采集回调返回的样本：(指标名, 类型, 说明, [(标签, 值), ...])
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def _child(self, labels: Tuple[str, ...]):
+        child = self._children.get(labels)
+        if child is None:
+            if len(labels) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际传入 {labels}")
+            child = self._children[labels] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, child in sorted(self._children.items()):
+            lines.extend(self._render_child(labels, child))
+        return lines
+
+    def _render_child(self, labels: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child[0])}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数器。标签值按位置传入: counter.inc('fetch_order', 'NetworkError')。"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return [0.0]
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._child(labels)[0] += amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return [0.0]
+
+    def set(self, value: float, *labels: str):
+        self._child(labels)[0] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._child(labels)[0] += amount
+
+
+class _HistogramChild:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """
+    固定桶的直方图。observe() 只做一次二分查找和三次加法，适合放在每次交易所调用的路径上；
+    累积计数在导出时才计算。
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(len(self.buckets) + 1)
+
+    def observe(self, value: float, *labels: str):
+        child = self._child(labels)
+        child.counts[bisect.bisect_left(self.buckets, value)] += 1
+        child.sum += value
+        child.count += 1
+
+    def time(self, *labels: str) -> '_Timer':
+        return _Timer(self, labels)
+
+    def _render_child(self, labels: Tuple[str, ...], child: _HistogramChild) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{label_text} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{label_text} {child.count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('_histogram', '_labels', '_started')
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表，以 Prometheus 文本格式 (0.0.4) 导出。
+    除了直接埋点的指标，还可以注册采集回调，在导出时把各子系统已有的 get_stats() 转成指标。
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"指标 {metric.name} 已以不同的类型或标签注册")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def register_stats(self, prefix: str, documentation: str, get_stats: Callable[[], Dict[str, Any]]):
+        """把 get_stats() 返回的数值字段 (含一层嵌套字典) 导出为 gauge，指标名为 {prefix}_{字段}。"""
+
+        def collect() -> Iterable[Sample]:
+            for key, value in get_stats().items():
+                if isinstance(value, (int, float)):
+                    yield f"{prefix}_{key}", 'gauge', documentation, [({}, float(value))]
+                elif isinstance(value, dict):
+                    samples = [({'key': str(k)}, float(v)) for k, v in value.items()
+                               if isinstance(v, (int, float))]
+                    if samples:
+                        yield f"{prefix}_{key}", 'gauge', documentation, samples
+        self.register_collector(collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"--- [WARNING] 指标采集回调失败: {e} ---")
+                continue
+            for name, kind, documentation, values in samples:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} "
+                                 f"{_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# --- 交易所调用 ---
+exchange_call_seconds = registry.histogram(
+    'exchange_call_duration_seconds', "ccxt 统一方法的调用耗时 (含限频排队、网络和解析)", ('method', 'symbol_class'))
+exchange_call_errors = registry.counter(
+    'exchange_call_errors_total', "ccxt 统一方法抛出的异常次数", ('method', 'error'))
+exchange_http_seconds = registry.histogram(
+    'exchange_http_request_duration_seconds', "单个 REST 请求的网络耗时 (不含限频排队)", ('endpoint',))
+rate_limit_wait_seconds = registry.histogram(
+    'exchange_rate_limit_wait_seconds', "请求在共享限频器中的排队时间", ('priority',))
+retries_total = registry.counter(
+    'retries_total', "可重试操作的重试次数", ('operation', 'reason'))
+
+# --- 订单与任务 ---
+order_time_to_fill_seconds = registry.histogram(
+    'order_time_to_fill_seconds', "限价挂单从第一次提交到成交的时间 (含重试)", ('side', 'purpose'), DURATION_BUCKETS)
+maker_orders_total = registry.counter(
+    'maker_orders_total', "限价挂单流程的结果", ('purpose', 'outcome'))
+task_duration_seconds = registry.histogram(
+    'task_duration_seconds', "后台任务的总耗时", ('task', 'outcome'), DURATION_BUCKETS)
+symbol_lock_wait_seconds = registry.histogram(
+    'symbol_lock_wait_seconds', "任务子项等待币种锁的时间 (其他任务正在操作同一币种)", ('task',))
+
+# --- WebSocket ---
+websocket_broadcast_seconds = registry.histogram(
+    'websocket_broadcast_duration_seconds', "把一条消息放入所有客户端发送队列的耗时 (不含网络发送)", ('type',))
+websocket_send_seconds = registry.histogram(
+    'websocket_send_duration_seconds', "向单个客户端发送一条消息的耗时", (), LATENCY_BUCKETS)
+websocket_messages_dropped_total = registry.counter(
+    'websocket_messages_dropped_total', "未发送给客户端的消息数 (日志队列溢出丢弃最旧的日志、进度/状态合并为最新一条)",
+    ('reason',))
+websocket_disconnects_total = registry.counter(
+    'websocket_disconnects_total', "服务端主动断开的慢客户端数", ('reason',))
+
+# 统一方法名 -> 交易对参数的位置 (None 表示没有交易对参数)。
+# load_markets 不计时：ccxt 的每个统一方法内部都会先调用它，已加载时几乎不耗时，只会稀释统计
+_INSTRUMENTED_METHODS = {
+    'create_order': 0, 'edit_order': 1, 'cancel_order': 1, 'fetch_order': 1, 'fetch_open_orders': 0,
+    'fetch_order_book': 0, 'fetch_ohlcv': 0, 'fetch_positions': 0, 'fetch_tickers': 0, 'set_leverage': 1,
+    'create_orders': None, 'fetch_balance': None, 'fetch_time': None,
+}
+_MAJOR_BASES = frozenset({'BTC', 'ETH'})
+# 每次统一方法调用结束后通知的回调 (方法名, 耗时秒, 异常或 None)，如自适应并发控制
+_call_listeners: List[Callable[[str, float, Optional[BaseException]], None]] = []
+
+
+def add_call_listener(listener: Callable[[str, float, Optional[BaseException]], None]):
+    _call_listeners.append(listener)
+
+
+def symbol_class(symbol: Any) -> str:
+    """把交易对参数归为低基数的类别，避免按交易对展开标签。"""
+    if symbol is None:
+        return 'none'
+    if isinstance(symbol, (list, tuple, set)):
+        return 'multi'
+    return 'major' if str(symbol).split('/')[0].upper() in _MAJOR_BASES else 'alt'
+
+
+def _endpoint(url: str, method: str) -> str:
+    path = url.split('?', 1)[0]
+    scheme_end = path.find('://')
+    if scheme_end >= 0:
+        path = path[path.find('/', scheme_end + 3):]
+    return f"{method} {path}"
+
+
+def instrument_exchange(exchange):
+    """
+    给 ccxt 实例的统一方法和底层 fetch() 套上计时 (替换实例属性，与 install_rate_limiter 相同的方式)。
+    统一方法的耗时 = 限频排队 + 网络 + ccxt 解析，网络部分单独记录在 exchange_http_request_duration_seconds 中。
+    """
+    for name, symbol_index in _INSTRUMENTED_METHODS.items():
+        original = getattr(exchange, name, None)
+        if original is not None:
+            setattr(exchange, name, _timed_method(name, symbol_index, original))
+
+    original_fetch = exchange.fetch
+
+    async def fetch(url, method='GET', headers=None, body=None):
+        started = time.perf_counter()
+        try:
+            return await original_fetch(url, method, headers, body)
+        finally:
+            exchange_http_seconds.observe(time.perf_counter() - started, _endpoint(url, method))
+
+    exchange.fetch = fetch
+    return exchange
+
+
+def _timed_method(name: str, symbol_index: Optional[int], original):
+    async def wrapper(*args, **kwargs):
+        if symbol_index is None:
+            symbol = None
+        elif len(args) > symbol_index:
+            symbol = args[symbol_index]
+        else:
+            symbol = kwargs.get('symbols' if name in ('fetch_positions', 'fetch_tickers') else 'symbol')
+        started = time.perf_counter()
+        error = None
+        try:
+            return await original(*args, **kwargs)
+        except Exception as e:
+            error = e
+            exchange_call_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            exchange_call_seconds.observe(elapsed, name, symbol_class(symbol))
+            for listener in _call_listeners:
+                listener(name, elapsed, error)
+    return wrapper
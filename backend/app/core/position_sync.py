@@ -0,0 +1,52 @@
+# backend/app/core/position_sync.py
+import asyncio
+import contextlib
+import time
+from typing import Optional
+
+from .exchange_manager import exchange_pool
+from ..logic.order_events import order_event_hub
+from ..logic.position_book import PositionBook, position_book
+
+
+class PositionReconciler:
+    """
+    持仓簿的后台对账任务：用户数据流上线后立即建立快照，之后每隔 reconcile_interval 秒用 REST 校正一次。
+    用户数据流离线时不做任何事，读取方会自行回退到 REST。
+    """
+
+    def __init__(self, book: PositionBook, reconcile_interval: float = 60.0, check_interval: float = 5.0):
+        self._book = book
+        self._reconcile_interval = reconcile_interval
+        self._check_interval = check_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._check_interval)
+            if not order_event_hub.connected:
+                continue
+            try:
+                async with exchange_pool.acquire() as exchange:
+                    snapshot_age = time.time() - (self._book.snapshot_at or 0)
+                    if self._book.is_live(exchange) and snapshot_age < self._reconcile_interval:
+                        continue
+                    _, drift = await self._book.refresh(exchange)
+                if drift:
+                    print(f"--- [WARNING] 持仓簿对账发现 {drift} 个交易对与交易所不一致，已校正。 ---")
+            except Exception as e:
+                print(f"--- [WARNING] 持仓簿对账失败: {e} ---")
+
+
+position_reconciler = PositionReconciler(position_book)
@@ -0,0 +1,297 @@
+# backend/app/core/screening_scheduler.py
+import asyncio
+import contextlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence
+
+from .exchange_manager import exchange_pool
+from .websocket_manager import log_message
+from ..config import config as app_config
+from ..config.config import is_simulated_exchange, load_settings
+from ..logic import screening_pipeline
+from ..logic.memo_cache import MemoCache, memo_key
+from ..logic.screening_pipeline import ScreeningInputs
+from ..models.schemas import RebalanceCriteria
+
+_DAY_SECONDS = 24 * 3600
+# 影响筛选结果的配置项，变化后立即重新预计算
+_WATCHED_SETTINGS = ('short_coin_list', 'api_key', 'use_testnet', 'exchange_mode', 'rebalance_method',
+                     'rebalance_top_n', 'rebalance_min_volume_usd', 'rebalance_abs_momentum_days',
+                     'rebalance_rel_strength_days', 'rebalance_foam_days', 'rebalance_volume_ma_days',
+                     'rebalance_volume_spike_ratio', 'rebalance_benchmark')
+
+
+def criteria_from_settings(settings: Dict[str, Any]) -> RebalanceCriteria:
+    """用户在设置中保存的筛选条件 (与前端"生成计划"按钮发送的条件一致)。"""
+    defaults = RebalanceCriteria()
+    return RebalanceCriteria(
+        method=settings.get('rebalance_method', defaults.method),
+        top_n=settings.get('rebalance_top_n', defaults.top_n),
+        min_volume_usd=settings.get('rebalance_min_volume_usd', defaults.min_volume_usd),
+        abs_momentum_days=settings.get('rebalance_abs_momentum_days', defaults.abs_momentum_days),
+        rel_strength_days=settings.get('rebalance_rel_strength_days', defaults.rel_strength_days),
+        foam_days=settings.get('rebalance_foam_days', defaults.foam_days),
+        rebalance_volume_ma_days=settings.get('rebalance_volume_ma_days', defaults.rebalance_volume_ma_days),
+        rebalance_volume_spike_ratio=settings.get('rebalance_volume_spike_ratio',
+                                                  defaults.rebalance_volume_spike_ratio),
+        benchmark=settings.get('rebalance_benchmark', defaults.benchmark),
+    )
+
+
+def _criteria_key(criteria: RebalanceCriteria) -> str:
+    return json.dumps(criteria.model_dump(), sort_keys=True)
+
+
+def _memo_key(criteria: RebalanceCriteria, blacklist: List[str], short_pool: FrozenSet[str],
+              inputs: ScreeningInputs) -> str:
+    """排名结果的缓存键：筛选条件、黑名单 (多头币池)、做空池和所用市场数据的版本。"""
+    return memo_key(criteria.model_dump(), sorted(b.upper() for b in blacklist), sorted(short_pool), inputs.version)
+
+
+class ScreeningResult:
+    def __init__(self, coins: List[str], inputs: ScreeningInputs, source: str):
+        self.coins = coins
+        self.screened_at = time.time()
+        self.data_as_of = inputs.as_of
+        self.last_candle_ms = inputs.last_candle_ms
+        self.source = source
+
+    def freshness(self) -> Dict[str, Any]:
+        return {
+            "screening_source": self.source,
+            "screened_at": self.screened_at,
+            "data_as_of": self.data_as_of,
+            "data_age_seconds": round(time.time() - self.data_as_of, 1),
+            "last_candle_time": self.last_candle_ms,
+        }
+
+
+class ScreeningScheduler:
+    """
+    再平衡筛选的后台预计算：每天日线收盘后 (UTC 0 点) 以及做空列表或筛选设置变化时，
+    刷新一次市场数据快照 (流动性 + K线)，并为设置中的筛选条件和最近请求过的筛选条件预先排好名。
+    /api/rebalance/plan 只需要把排名结果与当前持仓合并；请求的条件不在快照覆盖范围内时，
+    按所有已登记条件的并集刷新快照后再排名。
+    """
+
+    def __init__(self, close_delay: float = 60.0, settings_check_interval: float = 10.0,
+                 retry_delay: float = 60.0, max_retry_delay: float = 3600.0,
+                 max_tracked_criteria: int = 16, memo_max_entries: int = 64, memo_max_age: float = 36 * 3600):
+        self._close_delay = close_delay
+        self._settings_check_interval = settings_check_interval
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._max_tracked = max_tracked_criteria
+        self._inputs: Optional[ScreeningInputs] = None
+        self._memo: MemoCache[ScreeningResult] = MemoCache(memo_max_entries, memo_max_age)
+        # 需要预计算的筛选条件 (最近请求过的在末尾)
+        self._tracked: "OrderedDict[str, RebalanceCriteria]" = OrderedDict()
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._settings_fingerprint: Optional[str] = None
+        self.stats = {"refreshes": 0, "refresh_failures": 0, "snapshot_ranks": 0, "on_demand_refreshes": 0}
+        self.last_refresh_reason: Optional[str] = None
+        # 最近一次后台预计算失败的原因和时间，以及下一次重试的时间 (成功后清空)
+        self.last_refresh_error: Optional[str] = None
+        self.last_refresh_failed_at: Optional[float] = None
+        self.next_retry_at: Optional[float] = None
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    # --- 调度 ---
+    @staticmethod
+    def _fingerprint(settings: Dict[str, Any]) -> str:
+        watched = {k: settings.get(k) for k in _WATCHED_SETTINGS}
+        watched['blacklist'] = list(app_config.AVAILABLE_LONG_COINS)
+        return json.dumps(watched, sort_keys=True, default=str)
+
+    def _next_close_refresh(self, now: float) -> float:
+        return (now // _DAY_SECONDS + 1) * _DAY_SECONDS + self._close_delay
+
+    async def _run(self):
+        next_close = self._next_close_refresh(time.time())
+        # 最近一次尝试预计算时的设置指纹；失败后按指数退避重试，直到成功或设置再次变化
+        attempted: Optional[str] = None
+        failures = 0
+        while True:
+            settings = load_settings()
+            fingerprint = self._fingerprint(settings)
+            reason = None
+            has_credentials = is_simulated_exchange(settings) or (settings.get('api_key') and settings.get('api_secret'))
+            if not has_credentials or not settings.get('short_coin_list'):
+                pass
+            elif fingerprint != attempted:
+                reason = "启动" if attempted is None else "筛选设置变化"
+            elif time.time() >= next_close:
+                reason = "日线收盘"
+            elif self.next_retry_at is not None and time.time() >= self.next_retry_at:
+                reason = "失败重试"
+            if reason:
+                if fingerprint != attempted:
+                    failures = 0
+                attempted = fingerprint
+                next_close = self._next_close_refresh(time.time())
+                if await self._refresh_in_background(reason):
+                    failures = 0
+                    self.next_retry_at = None
+                else:
+                    failures += 1
+                    self.next_retry_at = time.time() + min(self._retry_delay * 2 ** (failures - 1),
+                                                           self._max_retry_delay)
+            await asyncio.sleep(self._settings_check_interval)
+
+    async def _refresh_in_background(self, reason: str) -> bool:
+        try:
+            await self.refresh(reason)
+            return True
+        except Exception as e:
+            self.stats["refresh_failures"] += 1
+            self.last_refresh_error = f"{reason}: {e}"
+            self.last_refresh_failed_at = time.time()
+            print(f"--- [WARNING] 再平衡筛选预计算失败 ({reason}): {e} ---")
+            return False
+
+    def refresh_status(self) -> Dict[str, Any]:
+        """后台预计算的失败状态，附在筛选结果的新鲜度信息中 (最近一次刷新成功时均为 None)。"""
+        return {
+            "refresh_error": self.last_refresh_error,
+            "refresh_failed_at": self.last_refresh_failed_at,
+            "next_retry_at": self.next_retry_at,
+        }
+
+    # --- 快照与排名 ---
+    def _tracked_criteria(self, settings: Dict[str, Any]) -> List[RebalanceCriteria]:
+        own = criteria_from_settings(settings)
+        tracked = [c for k, c in self._tracked.items() if k != _criteria_key(own)]
+        return [own] + tracked
+
+    async def refresh(self, reason: str, async_logger=None, extra_criteria: Sequence[Dict[str, Any]] = ()):
+        """
+        按所有需要预计算的条件的并集重新获取快照，并为这些条件重新排名。
+        extra_criteria 只参与快照范围的计算，不做预计算 (用于参数扫描)。
+        """
+        async with self._refresh_lock:
+            settings = load_settings()
+            fingerprint = self._fingerprint(settings)
+            short_pool = frozenset(settings.get('short_coin_list', []))
+            tracked = self._tracked_criteria(settings)
+            dumps = [c.model_dump() for c in tracked] + list(extra_criteria)
+            benchmarks = list(dict.fromkeys(
+                m for d in dumps if d['method'] == 'multi_factor_weakest'
+                for m in screening_pipeline.parse_benchmark(d['benchmark'])))
+
+            async def quiet_logger(message: str, level: str = "normal"):
+                pass
+
+            async with exchange_pool.acquire() as exchange:
+                inputs = await screening_pipeline.collect_screening_inputs(
+                    exchange, short_pool,
+                    min(d['min_volume_usd'] for d in dumps),
+                    max(screening_pipeline.days_to_fetch(d) for d in dumps),
+                    benchmarks, async_logger or quiet_logger)
+
+            precomputed = 0
+            blacklist = list(app_config.AVAILABLE_LONG_COINS)
+            loop = asyncio.get_running_loop()
+            for criteria in tracked:
+                try:
+                    coins = await loop.run_in_executor(None, screening_pipeline.rank_screening_inputs, inputs,
+                                                       criteria.model_dump(), blacklist)
+                except ValueError:
+                    continue
+                self._memo.put(_memo_key(criteria, blacklist, short_pool, inputs),
+                               ScreeningResult(coins, inputs, "precomputed"))
+                precomputed += 1
+            self._inputs = inputs
+            self._settings_fingerprint = fingerprint
+            self.stats["refreshes"] += 1
+            self.last_refresh_reason = reason
+            self.last_refresh_error = None
+            self.last_refresh_failed_at = None
+            self.next_retry_at = None
+            print(f"--- [INFO] 再平衡筛选已预计算 ({reason})：{len(inputs.klines)} 个币种，{precomputed} 组筛选条件。 ---")
+
+    def _track(self, criteria: RebalanceCriteria):
+        key = _criteria_key(criteria)
+        self._tracked[key] = criteria
+        self._tracked.move_to_end(key)
+        while len(self._tracked) > self._max_tracked:
+            self._tracked.popitem(last=False)
+
+    async def get_ranking(self, criteria: RebalanceCriteria, settings: Dict[str, Any]) -> ScreeningResult:
+        """返回该筛选条件的排名：优先使用记忆缓存中的结果，其次用现有快照排名，最后按需刷新快照。"""
+        short_pool = frozenset(settings.get('short_coin_list', []))
+        if not short_pool:
+            raise ValueError("做空交易列表为空，无法进行智能再平衡筛选。请先在'通用开仓设置'中配置。")
+        self._track(criteria)
+        criteria_dict = criteria.model_dump()
+        blacklist = list(app_config.AVAILABLE_LONG_COINS)
+
+        inputs = self._inputs
+        fresh = inputs is not None and self._settings_fingerprint == self._fingerprint(settings)
+        if fresh:
+            cached = self._memo.get(_memo_key(criteria, blacklist, short_pool, inputs))
+            if cached is not None:
+                return cached
+
+        if not (fresh and inputs.covers(criteria_dict, short_pool)):
+            self.stats["on_demand_refreshes"] += 1
+            await log_message("筛选数据快照不覆盖当前条件，正在刷新市场数据...", "info")
+            try:
+                await self.refresh("按需刷新", log_message)
+            except Exception:
+                self._tracked.pop(_criteria_key(criteria), None)
+                raise
+            inputs = self._inputs
+            cached = self._memo.get(_memo_key(criteria, blacklist, short_pool, inputs))
+            if cached is not None:
+                return cached
+
+        self.stats["snapshot_ranks"] += 1
+        loop = asyncio.get_running_loop()
+        coins = await loop.run_in_executor(None, screening_pipeline.rank_screening_inputs, inputs, criteria_dict,
+                                           blacklist)
+        result = ScreeningResult(coins, inputs, "snapshot")
+        self._memo.put(_memo_key(criteria, blacklist, short_pool, inputs), result)
+        return result
+
+    async def get_inputs(self, criteria_list: Sequence[Dict[str, Any]], settings: Dict[str, Any]) -> ScreeningInputs:
+        """返回覆盖所有给定筛选条件的快照，必要时按并集刷新一次。"""
+        short_pool = frozenset(settings.get('short_coin_list', []))
+        if not short_pool:
+            raise ValueError("做空交易列表为空，无法进行智能再平衡筛选。请先在'通用开仓设置'中配置。")
+        inputs = self._inputs
+        fresh = inputs is not None and self._settings_fingerprint == self._fingerprint(settings)
+        if fresh and all(inputs.covers(c, short_pool) for c in criteria_list):
+            return inputs
+        self.stats["on_demand_refreshes"] += 1
+        await log_message("筛选数据快照不覆盖参数扫描的全部条件，正在刷新市场数据...", "info")
+        await self.refresh("参数扫描", log_message, extra_criteria=criteria_list)
+        return self._inputs
+
+    def get_stats(self) -> Dict[str, Any]:
+        inputs = self._inputs
+        return {
+            **self.stats,
+            "last_refresh_reason": self.last_refresh_reason,
+            **self.refresh_status(),
+            "data_as_of": inputs.as_of if inputs else None,
+            "data_age_seconds": round(time.time() - inputs.as_of, 1) if inputs else None,
+            "symbols": len(inputs.klines) if inputs else 0,
+            "tracked_criteria": len(self._tracked),
+            "memo": self._memo.get_stats(),
+        }
+
+
+screening_scheduler = ScreeningScheduler()
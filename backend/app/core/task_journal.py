@@ -0,0 +1,308 @@
+# backend/app/core/task_journal.py
+import asyncio
+import contextvars
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.config import get_cache_dir, load_settings
+
+# 子项状态：pending -> running -> submitted (已提交订单) -> filled (订单已成交) -> done / failed
+ITEM_PENDING = 'pending'
+ITEM_RUNNING = 'running'
+ITEM_SUBMITTED = 'submitted'
+ITEM_FILLED = 'filled'
+ITEM_DONE = 'done'
+ITEM_FAILED = 'failed'
+FINISHED_ITEM_STATES = frozenset({ITEM_DONE, ITEM_FAILED})
+
+# 任务状态：只有 running (进程在任务执行中退出) 的任务会在启动时恢复
+TASK_RUNNING = 'running'
+
+# 单个事务最多合并的写操作数
+_MAX_BATCH = 500
+# 已结束任务的保留时间，启动时清理
+_RETENTION_SECONDS = 7 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    journal_id TEXT PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, plan TEXT NOT NULL,
+    status TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    journal_id TEXT NOT NULL, seq INTEGER NOT NULL, symbol TEXT NOT NULL, payload TEXT NOT NULL,
+    state TEXT NOT NULL, error TEXT, updated_at REAL NOT NULL, PRIMARY KEY (journal_id, seq)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    journal_id TEXT NOT NULL, seq INTEGER NOT NULL, attempt INTEGER NOT NULL, client_order_id TEXT NOT NULL,
+    order_id TEXT, symbol TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (journal_id, seq, attempt)
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, journal_id TEXT NOT NULL, seq INTEGER, event TEXT NOT NULL,
+    detail TEXT, ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+"""
+
+# 当前子项 (journal_id, seq, 订单尝试序号的起点)，由任务循环在每个子项自己的 asyncio 任务中设置
+_current_item: contextvars.ContextVar[Optional[Tuple[str, int, int]]] = contextvars.ContextVar(
+    'journal_item', default=None)
+
+Statement = Tuple[str, Tuple[Any, ...]]
+
+
+class JournaledOrder:
+    def __init__(self, attempt: int, client_order_id: str, order_id: Optional[str], symbol: str):
+        self.attempt = attempt
+        self.client_order_id = client_order_id
+        self.order_id = order_id
+        self.symbol = symbol
+
+
+class JournaledItem:
+    def __init__(self, seq: int, symbol: str, payload: Dict[str, Any], state: str):
+        self.seq = seq
+        self.symbol = symbol
+        self.payload = payload
+        self.state = state
+        self.orders: List[JournaledOrder] = []
+        # 恢复时对账发现部分成交：只执行剩余部分的参数 (原始 payload 保持不变，再次重启时重新计算)
+        self.remainder: Optional[Dict[str, Any]] = None
+
+    @property
+    def last_attempt(self) -> int:
+        return max((order.attempt for order in self.orders), default=0)
+
+
+class JournaledTask:
+    def __init__(self, journal_id: str, kind: str, name: str, plan: Dict[str, Any], updated_at: float):
+        self.journal_id = journal_id
+        self.kind = kind
+        self.name = name
+        self.plan = plan
+        self.updated_at = updated_at
+        self.items: List[JournaledItem] = []
+
+
+def client_order_id(journal_id: str, seq: int, attempt: int) -> str:
+    """子项第 attempt 次挂单的客户订单号。可由日志推算，进程在下单后、写入日志前退出时也能按它找回订单。"""
+    return f"j{journal_id}-{seq}-{attempt}"
+
+
+class TaskJournal:
+    """
+    后台任务的执行日志 (SQLite)：记录计划、每个子项的状态变化和交易所订单号，进程重启后据此恢复未完成的子项。
+    事件表只追加，tasks/items 为当前状态的索引。所有写入只在事件循环中入队，由后台线程批量提交，
+    不阻塞交易流程；进程异常退出时最多丢失最后一批写入，恢复时通过可推算的客户订单号向交易所补查。
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self._path = path
+        self._queue: 'queue.SimpleQueue[Any]' = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"writes": 0, "batches": 0, "write_errors": 0, "resumed_tasks": 0}
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = get_cache_dir(load_settings(), 'task_journal_dir') / 'task_journal.sqlite3'
+        return self._path
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- 生命周期 ---
+    def start(self):
+        if self.enabled:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.executescript(_SCHEMA)
+            cutoff = time.time() - _RETENTION_SECONDS
+            stale = [row[0] for row in conn.execute(
+                "SELECT journal_id FROM tasks WHERE status != ? AND updated_at < ?", (TASK_RUNNING, cutoff))]
+            for table in ('events', 'orders', 'items', 'tasks'):
+                conn.executemany(f"DELETE FROM {table} WHERE journal_id = ?", [(j,) for j in stale])
+        conn.close()
+        self._thread = threading.Thread(target=self._writer, name='task-journal-writer', daemon=True)
+        self._thread.start()
+        print(f"--- [INFO] 任务日志已启动: {self.path} ---")
+
+    async def stop(self):
+        if not self.enabled:
+            return
+        self._queue.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+        self._thread = None
+
+    async def flush(self):
+        """等待此前入队的写入全部提交。"""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self._queue.put(lambda: loop.call_soon_threadsafe(done.set_result, None))
+        await done
+
+    def _writer(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < _MAX_BATCH:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                statements = [op for op in batch if isinstance(op, list)]
+                if statements:
+                    try:
+                        with conn:
+                            for group in statements:
+                                for sql, params in group:
+                                    conn.execute(sql, params)
+                        self._stats["writes"] += len(statements)
+                        self._stats["batches"] += 1
+                    except sqlite3.Error as e:
+                        self._stats["write_errors"] += 1
+                        print(f"--- [ERROR] 任务日志写入失败: {e} ---")
+                for op in batch:
+                    if callable(op):
+                        op()
+                if any(op is None for op in batch):
+                    return
+        finally:
+            conn.close()
+
+    def _submit(self, statements: List[Statement]):
+        if self.enabled:
+            self._queue.put(statements)
+
+    @staticmethod
+    def _event(journal_id: str, seq: Optional[int], event: str, detail: Optional[Dict[str, Any]], ts: float
+               ) -> Statement:
+        return ("INSERT INTO events (journal_id, seq, event, detail, ts) VALUES (?, ?, ?, ?, ?)",
+                (journal_id, seq, event, json.dumps(detail, ensure_ascii=False) if detail else None, ts))
+
+    # --- 写入 (只入队，不阻塞事件循环) ---
+    def begin_task(self, kind: str, name: str, plan: Dict[str, Any],
+                   items: List[Tuple[str, Dict[str, Any]]]) -> Optional[str]:
+        """登记一个新任务及其全部子项 (symbol, payload)，返回日志 ID；日志未启动时返回 None。"""
+        if not self.enabled:
+            return None
+        journal_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        statements = [
+            ("INSERT INTO tasks (journal_id, kind, name, plan, status, created_at, updated_at) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+             (journal_id, kind, name, json.dumps(plan, ensure_ascii=False), TASK_RUNNING, now, now)),
+            self._event(journal_id, None, 'task_started', {'items': len(items)}, now),
+        ]
+        statements.extend(
+            ("INSERT INTO items (journal_id, seq, symbol, payload, state, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+             (journal_id, seq, symbol, json.dumps(payload, ensure_ascii=False), ITEM_PENDING, now))
+            for seq, (symbol, payload) in enumerate(items))
+        self._submit(statements)
+        return journal_id
+
+    def end_task(self, journal_id: str, status: str):
+        now = time.time()
+        self._submit([
+            ("UPDATE tasks SET status = ?, updated_at = ? WHERE journal_id = ?", (status, now, journal_id)),
+            self._event(journal_id, None, 'task_' + status, None, now),
+        ])
+
+    def set_item_state(self, journal_id: str, seq: int, state: str, error: Optional[str] = None,
+                       detail: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        self._submit([
+            ("UPDATE items SET state = ?, error = ?, updated_at = ? WHERE journal_id = ? AND seq = ?",
+             (state, error, now, journal_id, seq)),
+            ("UPDATE tasks SET updated_at = ? WHERE journal_id = ?", (now, journal_id)),
+            self._event(journal_id, seq, state, detail, now),
+        ])
+
+    def record_event(self, journal_id: str, seq: int, event: str, detail: Optional[Dict[str, Any]] = None):
+        """只追加事件，不改变子项状态。"""
+        now = time.time()
+        self._submit([self._event(journal_id, seq, event, detail, now)])
+
+    # --- 当前子项 (供下单流程使用，不在日志任务中时均为空操作) ---
+    @staticmethod
+    def bind_item(journal_id: str, seq: int, attempt_offset: int = 0):
+        """把当前 asyncio 任务 (一个子项) 关联到日志子项；恢复执行时 attempt_offset 跳过已用过的订单序号。"""
+        _current_item.set((journal_id, seq, attempt_offset))
+
+    @staticmethod
+    def item_client_order_id(attempt: int) -> Optional[str]:
+        item = _current_item.get()
+        return None if item is None else client_order_id(item[0], item[1], item[2] + attempt)
+
+    def item_order_submitted(self, attempt: int, order_id: str, symbol: str):
+        item = _current_item.get()
+        if item is None:
+            return
+        journal_id, seq, offset = item
+        now = time.time()
+        cid = client_order_id(journal_id, seq, offset + attempt)
+        self._submit([
+            ("INSERT OR REPLACE INTO orders (journal_id, seq, attempt, client_order_id, order_id, symbol, created_at) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?)", (journal_id, seq, offset + attempt, cid, order_id, symbol, now)),
+            ("UPDATE items SET state = ?, updated_at = ? WHERE journal_id = ? AND seq = ?",
+             (ITEM_SUBMITTED, now, journal_id, seq)),
+            self._event(journal_id, seq, ITEM_SUBMITTED, {'order_id': order_id, 'client_order_id': cid,
+                                                          'symbol': symbol}, now),
+        ])
+
+    def item_filled(self):
+        item = _current_item.get()
+        if item is not None:
+            self.set_item_state(item[0], item[1], ITEM_FILLED)
+
+    # --- 读取 (在线程池中执行) ---
+    async def load_unfinished(self) -> List[JournaledTask]:
+        if not self.enabled:
+            return []
+        await self.flush()
+        return await asyncio.get_running_loop().run_in_executor(None, self._load_unfinished)
+
+    def _load_unfinished(self) -> List[JournaledTask]:
+        conn = self._connect()
+        try:
+            tasks = [JournaledTask(row[0], row[1], row[2], json.loads(row[3]), row[4]) for row in conn.execute(
+                "SELECT journal_id, kind, name, plan, updated_at FROM tasks WHERE status = ? ORDER BY created_at",
+                (TASK_RUNNING,))]
+            for task in tasks:
+                items = {row[0]: JournaledItem(row[0], row[1], json.loads(row[2]), row[3]) for row in conn.execute(
+                    "SELECT seq, symbol, payload, state FROM items WHERE journal_id = ? ORDER BY seq",
+                    (task.journal_id,))}
+                for row in conn.execute("SELECT seq, attempt, client_order_id, order_id, symbol FROM orders "
+                                        "WHERE journal_id = ? ORDER BY seq, attempt", (task.journal_id,)):
+                    if row[0] in items:
+                        items[row[0]].orders.append(JournaledOrder(row[1], row[2], row[3], row[4]))
+                task.items = list(items.values())
+            return tasks
+        finally:
+            conn.close()
+
+    def note_resumed(self):
+        self._stats["resumed_tasks"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "enabled": self.enabled, "queue_depth": self._queue.qsize()}
+
+
+task_journal = TaskJournal()
@@ -0,0 +1,205 @@
+# backend/app/core/task_registry.py
+import asyncio
+import contextlib
+import itertools
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .metrics import symbol_lock_wait_seconds
+from ..logic.exceptions import InterruptedError
+
+# 同时运行的后台任务上限 (每个任务内部还有自己的并发数)，以及保留的已结束任务数
+MAX_ACTIVE_TASKS = 8
+MAX_FINISHED_TASKS = 20
+
+_ids = itertools.count(1)
+
+
+def symbol_key(symbol: str) -> str:
+    """锁的键：统一为大写的基础币种，'BTC'、'btc'、'BTC/USDT:USDT' 指向同一把锁。"""
+    return symbol.split('/')[0].strip().upper()
+
+
+class ManagedTask:
+    """注册表中的一个后台任务：自己的 ID、进度、停止信号和状态。"""
+
+    def __init__(self, name: str, request_id: Optional[str]):
+        self.id = f"task-{next(_ids)}"
+        self.name = name
+        self.request_id = request_id
+        self.status = 'running'  # running / stopping / completed / stopped / failed
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.ended_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {"task_name": name}
+        self.stop_event = asyncio.Event()
+        self.held_symbols: Dict[str, int] = {}
+        self.waiting_symbols: Dict[str, int] = {}
+        self.limiter = None  # 任务循环开始后为其 AdaptiveConcurrencyLimiter
+        self.journal_id: Optional[str] = None  # 记入任务日志 (可在重启后恢复) 的任务
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('running', 'stopping')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.id, "name": self.name, "request_id": self.request_id, "status": self.status,
+            "error": self.error, "started_at": self.started_at, "ended_at": self.ended_at,
+            "duration_seconds": round((self.ended_at or time.time()) - self.started_at, 2),
+            "progress": self.progress, "journal_id": self.journal_id,
+            "held_symbols": sorted(self.held_symbols), "waiting_symbols": sorted(self.waiting_symbols),
+            "concurrency": self.limiter.get_stats() if self.limiter is not None else None,
+        }
+
+
+class TaskRegistry:
+    """
+    并发后台任务的注册表。不同任务可以同时运行，冲突按币种解决：
+    每个子项在执行前获取其币种的 asyncio.Lock，只有操作同一币种的子项会互相等待。
+    每个子项只持有一把锁，不存在锁顺序导致的死锁。
+    启动任务的接口运行在线程池中，任务表的增删由 threading.Lock 保护；币种锁只在事件循环中使用。
+    """
+
+    def __init__(self, max_active: int = MAX_ACTIVE_TASKS, max_finished: int = MAX_FINISHED_TASKS):
+        self.max_active = max_active
+        self._lock = threading.Lock()
+        self._active: Dict[str, ManagedTask] = {}
+        self._finished: Deque[ManagedTask] = deque(maxlen=max_finished)
+        # 没有持有者和等待者的锁会被自动回收，字典不会随交易过的币种无限增长
+        self._locks: 'weakref.WeakValueDictionary[str, asyncio.Lock]' = weakref.WeakValueDictionary()
+        self._stats = {"started": 0, "rejected": 0, "duplicates": 0, "lock_acquisitions": 0,
+                       "lock_contended": 0, "lock_wait_seconds": 0.0}
+
+    # --- 任务生命周期 ---
+    def create(self, name: str, request_id: Optional[str] = None) -> Tuple[Optional[ManagedTask], bool]:
+        """
+        登记一个新任务，返回 (任务, 是否新建)。request_id 与运行中的任务相同时视为重复提交，返回该任务；
+        达到同时运行的上限时返回 (None, False)。
+        """
+        with self._lock:
+            if request_id:
+                existing = next((t for t in self._active.values() if t.request_id == request_id), None)
+                if existing is not None:
+                    self._stats["duplicates"] += 1
+                    return existing, False
+            if len(self._active) >= self.max_active:
+                self._stats["rejected"] += 1
+                return None, False
+            task = ManagedTask(name, request_id)
+            self._active[task.id] = task
+            self._stats["started"] += 1
+            return task, True
+
+    def finish(self, task: ManagedTask, status: str, error: Optional[str] = None):
+        with self._lock:
+            task.status, task.error, task.ended_at = status, error, time.time()
+            self._active.pop(task.id, None)
+            self._finished.append(task)
+
+    def get(self, task_id: str) -> Optional[ManagedTask]:
+        with self._lock:
+            return self._active.get(task_id) or next((t for t in self._finished if t.id == task_id), None)
+
+    def active_tasks(self) -> List[ManagedTask]:
+        with self._lock:
+            return list(self._active.values())
+
+    def has_active(self) -> bool:
+        return bool(self._active)
+
+    def stop(self, task_id: Optional[str] = None) -> List[ManagedTask]:
+        """给指定任务 (未指定时为全部运行中的任务) 发出停止信号，返回被停止的任务。"""
+        with self._lock:
+            if task_id:
+                targets = [self._active[task_id]] if task_id in self._active else []
+            else:
+                targets = list(self._active.values())
+        for task in targets:
+            task.status = 'stopping'
+            task.stop_event.set()
+        return targets
+
+    # --- 币种锁 ---
+    def _lock_for(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def locked_symbols(self, exclude: Optional[ManagedTask] = None) -> Dict[str, str]:
+        """当前被持有的币种锁 -> 持有任务的 ID (可排除某个任务自己持有的锁)。"""
+        return {key: task.id for task in self.active_tasks() if task is not exclude
+                for key in list(task.held_symbols)}
+
+    @contextlib.asynccontextmanager
+    async def symbol_lock(self, symbol: str, task: ManagedTask):
+        """
+        持有 symbol 所属币种的锁执行子项。任务在等待期间被停止时放弃等待并抛出 InterruptedError，
+        不会被另一个任务里耗时的挂单流程拖住。
+        """
+        key = symbol_key(symbol)
+        lock = self._lock_for(key)
+        started = time.monotonic()
+        if lock.locked():
+            self._stats["lock_contended"] += 1
+            task.waiting_symbols[key] = task.waiting_symbols.get(key, 0) + 1
+            try:
+                acquired = await self._acquire_unless_stopped(lock, task.stop_event)
+            finally:
+                task.waiting_symbols[key] -= 1
+                if not task.waiting_symbols[key]:
+                    del task.waiting_symbols[key]
+            if not acquired:
+                raise InterruptedError()
+        else:
+            await lock.acquire()
+        waited = time.monotonic() - started
+        self._stats["lock_acquisitions"] += 1
+        self._stats["lock_wait_seconds"] += waited
+        symbol_lock_wait_seconds.observe(waited, task.name)
+        task.held_symbols[key] = task.held_symbols.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            task.held_symbols[key] -= 1
+            if not task.held_symbols[key]:
+                del task.held_symbols[key]
+            lock.release()
+
+    @staticmethod
+    async def _acquire_unless_stopped(lock: asyncio.Lock, stop_event: asyncio.Event) -> bool:
+        acquire = asyncio.ensure_future(lock.acquire())
+        stopped = asyncio.ensure_future(stop_event.wait())
+        try:
+            await asyncio.wait({acquire, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopped.cancel()
+            if not acquire.done():
+                acquire.cancel()
+        # 两者同时完成时锁已到手，交给调用方按正常流程释放
+        return acquire.done() and not acquire.cancelled()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "lock_wait_seconds": round(self._stats["lock_wait_seconds"], 3),
+            "active": len(self._active),
+            "finished_retained": len(self._finished),
+            "locks_held": len(self.locked_symbols()),
+            "symbols_waiting": len({key for task in self.active_tasks() for key in list(task.waiting_symbols)}),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            active, finished = list(self._active.values()), list(self._finished)
+        return {
+            "tasks": [task.to_dict() for task in active],
+            "recent_tasks": [task.to_dict() for task in reversed(finished)],
+        }
+
+
+task_registry = TaskRegistry()
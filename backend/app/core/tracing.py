@@ -0,0 +1,269 @@
+# backend/app/core/tracing.py
+import contextvars
+import itertools
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+
+# 内存中最多保留的后台任务数，以及每个任务最多保留的单项追踪数 (超出的只计数不保存)
+MAX_TASKS = 50
+MAX_TRACES_PER_TASK = 2000
+
+_ids = itertools.count(1)
+
+
+class Span:
+    """追踪中的一个阶段。start/end 为 time.monotonic() 的读数，parent 为父阶段在 spans 列表中的下标。"""
+    __slots__ = ('name', 'parent', 'start', 'end', 'attrs', 'error')
+
+    def __init__(self, name: str, parent: Optional[int], attrs: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attrs[key] = value
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            'name': self.name, 'parent': self.parent,
+            'start_monotonic': self.start, 'end_monotonic': self.end,
+            'offset_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': None if self.end is None else round((self.end - self.start) * 1000, 3),
+            'attrs': self.attrs, 'error': self.error,
+        }
+
+
+class Trace:
+    """一个计划条目 (开仓或平仓一个币种) 的执行时间线。"""
+
+    def __init__(self, kind: str, symbol: str, attrs: Dict[str, Any]):
+        self.id = str(next(_ids))
+        self.kind = kind
+        self.symbol = symbol
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.outcome: Optional[str] = None
+        self.spans: List[Span] = []
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def to_dict(self, with_spans: bool = True) -> Dict[str, Any]:
+        data = {
+            'id': self.id, 'kind': self.kind, 'symbol': self.symbol, 'attrs': self.attrs,
+            'started_at': self.started_at, 'start_monotonic': self.start, 'end_monotonic': self.end,
+            'duration_ms': None if self.end is None else round((self.end - self.start) * 1000, 3),
+            'outcome': self.outcome,
+        }
+        if with_spans:
+            data['spans'] = [span.to_dict(self.start) for span in self.spans]
+        return data
+
+
+class TaskTraces:
+    """一个后台任务 (如一次自动开仓) 下所有计划条目的追踪。"""
+
+    def __init__(self, name: str):
+        self.id = str(next(_ids))
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.outcome: Optional[str] = None
+        self.traces: List[Trace] = []
+        self.dropped = 0
+
+    def add(self, trace: Trace):
+        if len(self.traces) < MAX_TRACES_PER_TASK:
+            self.traces.append(trace)
+        else:
+            self.dropped += 1
+
+    def summary(self) -> Dict[str, Any]:
+        outcomes: Dict[str, int] = {}
+        for trace in self.traces:
+            outcomes[trace.outcome or 'running'] = outcomes.get(trace.outcome or 'running', 0) + 1
+        finished = [t for t in self.traces if t.end is not None]
+        slowest = max(finished, key=lambda t: t.duration, default=None)
+        return {
+            'id': self.id, 'name': self.name, 'started_at': self.started_at,
+            'duration_ms': None if self.end is None else round((self.end - self.start) * 1000, 3),
+            'outcome': self.outcome, 'traces': len(self.traces), 'dropped_traces': self.dropped,
+            'trace_outcomes': outcomes,
+            'slowest_trace': slowest.to_dict(with_spans=False) if slowest else None,
+        }
+
+
+_current_task: contextvars.ContextVar[Optional[TaskTraces]] = contextvars.ContextVar('trace_task', default=None)
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('trace', default=None)
+_current_span: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar('trace_span', default=None)
+
+
+def _outcome_of(exc_type) -> str:
+    if exc_type is None:
+        return 'ok'
+    return 'interrupted' if exc_type.__name__ == 'InterruptedError' else exc_type.__name__
+
+
+class _TaskScope:
+    def __init__(self, store: 'TraceStore', name: str):
+        self._store = store
+        self._name = name
+
+    def __enter__(self) -> TaskTraces:
+        self.task = self._store.add_task(TaskTraces(self._name))
+        self._token = _current_task.set(self.task)
+        return self.task
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_task.reset(self._token)
+        self.task.end = time.monotonic()
+        if self.task.outcome is None:
+            self.task.outcome = _outcome_of(exc_type)
+
+
+class _TraceScope:
+    def __init__(self, store: 'TraceStore', kind: str, symbol: str, attrs: Dict[str, Any]):
+        self._store = store
+        self.trace = Trace(kind, symbol, attrs)
+
+    def __enter__(self) -> Trace:
+        task = _current_task.get()
+        if task is None:
+            # 不在后台任务中的单独调用，作为只含一条追踪的任务保存
+            task = self._store.add_task(TaskTraces(f"{self.trace.kind} {self.trace.symbol}"))
+        task.add(self.trace)
+        self._task = task
+        self._tokens = (_current_trace.set(self.trace), _current_span.set(None))
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._tokens[0])
+        _current_span.reset(self._tokens[1])
+        self.trace.end = time.monotonic()
+        if self.trace.outcome is None or exc_type is not None:
+            self.trace.outcome = _outcome_of(exc_type)
+        if _current_task.get() is not self._task:
+            self._task.end, self._task.outcome = self.trace.end, self.trace.outcome
+
+
+class _SpanScope:
+    __slots__ = ('_trace', '_name', '_attrs', 'span', '_token')
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict[str, Any]):
+        self._trace = trace
+        self._name = name
+        self._attrs = attrs
+
+    def __enter__(self) -> Span:
+        self.span = Span(self._name, _current_span.get(), self._attrs)
+        self._trace.spans.append(self.span)
+        self._token = _current_span.set(len(self._trace.spans) - 1)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.span.end = time.monotonic()
+        if exc_type is not None:
+            self.span.error = _outcome_of(exc_type)
+
+
+class _NoopSpan:
+    """没有活动追踪时 span() 返回的空实现，调用方无需判断。"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class TraceStore:
+    """
+    有界的内存追踪仓库：按后台任务分组保存每个计划条目的执行时间线，并按阶段汇总耗时分位数。
+    追踪通过 contextvars 传递，asyncio.create_task 创建的子任务自动继承所在的后台任务和追踪。
+    """
+
+    def __init__(self, max_tasks: int = MAX_TASKS):
+        self._tasks: Deque[TaskTraces] = deque(maxlen=max_tasks)
+
+    def add_task(self, task: TaskTraces) -> TaskTraces:
+        self._tasks.append(task)
+        return task
+
+    def task(self, name: str) -> _TaskScope:
+        return _TaskScope(self, name)
+
+    def trace(self, kind: str, symbol: str, **attrs) -> _TraceScope:
+        return _TraceScope(self, kind, symbol, attrs)
+
+    @staticmethod
+    def span(name: str, **attrs):
+        trace = _current_trace.get()
+        if trace is None:
+            return _NOOP_SPAN
+        return _SpanScope(trace, name, attrs)
+
+    # --- 查询 ---
+    def recent_tasks(self, limit: int) -> List[TaskTraces]:
+        return list(self._tasks)[-limit:][::-1] if limit > 0 else []
+
+    def get_task(self, task_id: str) -> Optional[TaskTraces]:
+        return next((task for task in self._tasks if task.id == task_id), None)
+
+    def phase_breakdown(self, limit: int, kind: Optional[str] = None) -> Dict[str, Any]:
+        """最近 limit 个任务中各阶段 (按 span 名称) 耗时的分位数；'total' 为整条追踪的耗时。"""
+        durations: Dict[str, List[float]] = {}
+        traces = 0
+        for task in self.recent_tasks(limit):
+            for trace in task.traces:
+                if trace.end is None or (kind and trace.kind != kind):
+                    continue
+                traces += 1
+                durations.setdefault('total', []).append(trace.duration)
+                for span in trace.spans:
+                    if span.end is not None:
+                        durations.setdefault(span.name, []).append(span.duration)
+        total_time = sum(durations.get('total', ()))
+        phases = {}
+        for name, values in durations.items():
+            array = np.asarray(values) * 1000
+            p50, p90, p99 = np.percentile(array, [50, 90, 99])
+            phases[name] = {
+                'count': len(values), 'p50_ms': round(float(p50), 3), 'p90_ms': round(float(p90), 3),
+                'p99_ms': round(float(p99), 3), 'max_ms': round(float(array.max()), 3),
+                'total_ms': round(float(array.sum()), 3),
+                # 阶段总耗时占全部追踪耗时的比例；嵌套阶段与父阶段重叠，比例之和可能超过 1
+                'share': round(float(array.sum()) / (total_time * 1000), 4) if total_time > 0 else None,
+            }
+        return {'tasks': min(limit, len(self._tasks)), 'traces': traces, 'kind': kind, 'phases': phases}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "tasks": len(self._tasks),
+            "traces": sum(len(task.traces) for task in self._tasks),
+            "dropped_traces": sum(task.dropped for task in self._tasks),
+        }
+
+
+trace_store = TraceStore()
+span = trace_store.span
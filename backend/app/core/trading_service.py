@@ -1,137 +1,204 @@
 # backend/app/core/trading_service.py (最终完整版)
 import asyncio
-import threading
 import time
 from typing import Dict, Any, List, Tuple, Callable, Awaitable, Optional
 
 from fastapi import HTTPException, BackgroundTasks
 
+from .adaptive_concurrency import AdaptiveConcurrencyLimiter
 from .exchange_manager import get_exchange_for_task
+from .metrics import task_duration_seconds
+from .task_journal import task_journal, client_order_id, JournaledItem, JournaledTask, FINISHED_ITEM_STATES, \
+    ITEM_DONE, ITEM_FAILED, ITEM_FILLED, ITEM_RUNNING
+from .task_registry import task_registry, ManagedTask, symbol_key
+from .tracing import trace_store
+from .work_scheduler import WorkClass, work_scheduler
 from .websocket_manager import log_message, update_status, broadcast_progress_details, manager as ws_manager
-from ..config.config import load_settings
+from ..config.config import load_settings, is_simulated_exchange
 from ..logic.exchange_logic_async import process_order_with_sl_tp_async, close_position_async, \
-    InterruptedError, fetch_positions_with_pnl_async
+    InterruptedError, fetch_positions_with_pnl_async, build_positions_with_pnl_async, \
+    protect_opened_position_async, reconcile_client_orders_async, is_below_min_order
 from ..logic.plan_calculator import calculate_trade_plan
-from ..logic.sl_tp_logic_async import set_tp_sl_for_position_async, cleanup_orphan_sltp_orders_async
-from ..models.schemas import ExecutionPlanRequest, TradePlanRequest, SyncSltpRequest
+from ..logic.sl_tp_logic_async import set_tp_sl_for_position_async, cleanup_orphan_sltp_orders_async, \
+    SltpSyncSnapshot, _cancel_sl_tp_orders_async
+from ..logic.utils import resolve_full_symbol
+from ..models.schemas import Position, ExecutionOrderItem, ExecutionPlanRequest, TradePlanRequest, SyncSltpRequest
+
+# 任务协程的工厂：接收注册表中的任务 (进度、停止信号)，返回要执行的协程
+TaskFactory = Callable[[ManagedTask], Awaitable]
 
 
 class TradingService:
     def __init__(self):
-        self._is_running = False
-        self._stop_event = asyncio.Event()
-        self._task_progress: Dict[str, Any] = {}
-        self._lock = threading.Lock()
-        self._last_request_id: Optional[str] = None
-
+        # 初始并发数；开启 adaptive_concurrency 时在配置的上下限内按交易所的负载自动调整
         self.CONCURRENT_OPEN_TASKS = 5
         self.CONCURRENT_CLOSE_TASKS = 10
 
     def get_current_status(self) -> Dict[str, Any]:
-        with self._lock:
-            if self._is_running:
-                return {"is_running": True, "progress": self._task_progress}
-            return {"is_running": False}
-
-    async def _execute_and_log_task(self, task_name: str, task_coro: Awaitable):
+        """is_running/progress 保持原有含义 (progress 为最近启动的运行中任务)，tasks 列出全部运行中的任务。"""
+        active = task_registry.active_tasks()
+        status = {"is_running": bool(active), **task_registry.snapshot()}
+        if active:
+            status["progress"] = active[-1].progress
+        return status
+
+    async def _execute_and_log_task(self, task: ManagedTask, task_coro: Awaitable):
+        task_name = task.name
         start_time = time.time()
-        await log_message(f"--- [LOG] 后台任务 '{task_name}' 已调度，准备执行 ---", "info")
+        outcome, error = 'completed', None
+        await log_message(f"--- [LOG] 后台任务 '{task_name}' ({task.id}) 已调度，准备执行 ---", "info")
         try:
-            await task_coro
+            # 子任务通过 contextvars 继承该追踪范围，每个计划条目的执行时间线归入本次任务
+            with trace_store.task(task_name):
+                await task_coro
         except InterruptedError:
-            await log_message(f"--- [LOG] ⚠️ 任务 '{task_name}' 被用户停止 ---", "warning")
+            outcome = 'stopped'
+            await log_message(f"--- [LOG] ⚠️ 任务 '{task_name}' ({task.id}) 被用户停止 ---", "warning")
+        except asyncio.CancelledError:
+            # 进程退出时被取消：任务日志保持未完成，下次启动时恢复
+            outcome = 'cancelled'
+            raise
         except Exception as e:
-            await log_message(f"--- [LOG] ❌ 任务 '{task_name}' 执行时发生顶层异常: {e} ---", "error")
+            outcome, error = 'error', str(e)
+            await log_message(f"--- [LOG] ❌ 任务 '{task_name}' ({task.id}) 执行时发生顶层异常: {e} ---", "error")
         finally:
-            with self._lock:
-                self._is_running = False
-                self._task_progress = {}
-                self._last_request_id = None
+            final_status = {'completed': 'completed', 'stopped': 'stopped'}.get(outcome, 'failed')
+            task_registry.finish(task, final_status, error)
+            if task.journal_id and outcome != 'cancelled':
+                task_journal.end_task(task.journal_id, final_status)
             end_time = time.time()
-            await log_message(f"--- [LOG] ✅ 任务 '{task_name}' 已结束，总耗时: {end_time - start_time:.2f} 秒 ---",
-                              "success")
-            await update_status(f"'{task_name}' 已结束", is_running=False)
+            task_duration_seconds.observe(end_time - start_time, task_name, outcome)
+            await log_message(f"--- [LOG] ✅ 任务 '{task_name}' ({task.id}) 已结束，"
+                              f"总耗时: {end_time - start_time:.2f} 秒 ---", "success")
+            # 其他任务仍在运行时界面保持运行状态
+            await update_status(f"'{task_name}' 已结束", is_running=task_registry.has_active())
 
-    def _start_task(self, task_name: str, task_coro: Awaitable, background_tasks: BackgroundTasks,
+    def _start_task(self, task_name: str, task_factory: TaskFactory, background_tasks: BackgroundTasks,
                     request_id: Optional[str] = None):
         print(f"[LOG] 接收到启动 '{task_name}' 的请求 (ID: {request_id})...")
-        with self._lock:
-            if self._is_running:
-                if request_id and request_id == self._last_request_id:
-                    print(f"[LOG] ⚠️ 捕获到重复的请求ID '{request_id}'，已忽略。")
-                    return {"message": "重复的任务请求已被忽略。"}
-                print(
-                    f"[LOG] ❌ 启动 '{task_name}' 失败：已有任务 '{self._task_progress.get('task_name', '未知')}' 在运行。")
-                raise HTTPException(status_code=400, detail="已有任务在运行中，请稍后再试。")
-
-            self._is_running = True
-            self._stop_event.clear()
-            self._last_request_id = request_id
-            self._task_progress = {"task_name": task_name}
-            background_tasks.add_task(self._execute_and_log_task, task_name, task_coro)
-            print(f"[LOG] ✅ 任务 '{task_name}' (ID: {request_id}) 已成功提交到后台队列。")
-
-        return {"message": f"任务 '{task_name}' 已成功提交到后台。"}
-
-    async def _run_task_loop(self, items: List[Any], worker_func: Callable, concurrency: int, task_name: str):
+        task, created = task_registry.create(task_name, request_id)
+        if task is None:
+            running = ", ".join(t.name for t in task_registry.active_tasks())
+            print(f"[LOG] ❌ 启动 '{task_name}' 失败：同时运行的任务已达上限 ({running})。")
+            raise HTTPException(status_code=400,
+                                detail=f"同时运行的任务已达上限 ({task_registry.max_active} 个)，请稍后再试。")
+        if not created:
+            print(f"[LOG] ⚠️ 捕获到重复的请求ID '{request_id}'，已忽略。")
+            return {"message": "重复的任务请求已被忽略。", "task_id": task.id}
+
+        background_tasks.add_task(self._execute_and_log_task, task, task_factory(task))
+        print(f"[LOG] ✅ 任务 '{task_name}' ({task.id}, 请求ID: {request_id}) 已成功提交到后台队列。")
+        return {"message": f"任务 '{task_name}' 已成功提交到后台。", "task_id": task.id}
+
+    def _new_limiter(self, task_name: str, kind: str) -> AdaptiveConcurrencyLimiter:
+        """kind 为 'open' 或 'close'，对应各自的初始并发数和配置中的上下限。"""
+        settings = load_settings()
+        initial = self.CONCURRENT_OPEN_TASKS if kind == 'open' else self.CONCURRENT_CLOSE_TASKS
+        if not settings.get('adaptive_concurrency', True):
+            return AdaptiveConcurrencyLimiter.fixed(task_name, initial)
+        return AdaptiveConcurrencyLimiter(task_name, initial, settings.get(f'{kind}_concurrency_min', initial),
+                                          settings.get(f'{kind}_concurrency_max', initial),
+                                          latency_target=settings.get('concurrency_latency_target_ms', 1500) / 1000)
+
+    async def _run_task_loop(self, task: ManagedTask, items: List[Any], worker_func: Callable,
+                             limiter: AdaptiveConcurrencyLimiter, task_name: str, symbol_of: Callable[[Any], str],
+                             work_class_of: Callable[[Any], WorkClass],
+                             journal: Optional[List[Tuple[int, int]]] = None):
+        """
+        并发执行子项。每个子项占用并发名额后再获取 symbol_of(item) 所属币种的锁，
+        与其他任务操作同一币种时排队等待；排队中的子项不持有锁，不会挡住其他任务。
+        并发名额由 limiter 按子项内交易所调用的延迟和错误自动增减。
+        最后按 work_class_of(item) 在全局调度器中排队 (平仓先于开仓)，同类别内各任务轮流执行。
+        journal 与 items 对齐，为各子项在 task.journal_id 中的 (序号, 订单尝试序号的起点)，子项的状态变化记入任务日志。
+        """
         total_tasks = len(items)
         success_count, failure_count = 0, 0
-        self._task_progress = {"success_count": 0, "failed_count": 0, "total": total_tasks, "task_name": task_name}
-        await broadcast_progress_details(**self._task_progress)
+        stop_event = task.stop_event
+        task.limiter = limiter
+        task.progress = {"success_count": 0, "failed_count": 0, "total": total_tasks, "task_name": task_name,
+                         "task_id": task.id, "concurrency": limiter.limit}
+        await broadcast_progress_details(**task.progress)
 
         if not items:
             await log_message(f"任务 '{task_name}' 列表为空。", "info")
-            await broadcast_progress_details(0, 0, 0, "任务列表为空", is_final=True)
+            await broadcast_progress_details(0, 0, 0, "任务列表为空", is_final=True, task_id=task.id)
             return
 
-        semaphore = asyncio.Semaphore(concurrency)
-
-        async def worker_wrapper(item):
+        async def worker_wrapper(index, item):
             nonlocal success_count, failure_count
-            if self._stop_event.is_set(): return
-            async with semaphore:
-                if self._stop_event.is_set(): return
-                is_success = False
-                try:
-                    is_success = await worker_func(item)
-                except Exception as e:
-                    await log_message(f"执行子任务时发生意外错误: {e}", "error")
-                finally:
-                    if is_success:
-                        success_count += 1
-                    else:
-                        failure_count += 1
-                    processed = success_count + failure_count
-                    current_progress = self._task_progress.copy()
-                    current_progress.update({"success_count": success_count, "failed_count": failure_count,
-                                             "task_name": f"{task_name}: {processed}/{total_tasks}"})
-                    await broadcast_progress_details(**current_progress)
-
-        tasks = [asyncio.create_task(worker_wrapper(item)) for item in items]
+            if stop_event.is_set(): return
+            limiter.bind()
+            try:
+                async with limiter, task_registry.symbol_lock(symbol_of(item), task), \
+                        work_scheduler.slot(work_class_of(item), flow=task.id):
+                    if stop_event.is_set(): return
+                    journal_seq = None
+                    if journal is not None:
+                        journal_seq, attempt_offset = journal[index]
+                        task_journal.bind_item(task.journal_id, journal_seq, attempt_offset)
+                        task_journal.set_item_state(task.journal_id, journal_seq, ITEM_RUNNING)
+                    is_success = False
+                    try:
+                        is_success = await worker_func(item)
+                    except Exception as e:
+                        await log_message(f"执行子任务时发生意外错误: {e}", "error")
+                    except asyncio.CancelledError:
+                        # 进程退出：子项在日志中保持未完成
+                        journal_seq = None
+                        raise
+                    finally:
+                        if journal_seq is not None:
+                            task_journal.set_item_state(task.journal_id, journal_seq,
+                                                        ITEM_DONE if is_success else ITEM_FAILED)
+                        if is_success:
+                            success_count += 1
+                        else:
+                            failure_count += 1
+                        processed = success_count + failure_count
+                        task.progress.update({"success_count": success_count, "failed_count": failure_count,
+                                              "concurrency": limiter.limit})
+                        current_progress = task.progress.copy()
+                        current_progress["task_name"] = f"{task_name}: {processed}/{total_tasks}"
+                        await broadcast_progress_details(**current_progress)
+            except InterruptedError:
+                # 等待币种锁期间任务被停止
+                return
+
+        tasks = [asyncio.create_task(worker_wrapper(index, item)) for index, item in enumerate(items)]
         await asyncio.wait(tasks)
 
-        if self._stop_event.is_set(): raise InterruptedError()
+        if stop_event.is_set(): raise InterruptedError()
 
         status_text = "部分成功" if failure_count > 0 else "全部成功"
-        final_progress = self._task_progress.copy()
+        final_progress = task.progress.copy()
         final_progress.update(
             {"is_final": True, "task_name": f"{task_name} {status_text}", "success_count": success_count,
              "failed_count": failure_count})
         await broadcast_progress_details(**final_progress)
         await log_message(f"{task_name}完成, 成功: {success_count}, 失败: {failure_count}",
                           "success" if failure_count == 0 else "warning")
+        if limiter.adaptive:
+            stats = limiter.get_stats()
+            await log_message(f"{task_name}并发: 最终 {stats['limit']} (范围 {stats['lowest_limit']}-"
+                              f"{stats['peak_limit']}), 限频/超时 {stats['overload_errors']} 次", "info")
 
     def start_trading(self, plan_request: TradePlanRequest, background_tasks: BackgroundTasks):
-        return self._start_task("自动开仓", self._trading_loop_task(plan_request.model_dump()), background_tasks,
+        config = plan_request.model_dump()
+        return self._start_task("自动开仓", lambda task: self._trading_loop_task(task, config), background_tasks,
                                 plan_request.request_id)
 
-    async def stop_trading(self):
-        if not self._is_running: return {"message": "No active task."}
-        await log_message("收到停止信号，任务将在当前子项完成后停止。", "warning")
-        self._stop_event.set()
-        return {"message": "Stop event set. Task will terminate shortly."}
-
-    async def _trading_loop_task(self, config: Dict[str, Any]):
+    async def stop_trading(self, task_id: Optional[str] = None):
+        """停止指定任务；未指定 task_id 时停止全部运行中的任务。"""
+        stopped = task_registry.stop(task_id)
+        if not stopped:
+            if task_id:
+                raise HTTPException(status_code=404, detail=f"没有运行中的任务 {task_id}。")
+            return {"message": "No active task."}
+        names = ", ".join(f"'{task.name}' ({task.id})" for task in stopped)
+        await log_message(f"收到停止信号，任务 {names} 将在当前子项完成后停止。", "warning")
+        return {"message": "Stop event set. Task will terminate shortly.", "task_ids": [task.id for task in stopped]}
+
+    async def _trading_loop_task(self, task: ManagedTask, config: Dict[str, Any]):
         long_plan, short_plan = calculate_trade_plan(config, config.get('long_custom_weights', {}))
         order_plan = [item for item in (
             [{'coin': c, 'value': v, 'side': 'buy'} for c, v in long_plan.items()] if config.get(
@@ -139,53 +206,96 @@ class TradingService:
         ) + ([{'coin': c, 'value': v, 'side': 'sell'} for c, v in short_plan.items()] if config.get(
             'enable_short_trades') else [])]
 
+        task.journal_id = task_journal.begin_task('open', "自动开仓", config,
+                                                  [(plan_item['coin'], plan_item) for plan_item in order_plan])
+
         async def worker(plan_item):
-            async with get_exchange_for_task() as exchange:
-                return await process_order_with_sl_tp_async(exchange, plan_item, config, log_message, self._stop_event)
+            # 并发开仓的挂单合并为 batchOrders 提交
+            return await self._open_plan_item(task, config, plan_item, batch_orders=True)
 
-        await self._run_task_loop(order_plan, worker, self.CONCURRENT_OPEN_TASKS, "自动开仓")
+        await self._run_task_loop(task, order_plan, worker, self._new_limiter("自动开仓", 'open'), "自动开仓",
+                                  symbol_of=lambda plan_item: plan_item['coin'],
+                                  work_class_of=lambda plan_item: WorkClass.OPEN,
+                                  journal=[(seq, 0) for seq in range(len(order_plan))] if task.journal_id else None)
+
+    async def _open_plan_item(self, task: ManagedTask, config: Dict[str, Any], plan_item: Dict[str, Any],
+                              batch_orders: bool = False, filled: bool = False) -> bool:
+        """开仓子项；filled 表示开仓单已在重启前成交，只补挂止盈止损。"""
+        async with get_exchange_for_task() as exchange:
+            if filled:
+                return await protect_opened_position_async(exchange, plan_item['coin'], config, log_message,
+                                                           task.stop_event)
+            return await process_order_with_sl_tp_async(exchange, plan_item, config, log_message, task.stop_event,
+                                                        batch_orders=batch_orders)
 
     def dispatch_tasks(self, task_name: str, tasks_data: List[Tuple[str, float]], task_type: str,
                        config: Dict[str, Any], background_tasks: BackgroundTasks, request_id: Optional[str] = None):
-        task_coro = self._generic_task_loop(tasks_data, task_type, config, task_name)
-        return self._start_task(task_name, task_coro, background_tasks, request_id)
+        return self._start_task(task_name, lambda task: self._generic_task_loop(task, tasks_data, task_type, config,
+                                                                                task_name),
+                                background_tasks, request_id)
 
-    async def _generic_task_loop(self, tasks_data: List, task_type: str, config: Dict[str, Any], task_name: str):
+    async def _generic_task_loop(self, task: ManagedTask, tasks_data: List, task_type: str, config: Dict[str, Any],
+                                 task_name: str):
         async def worker(task_item):
             if task_type == 'CLOSE_ORDER':
                 full_symbol, ratio = task_item
                 async with get_exchange_for_task() as exchange:
-                    is_success = await close_position_async(exchange, full_symbol, ratio, log_message, self._stop_event)
+                    is_success = await close_position_async(exchange, full_symbol, ratio, log_message,
+                                                            task.stop_event)
                     if is_success:
                         await ws_manager.broadcast(
                             {"type": "position_closed", "payload": {"full_symbol": full_symbol, "ratio": ratio}})
                     return is_success
             return False
 
-        await self._run_task_loop(tasks_data, worker, self.CONCURRENT_CLOSE_TASKS, task_name)
+        await self._run_task_loop(task, tasks_data, worker, self._new_limiter(task_name, 'close'), task_name,
+                                  symbol_of=lambda task_item: task_item[0],
+                                  work_class_of=lambda task_item: WorkClass.RISK)
 
     def sync_all_sltp(self, settings: SyncSltpRequest, background_tasks: BackgroundTasks):
-        return self._start_task("同步所有止盈止损", self._sync_sltp_task(settings.model_dump()), background_tasks,
-                                settings.request_id)
+        sync_settings = settings.model_dump()
+        return self._start_task("同步所有止盈止损", lambda task: self._sync_sltp_task(task, sync_settings),
+                                background_tasks, settings.request_id)
 
-    async def _sync_sltp_task(self, settings: dict):
+    async def _sync_sltp_task(self, task: ManagedTask, settings: dict):
         task_name = "同步SL/TP"
         async with get_exchange_for_task() as exchange:
-            positions = await fetch_positions_with_pnl_async(exchange, settings.get('leverage', 1))
+            # 快照期间其他任务正在操作的币种：其 SL/TP 可能已挂出而仓位尚未出现在快照中
+            busy_symbols = set(task_registry.locked_symbols(exclude=task))
+            # 全账户的持仓和挂单只各取一次，按交易对索引后供所有仓位共享
+            snapshot = await SltpSyncSnapshot.capture(exchange)
+            positions = await build_positions_with_pnl_async(exchange, snapshot.raw_positions,
+                                                             settings.get('leverage', 1))
 
-            async def worker(pos):
-                return await set_tp_sl_for_position_async(exchange, pos, settings, log_message, self._stop_event)
+            report: Dict[str, Dict[str, int]] = {}
 
-            await self._run_task_loop(positions, worker, self.CONCURRENT_CLOSE_TASKS, task_name)
-            if not self._stop_event.is_set():
+            async def worker(pos):
+                return await set_tp_sl_for_position_async(exchange, pos, settings, log_message, task.stop_event,
+                                                          report, snapshot)
+
+            await self._run_task_loop(task, positions, worker, self._new_limiter(task_name, 'close'), task_name,
+                                      symbol_of=lambda pos: pos.full_symbol,
+                                      work_class_of=lambda pos: WorkClass.PROTECT)
+            if report:
+                totals = {key: sum(counts[key] for counts in report.values())
+                          for key in ('unchanged', 'amended', 'created', 'cancel_failed')}
+                await log_message(f"SL/TP对账汇总 ({len(report)} 个仓位): 未变 {totals['unchanged']}, "
+                                  f"修改 {totals['amended']}, 新建 {totals['created']}, "
+                                  f"撤单失败 {totals['cancel_failed']}",
+                                  "warning" if totals['cancel_failed'] else "info")
+            if not task.stop_event.is_set():
                 active_symbols = {p.full_symbol for p in positions}
-                await cleanup_orphan_sltp_orders_async(exchange, active_symbols, log_message)
+                # 不清理其他任务正在开平仓的币种，它们的挂单由各自的任务负责
+                busy_symbols.update(task_registry.locked_symbols(exclude=task))
+                active_symbols.update(order['symbol'] for order in snapshot.all_open_orders()
+                                      if symbol_key(order['symbol']) in busy_symbols)
+                await cleanup_orphan_sltp_orders_async(exchange, active_symbols, log_message, snapshot)
 
     def execute_rebalance_plan(self, plan: ExecutionPlanRequest, background_tasks: BackgroundTasks):
-        return self._start_task("执行仓位再平衡", self._rebalance_execution_task(plan), background_tasks,
-                                plan.request_id)
+        return self._start_task("执行仓位再平衡", lambda task: self._rebalance_execution_task(task, plan),
+                                background_tasks, plan.request_id)
 
-    async def _rebalance_execution_task(self, plan: ExecutionPlanRequest):
+    async def _rebalance_execution_task(self, task: ManagedTask, plan: ExecutionPlanRequest):
         config = load_settings()
         task_name = "执行再平衡"
 
@@ -194,31 +304,183 @@ class TradingService:
             all_positions = await fetch_positions_with_pnl_async(exchange_for_snapshot, config.get('leverage', 1))
             position_map = {p.symbol: p.full_symbol for p in all_positions}
 
+        task.journal_id = task_journal.begin_task('rebalance', "执行再平衡", {},
+                                                  [(item.symbol, item.model_dump()) for item in plan.orders])
+
         async def worker(order_item):
-            if self._stop_event.is_set(): return False
-            async with get_exchange_for_task() as exchange:
-                if order_item.action == 'CLOSE':
-                    base_symbol = order_item.symbol
-                    full_symbol = position_map.get(base_symbol)
-
-                    if not full_symbol:
-                        await log_message(f"⚠️ 无法为 {base_symbol} 找到当前持仓的完整交易对名称，跳过平仓。", "warning")
-                        return False
-
-                    is_success = await close_position_async(exchange, full_symbol, order_item.close_ratio, log_message,
-                                                            self._stop_event)
-                    if is_success:
-                        await ws_manager.broadcast({"type": "position_closed", "payload": {"full_symbol": full_symbol,
-                                                                                           "ratio": order_item.close_ratio}})
-                    return is_success
-                elif order_item.action == 'OPEN':
-                    order_plan_item = {'coin': order_item.symbol, 'value': order_item.value_to_trade,
-                                       'side': order_item.side}
-                    return await process_order_with_sl_tp_async(exchange, order_plan_item, config, log_message,
-                                                                self._stop_event)
+            return await self._rebalance_order_item(task, config, position_map, order_item)
+
+        await self._run_task_loop(task, plan.orders, worker, self._new_limiter(task_name, 'open'), task_name,
+                                  symbol_of=lambda order_item: order_item.symbol,
+                                  work_class_of=self._rebalance_work_class,
+                                  journal=[(seq, 0) for seq in range(len(plan.orders))] if task.journal_id else None)
+
+    @staticmethod
+    def _rebalance_work_class(order_item: ExecutionOrderItem) -> WorkClass:
+        return WorkClass.RISK if order_item.action == 'CLOSE' else WorkClass.OPEN
+
+    async def _rebalance_order_item(self, task: ManagedTask, config: Dict[str, Any], position_map: Dict[str, str],
+                                    order_item: ExecutionOrderItem, filled: bool = False) -> bool:
+        """再平衡子项；filled 表示订单已在重启前成交，只补做成交后的步骤。"""
+        if task.stop_event.is_set(): return False
+        if order_item.action == 'OPEN':
+            order_plan_item = {'coin': order_item.symbol, 'value': order_item.value_to_trade, 'side': order_item.side}
+            return await self._open_plan_item(task, config, order_plan_item, filled=filled)
+        if order_item.action != 'CLOSE':
             return False
-
-        await self._run_task_loop(plan.orders, worker, self.CONCURRENT_OPEN_TASKS, task_name)
-
+        async with get_exchange_for_task() as exchange:
+            base_symbol = order_item.symbol
+            full_symbol = position_map.get(base_symbol)
+
+            if filled:
+                # 平仓单已成交：全部平仓时清理残留的SL/TP挂单，不再重复平仓
+                full_symbol = full_symbol or resolve_full_symbol(exchange, base_symbol)
+                if full_symbol and abs(order_item.close_ratio - 1.0) < 1e-9:
+                    await _cancel_sl_tp_orders_async(exchange, full_symbol, log_message)
+                return True
+
+            if not full_symbol:
+                await log_message(f"⚠️ 无法为 {base_symbol} 找到当前持仓的完整交易对名称，跳过平仓。", "warning")
+                return False
+
+            is_success = await close_position_async(exchange, full_symbol, order_item.close_ratio, log_message,
+                                                    task.stop_event)
+            if is_success:
+                await ws_manager.broadcast({"type": "position_closed", "payload": {"full_symbol": full_symbol,
+                                                                                   "ratio": order_item.close_ratio}})
+            return is_success
+
+    # --- 重启后恢复 ---
+    async def resume_journaled_tasks(self):
+        """启动时检查任务日志：上次进程退出时仍在执行的任务先与交易所对账，再只执行未完成的子项。"""
+        unfinished = await task_journal.load_unfinished()
+        if not unfinished:
+            return
+        settings = load_settings()
+        max_age = settings.get('task_resume_max_age_seconds', 6 * 3600)
+        for journaled in unfinished:
+            reason = None
+            if not settings.get('resume_tasks_on_startup', True):
+                reason = "未开启启动时恢复"
+            elif is_simulated_exchange(settings):
+                reason = "模拟交易所重启后账户已重置"
+            elif time.time() - journaled.updated_at > max_age:
+                reason = "计划已过时"
+            if reason:
+                task_journal.end_task(journaled.journal_id, 'abandoned')
+                await log_message(f"上次未完成的任务 '{journaled.name}' 不再恢复 ({reason})。", "warning")
+                continue
+            self.resume_task(journaled)
+
+    def resume_task(self, journaled: JournaledTask) -> Optional[ManagedTask]:
+        task, _ = task_registry.create(f"{journaled.name} (恢复)")
+        if task is None:
+            print(f"[LOG] ❌ 恢复 '{journaled.name}' 失败：同时运行的任务已达上限。")
+            return None
+        task.journal_id = journaled.journal_id
+        task_journal.note_resumed()
+        asyncio.create_task(self._execute_and_log_task(task, self._resumed_task_loop(task, journaled)))
+        return task
+
+    async def _reconcile_journaled_item(self, exchange, journal_id: str, item: JournaledItem
+                                        ) -> Tuple[Optional[str], List[dict]]:
+        """
+        按日志中的客户订单号 (以及下一次尝试可能用到的订单号，覆盖下单后日志未来得及写入的情况) 查询订单，
+        撤销仍在挂单的订单，返回 (交易对, 查到的订单)。
+        """
+        symbol = item.orders[-1].symbol if item.orders else resolve_full_symbol(exchange, item.symbol)
+        if not symbol:
+            return None, []
+        client_order_ids = [order.client_order_id for order in item.orders]
+        client_order_ids.append(client_order_id(journal_id, item.seq, item.last_attempt + 1))
+        return symbol, await reconcile_client_orders_async(exchange, symbol, client_order_ids)
+
+    @staticmethod
+    def _apply_reconciled_fills(exchange, journal_id: str, item: JournaledItem, symbol: str, orders: List[dict],
+                                position: Optional[Position]):
+        """
+        对比成交数量与子项目标：全部成交的标记为 filled (只补做后续步骤)；部分成交的只继续剩余部分 (item.remainder)；
+        剩余部分低于最小下单限制时按全部成交处理。
+        """
+        filled = sum(float(order.get('filled') or 0) for order in orders)
+        if filled <= 0:
+            return
+        payload, remainder = item.payload, None
+        last_price = float(orders[-1].get('average') or orders[-1].get('price') or 0) or 1.0
+        if 'coin' in payload or payload.get('action') == 'OPEN':
+            # 开仓：目标为名义价值，扣除各次尝试已成交的价值
+            value_key = 'value' if 'coin' in payload else 'value_to_trade'
+            filled_value = sum(float(order.get('filled') or 0) * float(order.get('average') or order.get('price') or 0)
+                               for order in orders)
+            remaining_value = float(payload[value_key] or 0) - filled_value
+            if not is_below_min_order(exchange, symbol, remaining_value / last_price, last_price):
+                remainder = {**payload, value_key: remaining_value}
+        else:
+            # 平仓：按比例 1.0 的平掉剩余全部仓位；部分平仓的目标数量即首个订单的数量
+            contracts_now = position.contracts if position else 0.0
+            target = float(orders[0].get('amount') or 0)
+            remaining = contracts_now if abs(payload['close_ratio'] - 1.0) < 1e-9 else min(target - filled,
+                                                                                            contracts_now)
+            if not is_below_min_order(exchange, symbol, remaining, last_price):
+                remainder = {**payload, 'close_ratio': min(1.0, remaining / contracts_now)}
+        detail = {'reconciled_filled': filled}
+        if remainder is None:
+            item.state = ITEM_FILLED
+            task_journal.set_item_state(journal_id, item.seq, ITEM_FILLED, detail=detail)
+        else:
+            item.remainder = remainder
+            task_journal.record_event(journal_id, item.seq, 'partially_filled', {**detail, 'remainder': remainder})
+
+    async def _resumed_task_loop(self, task: ManagedTask, journaled: JournaledTask):
+        items = [item for item in journaled.items if item.state not in FINISHED_ITEM_STATES]
+        task_name = journaled.name
+        async with get_exchange_for_task() as exchange:
+            to_reconcile = [item for item in items if item.state != ITEM_FILLED]
+            results = await asyncio.gather(*(self._reconcile_journaled_item(exchange, journaled.journal_id, item)
+                                             for item in to_reconcile))
+            # 挂单全部撤销后再取持仓，部分平仓按当前仓位换算剩余比例
+            positions = {p.symbol: p for p in
+                         await fetch_positions_with_pnl_async(exchange, load_settings().get('leverage', 1))}
+            for item, (symbol, orders) in zip(to_reconcile, results):
+                if orders:
+                    self._apply_reconciled_fills(exchange, journaled.journal_id, item, symbol, orders,
+                                                 positions.get(item.symbol))
+        position_map = {base: p.full_symbol for base, p in positions.items()}
+        filled_count = sum(item.state == ITEM_FILLED for item in items)
+        partial_count = sum(item.remainder is not None for item in items)
+        await log_message(f"恢复任务 '{task_name}': 剩余 {len(items)}/{len(journaled.items)} 个子项，"
+                          f"其中 {filled_count} 个订单已成交 (只补做后续步骤)，"
+                          f"{partial_count} 个部分成交 (继续剩余部分)。", "info")
+
+        if journaled.kind == 'open':
+            config = journaled.plan
+
+            async def run_item(item, payload, filled):
+                return await self._open_plan_item(task, config, payload, batch_orders=True, filled=filled)
+
+            limiter, work_class_of = self._new_limiter(task_name, 'open'), lambda item: WorkClass.OPEN
+        else:
+            config = load_settings()
+
+            async def run_item(item, payload, filled):
+                return await self._rebalance_order_item(task, config, position_map, ExecutionOrderItem(**payload),
+                                                        filled=filled)
+
+            limiter = self._new_limiter(task_name, 'open')
+            work_class_of = lambda item: self._rebalance_work_class(ExecutionOrderItem(**item.payload))
+
+        async def worker(item):
+            if item.remainder is None:
+                return await run_item(item, item.payload, item.state == ITEM_FILLED)
+            is_success = await run_item(item, item.remainder, False)
+            if not is_success and not task.stop_event.is_set() and item.payload.get('action', 'OPEN') == 'OPEN':
+                # 剩余部分未能开出时，至少为已成交的仓位挂上止盈止损
+                await run_item(item, item.payload, True)
+            return is_success
+
+        # 跳过已查询过的订单号，重新下单时不与重启前的订单重名
+        await self._run_task_loop(task, items, worker, limiter, task_name, symbol_of=lambda item: item.symbol,
+                                  work_class_of=work_class_of,
+                                  journal=[(item.seq, item.last_attempt + 1) for item in items])
 
 trading_service = TradingService()
\ No newline at end of file
@@ -0,0 +1,121 @@
+# backend/app/core/user_stream.py
+import asyncio
+import contextlib
+import json
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+
+from .exchange_manager import exchange_pool
+from ..config.config import load_settings
+from ..logic.order_events import OrderEventHub, order_event_hub
+
+MAINNET_WS_BASE_URL = "wss://fstream.binance.com/ws/"
+TESTNET_WS_BASE_URL = "wss://stream.binancefuture.com/ws/"
+
+
+class UserDataStream:
+    """
+    维护币安 U 本位合约的用户数据流 (listenKey) WebSocket 连接，把事件推送到 OrderEventHub。
+    断线后自动重连；连接期间 hub.connected 为 True，交易逻辑据此决定是否回退到 REST 轮询。
+
+    ws_base_url / listen_key_factory 可注入，用于连接本地的模拟 WebSocket 服务回放录制的事件。
+    """
+
+    def __init__(self, hub: OrderEventHub, ws_base_url: Optional[str] = None,
+                 listen_key_factory: Optional[Callable[[], Awaitable[str]]] = None,
+                 keepalive_interval: float = 30 * 60, reconnect_delay: float = 5.0, max_reconnect_delay: float = 60.0):
+        self._hub = hub
+        self._ws_base_url = ws_base_url
+        self._listen_key_factory = listen_key_factory
+        self._keepalive_interval = keepalive_interval
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self._hub.set_connected(False)
+
+    async def _create_listen_key(self) -> str:
+        if self._listen_key_factory:
+            return await self._listen_key_factory()
+        async with exchange_pool.acquire() as exchange:
+            response = await exchange.fapiPrivatePostListenKey()
+        return response['listenKey']
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self._keepalive_interval)
+            if self._listen_key_factory:
+                continue
+            try:
+                async with exchange_pool.acquire() as exchange:
+                    await exchange.fapiPrivatePutListenKey()
+            except Exception as e:
+                print(f"--- [WARNING] 用户数据流 listenKey 续期失败: {e} ---")
+
+    @staticmethod
+    async def _watch_settings(ws: aiohttp.ClientWebSocketResponse, settings: dict):
+        """API Key 或网络配置变化后主动断开，让重连逻辑用新账户重新申请 listenKey。"""
+        keys = ('api_key', 'use_testnet', 'enable_proxy', 'proxy_url')
+        while True:
+            await asyncio.sleep(5)
+            current = load_settings()
+            if any(current.get(k) != settings.get(k) for k in keys):
+                print("--- [INFO] 交易所配置已变化，用户数据流将重新连接。 ---")
+                await ws.close()
+                return
+
+    def _resolve_ws_base_url(self, settings: dict) -> str:
+        if self._ws_base_url:
+            return self._ws_base_url
+        return TESTNET_WS_BASE_URL if settings.get('use_testnet') else MAINNET_WS_BASE_URL
+
+    async def _run(self):
+        delay = self._reconnect_delay
+        while True:
+            settings = load_settings()
+            proxy = settings.get('proxy_url') if settings.get('enable_proxy') else None
+            keepalive_task = watch_task = None
+            try:
+                listen_key = await self._create_listen_key()
+                url = self._resolve_ws_base_url(settings) + listen_key
+                async with exchange_pool.session.ws_connect(url, heartbeat=60, proxy=proxy) as ws:
+                    self._hub.set_connected(True)
+                    delay = self._reconnect_delay
+                    print("--- [INFO] 用户数据流已连接，订单成交将通过推送确认。 ---")
+                    keepalive_task = asyncio.create_task(self._keepalive())
+                    watch_task = asyncio.create_task(self._watch_settings(ws, settings))
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            if msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                                break
+                            continue
+                        event = json.loads(msg.data)
+                        if event.get('e') == 'listenKeyExpired':
+                            print("--- [WARNING] 用户数据流 listenKey 已过期，正在重连... ---")
+                            break
+                        self._hub.dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"--- [WARNING] 用户数据流连接异常，{delay:.0f} 秒后重连: {e} ---")
+            finally:
+                self._hub.set_connected(False)
+                for task in (keepalive_task, watch_task):
+                    if task:
+                        task.cancel()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_reconnect_delay)
+
+
+user_data_stream = UserDataStream(order_event_hub)
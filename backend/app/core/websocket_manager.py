@@ -2,67 +2,273 @@
 import asyncio
 import datetime
 import json
+import time
 from collections import deque
-from typing import List, Deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
 
 from fastapi import WebSocket
 
+from .metrics import registry, websocket_broadcast_seconds, websocket_send_seconds, websocket_messages_dropped_total, \
+    websocket_disconnects_total
+from ..config.config import load_settings
+
 LOG_HISTORY: Deque[dict] = deque(maxlen=200)
 
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DISCONNECT = 'disconnect'
+
+
+def _coalesce_key(data: dict) -> Optional[Tuple[Any, ...]]:
+    """同一键的消息只需送达最新一条：进度按任务合并，状态和心跳各保留一条。"""
+    message_type = data.get("type")
+    if message_type == "progress_update":
+        return message_type, (data.get("payload") or {}).get("task_id")
+    if message_type in ("status", "pong"):
+        return message_type,
+    return None
+
+
+class ClientConnection:
+    """
+    一个界面连接的发送端：有界的待发送队列和独立的写协程，慢客户端只会让自己的队列变长，不影响其他连接和交易流程。
+    日志与事件分开排队：事件 (进度、状态、平仓通知) 先于日志发送，进度和状态在队列中合并为最新一条。
+    """
+
+    def __init__(self, websocket: WebSocket, manager: 'WebSocketManager', max_logs: int, max_events: int,
+                 overflow_policy: str, send_timeout: float):
+        self.websocket = websocket
+        self._manager = manager
+        self._max_logs = max_logs
+        self._max_events = max_events
+        self._overflow_policy = overflow_policy
+        self._send_timeout = send_timeout
+        self._logs: Deque[str] = deque()
+        # (合并键, 消息)；可合并的消息在队列中只占一个位置，发送时取 _pending 中的最新内容
+        self._events: Deque[Tuple[Optional[Tuple[Any, ...]], Optional[str]]] = deque()
+        self._pending: Dict[Tuple[Any, ...], str] = {}
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._sending_since: Optional[float] = None
+        self.connected_at = time.time()
+        self.stats = {"sent": 0, "dropped_logs": 0, "coalesced": 0, "peak_depth": 0}
+        self._writer = asyncio.create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        return len(self._logs) + len(self._events)
+
+    def stalled(self, now: float) -> bool:
+        """当前这条消息的发送已超时。在有新消息入队时检查，没有新消息时卡住的连接不影响任何人。"""
+        return self._sending_since is not None and now - self._sending_since > self._send_timeout
+
+    def enqueue(self, data: dict, message: str) -> bool:
+        """放入发送队列 (不等待网络)。返回 False 表示队列溢出，应断开该连接。"""
+        if data.get("type") == "log":
+            if len(self._logs) >= self._max_logs:
+                if self._overflow_policy == OVERFLOW_DISCONNECT:
+                    return False
+                self._logs.popleft()
+                self.stats["dropped_logs"] += 1
+                websocket_messages_dropped_total.inc('log_overflow')
+            self._logs.append(message)
+        else:
+            key = _coalesce_key(data)
+            if key is not None and key in self._pending:
+                self._pending[key] = message
+                self.stats["coalesced"] += 1
+                websocket_messages_dropped_total.inc('coalesced')
+                return True
+            if len(self._events) >= self._max_events:
+                # 事件不能丢弃 (界面状态会出错)，客户端重连后重新获取状态
+                return False
+            if key is not None:
+                self._pending[key] = message
+                self._events.append((key, None))
+            else:
+                self._events.append((None, message))
+        self.stats["peak_depth"] = max(self.stats["peak_depth"], self.depth)
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    def _next_message(self) -> str:
+        if self._events:
+            key, message = self._events.popleft()
+            return self._pending.pop(key) if key is not None else message
+        return self._logs.popleft()
+
+    async def _run(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._events or self._logs:
+                    message = self._next_message()
+                    self._sending_since = time.monotonic()
+                    await self.websocket.send_text(message)
+                    websocket_send_seconds.observe(time.monotonic() - self._sending_since)
+                    self._sending_since = None
+                    self.stats["sent"] += 1
+                self._idle.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._manager.drop(self, 'send_error')
+
+    async def drain(self):
+        idle = asyncio.ensure_future(self._idle.wait())
+        try:
+            await asyncio.wait({idle, self._writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            idle.cancel()
+
+    def close(self):
+        self._writer.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "depth": self.depth, "queued_logs": len(self._logs),
+                "queued_events": len(self._events), "connected_seconds": round(time.time() - self.connected_at, 1)}
+
+
 class WebSocketManager:
+    """
+    向所有界面连接广播消息。broadcast 只把消息放入每个连接自己的有界队列 (O(1)，不等待网络)，
+    由各连接的写协程发送；日志、进度等调用方在交易流程中不会被卡住的浏览器标签页拖慢。
+    """
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self._stats = {"messages": 0, "dropped_logs": 0, "coalesced": 0, "disconnected": 0}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.add(websocket)
+
+    def add(self, websocket: WebSocket) -> ClientConnection:
+        """登记已建立的连接，并把历史日志放入其发送队列。"""
+        settings = load_settings()
+        client = ClientConnection(websocket, self, max(1, int(settings.get('websocket_log_queue_size', 500))),
+                                  max(1, int(settings.get('websocket_event_queue_size', 200))),
+                                  settings.get('websocket_overflow_policy', OVERFLOW_DROP_OLDEST),
+                                  float(settings.get('websocket_send_timeout_seconds', 10)))
+        self.clients[websocket] = client
         if LOG_HISTORY:
-            asyncio.create_task(self.send_history(websocket))
+            self.send_history(client)
+        return client
 
-    async def send_history(self, websocket: WebSocket):
+    @staticmethod
+    def send_history(client: ClientConnection):
+        header = {"type": "log", "payload": {"message": "--- 加载历史日志 ---", "level": "info", "timestamp": ""}}
+        for log_entry in [header, *LOG_HISTORY]:
+            client.enqueue(log_entry, json.dumps(log_entry))
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            self._retire(client)
+
+    def drop(self, client: ClientConnection, reason: str):
+        """服务端主动断开跟不上的连接 (界面会自动重连并重新加载历史日志)。"""
+        if self.clients.get(client.websocket) is not client:
+            return
+        del self.clients[client.websocket]
+        self._retire(client)
+        self._stats["disconnected"] += 1
+        websocket_disconnects_total.inc(reason)
+        print(f"--- [WARNING] WebSocket 客户端发送跟不上 ({reason})，已断开。 ---")
+        asyncio.create_task(self._close_socket(client.websocket))
+
+    def _retire(self, client: ClientConnection):
+        client.close()
+        self._stats["dropped_logs"] += client.stats["dropped_logs"]
+        self._stats["coalesced"] += client.stats["coalesced"]
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket):
         try:
-            await websocket.send_text(json.dumps({
-                "type": "log", "payload": {"message": "--- 加载历史日志 ---", "level": "info", "timestamp": ""}
-            }))
-            for log_entry in list(LOG_HISTORY):
-                await websocket.send_text(json.dumps(log_entry))
+            await websocket.close(code=1013)
         except Exception:
             pass
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def broadcast(self, data: dict):
+    def publish(self, data: dict):
+        """把消息放入所有连接的发送队列后立即返回。"""
         if data.get("type") == "log": LOG_HISTORY.append(data)
-        if not self.active_connections: return
+        self._stats["messages"] += 1
+        if not self.clients: return
+        started = time.perf_counter()
         message = json.dumps(data)
-        tasks = [conn.send_text(message) for conn in self.active_connections]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        now = time.monotonic()
+        for client in list(self.clients.values()):
+            if client.stalled(now):
+                self.drop(client, 'send_timeout')
+            elif not client.enqueue(data, message):
+                self.drop(client, 'overflow')
+        websocket_broadcast_seconds.observe(time.perf_counter() - started, data.get("type", "unknown"))
+
+    async def broadcast(self, data: dict):
+        self.publish(data)
+
+    def send_to(self, websocket: WebSocket, data: dict):
+        """只发给一个连接 (如心跳回应)，同样经过该连接的发送队列，不与写协程并发写入。"""
+        client = self.clients.get(websocket)
+        if client is not None and not client.enqueue(data, json.dumps(data)):
+            self.drop(client, 'overflow')
+
+    async def drain(self):
+        """等待所有连接的发送队列清空。"""
+        await asyncio.gather(*(client.drain() for client in list(self.clients.values())))
+
+    def get_stats(self) -> Dict[str, Any]:
+        clients = list(self.clients.values())
+        return {
+            **self._stats,
+            "clients": len(clients),
+            "dropped_logs": self._stats["dropped_logs"] + sum(c.stats["dropped_logs"] for c in clients),
+            "coalesced": self._stats["coalesced"] + sum(c.stats["coalesced"] for c in clients),
+            "queue_depth": sum(c.depth for c in clients),
+            "max_queue_depth": max((c.depth for c in clients), default=0),
+            "connections": [c.get_stats() for c in clients],
+        }
+
 
 manager = WebSocketManager()
+registry.register_collector(lambda: [
+    ('websocket_clients', 'gauge', "当前连接的 WebSocket 客户端数", [({}, len(manager.clients))]),
+    ('websocket_queue_depth', 'gauge', "所有连接待发送的消息总数", [({}, sum(c.depth for c in manager.clients.values()))]),
+    ('websocket_queue_depth_max', 'gauge', "待发送消息最多的连接的队列长度",
+     [({}, max((c.depth for c in manager.clients.values()), default=0))]),
+])
 
 async def log_message(message: str, level: str = "normal"):
     timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-    await manager.broadcast({"type": "log", "payload": {"message": message, "level": level, "timestamp": timestamp}})
+    manager.publish({"type": "log", "payload": {"message": message, "level": level, "timestamp": timestamp}})
 
 async def update_status(message: str, is_running: bool = None):
     payload = {"message": message}
     if is_running is not None: payload["isRunning"] = is_running
-    await manager.broadcast({"type": "status", "payload": payload})
+    manager.publish({"type": "status", "payload": payload})
 
 # --- 核心修改在这里 ---
 # 将函数签名中的参数名改为与调用时一致的关键字参数名
-async def broadcast_progress_details(success_count: int, failed_count: int, total: int, task_name: str, is_final: bool = False):
-    """广播详细的任务进度，包括成功、失败和总数"""
-    await manager.broadcast({
+async def broadcast_progress_details(success_count: int, failed_count: int, total: int, task_name: str,
+                                     is_final: bool = False, task_id: Optional[str] = None,
+                                     concurrency: Optional[int] = None):
+    """广播详细的任务进度，包括成功、失败和总数；task_id 用于区分同时运行的多个任务，concurrency 为当前并发上限"""
+    manager.publish({
         "type": "progress_update",
         "payload": {
             "success_count": success_count,
             "failed_count": failed_count,
             "total": total,
             "task_name": task_name,
-            "is_final": is_final
+            "is_final": is_final,
+            "task_id": task_id,
+            "concurrency": concurrency,
         }
     })
-# --- 修改结束 ---
\ No newline at end of file
+# --- 修改结束 ---
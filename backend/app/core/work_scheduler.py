@@ -0,0 +1,195 @@
+# backend/app/core/work_scheduler.py
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Any, Awaitable, Deque, Dict, Optional
+
+from .metrics import DURATION_BUCKETS, LATENCY_BUCKETS, registry
+
+
+class WorkClass(IntEnum):
+    """优先级类别，数值越小越先执行。"""
+    RISK = 0  # 降低风险：撤单、平仓
+    PROTECT = 1  # 挂止盈止损
+    OPEN = 2  # 开仓
+    BACKFILL = 3  # 行情/K线回补
+
+
+# 全局同时执行的工作数
+DEFAULT_CAPACITY = 40
+# 各类别开始执行时至少要剩余的空闲名额：留给更高优先级的工作，已在执行的低优先级工作无法被抢占，
+# 因此靠预留保证平仓在大量开仓和K线下载进行时仍能立即拿到名额
+DEFAULT_RESERVE = {WorkClass.RISK: 0, WorkClass.PROTECT: 2, WorkClass.OPEN: 6, WorkClass.BACKFILL: 12}
+
+work_queue_seconds = registry.histogram(
+    'work_queue_seconds', "工作在调度器中排队的时间", ('work_class',), (0.0,) + LATENCY_BUCKETS)
+work_run_seconds = registry.histogram(
+    'work_run_seconds', "工作占用调度器名额的时间", ('work_class',), (0.1,) + DURATION_BUCKETS)
+
+_current_class: contextvars.ContextVar[Optional[WorkClass]] = contextvars.ContextVar('work_class', default=None)
+
+
+def current_work_class() -> Optional[WorkClass]:
+    """当前协程所属的优先级类别 (不在调度器中执行时为 None)，供限频器在同一端点的请求间排序。"""
+    return _current_class.get()
+
+
+@contextlib.contextmanager
+def work_class(cls: WorkClass):
+    """只改变当前协程的优先级标记 (不占用名额)，如开仓流程中挂 SL/TP 的阶段按 PROTECT 发出请求。"""
+    token = _current_class.set(cls)
+    try:
+        yield
+    finally:
+        _current_class.reset(token)
+
+
+class _ClassQueue:
+    """一个优先级类别内按 flow (如任务 ID) 轮转的公平队列：每个 flow 轮流放行一项，大任务不会挡住小任务。"""
+
+    def __init__(self):
+        self._flows: 'OrderedDict[str, Deque[asyncio.Future]]' = OrderedDict()
+        self.size = 0
+
+    def push(self, flow: str, waiter: asyncio.Future):
+        self._flows.setdefault(flow, deque()).append(waiter)
+        self.size += 1
+
+    def pop(self) -> Optional[asyncio.Future]:
+        while self._flows:
+            flow, waiters = next(iter(self._flows.items()))
+            waiter = waiters.popleft()
+            self.size -= 1
+            if waiters:
+                self._flows.move_to_end(flow)
+            else:
+                del self._flows[flow]
+            if not waiter.done():
+                return waiter
+        return None
+
+    def discard(self, flow: str, waiter: asyncio.Future):
+        waiters = self._flows.get(flow)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self.size -= 1
+            if not waiters:
+                del self._flows[flow]
+
+    @property
+    def flows(self) -> int:
+        return len(self._flows)
+
+
+class WorkScheduler:
+    """
+    交易所相关工作的中央调度器：按优先级类别严格排序，同一类别内按 flow 公平轮转。
+    任何子系统都可以通过 run() 提交协程；名额在协程完成前一直占用，协程内发出的请求按所属类别在限频器中排序。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, reserve: Optional[Dict[WorkClass, int]] = None):
+        self.capacity = capacity
+        self._reserve = dict(reserve or DEFAULT_RESERVE)
+        self._queues = {cls: _ClassQueue() for cls in WorkClass}
+        self._running = {cls: 0 for cls in WorkClass}
+        self._stats = {cls: {"submitted": 0, "queued": 0, "queue_seconds": 0.0, "max_queue_seconds": 0.0}
+                       for cls in WorkClass}
+
+    @property
+    def free(self) -> int:
+        return self.capacity - sum(self._running.values())
+
+    def _can_start(self, cls: WorkClass) -> bool:
+        if self.free <= self._reserve[cls]:
+            return False
+        # 更高 (或同一) 优先级有排队的工作时不插队
+        return all(self._queues[c].size == 0 for c in WorkClass if c <= cls)
+
+    async def run(self, cls: WorkClass, coro: Awaitable, flow: str = 'default') -> Any:
+        """按类别 cls 排队执行协程并返回其结果；flow 标识提交方，同类别内各 flow 轮流执行。"""
+        started = False
+        try:
+            async with self.slot(cls, flow):
+                started = True
+                return await coro
+        finally:
+            if not started and inspect.iscoroutine(coro):
+                # 排队期间被取消，关闭从未执行的协程
+                coro.close()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, cls: WorkClass, flow: str = 'default'):
+        stats = self._stats[cls]
+        stats["submitted"] += 1
+        started = time.monotonic()
+        if self._can_start(cls):
+            self._running[cls] += 1
+        else:
+            stats["queued"] += 1
+            waiter = asyncio.get_running_loop().create_future()
+            self._queues[cls].push(flow, waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release(cls)
+                else:
+                    self._queues[cls].discard(flow, waiter)
+                raise
+        waited = time.monotonic() - started
+        stats["queue_seconds"] += waited
+        stats["max_queue_seconds"] = max(stats["max_queue_seconds"], waited)
+        work_queue_seconds.observe(waited, cls.name.lower())
+        token = _current_class.set(cls)
+        running_since = time.monotonic()
+        try:
+            yield
+        finally:
+            _current_class.reset(token)
+            work_run_seconds.observe(time.monotonic() - running_since, cls.name.lower())
+            self._release(cls)
+
+    def _release(self, cls: WorkClass):
+        self._running[cls] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        for cls in WorkClass:
+            queue = self._queues[cls]
+            while queue.size and self.free > self._reserve[cls]:
+                waiter = queue.pop()
+                if waiter is None:
+                    break
+                self._running[cls] += 1
+                waiter.set_result(None)
+            if queue.size:
+                # 严格优先级：本类别仍有排队时，低优先级类别不放行
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        by_class = {}
+        for cls in WorkClass:
+            stats = self._stats[cls]
+            by_class[cls.name.lower()] = {
+                **stats,
+                "queue_seconds": round(stats["queue_seconds"], 3),
+                "max_queue_seconds": round(stats["max_queue_seconds"], 3),
+                "mean_queue_seconds": round(stats["queue_seconds"] / stats["submitted"], 4)
+                if stats["submitted"] else 0.0,
+                "running": self._running[cls], "waiting": self._queues[cls].size,
+                "waiting_flows": self._queues[cls].flows, "reserve": self._reserve[cls],
+            }
+        return {"capacity": self.capacity, "free": self.free, "classes": by_class}
+
+
+work_scheduler = WorkScheduler()
+registry.register_collector(lambda: [
+    ('work_scheduler_running', 'gauge', "各优先级类别正在执行的工作数",
+     [({'work_class': name}, stats['running']) for name, stats in work_scheduler.get_stats()['classes'].items()]),
+    ('work_scheduler_waiting', 'gauge', "各优先级类别排队中的工作数",
+     [({'work_class': name}, stats['waiting']) for name, stats in work_scheduler.get_stats()['classes'].items()]),
+])
@@ -0,0 +1,338 @@
+# backend/app/logic/backtest.py
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .kline_store import kline_store
+from .screening_engine import rank_candidates
+from .screening_pipeline import days_to_fetch, parse_benchmark
+from ..config.config import STABLECOIN_PREFERENCE
+
+# K线列下标，与 kline_store 的列式数组一致
+_OPEN, _CLOSE, _VOLUME = 1, 4, 5
+_DAYS_PER_YEAR = 365
+
+# 回测参数的默认值
+DEFAULT_BACKTEST_PARAMS: Dict[str, Any] = {
+    'initial_capital': 10000.0,  # 初始资金 (USDT)
+    'short_exposure': 1.0,  # 空头总名义价值占当前权益的比例
+    'rebalance_every_days': 1,  # 每隔多少天再平衡一次
+    'min_trade_value': 10.0,  # 与 generate_rebalance_plan 一致：目标币种偏离理想仓位不超过该金额时不调整
+    'fee_rate': 0.0005,  # 按成交额计的手续费率
+    'funding_rate_daily': 0.0003,  # 空头每天收取的资金费率 (为负表示支付)
+    'start_ms': None,  # 回测起止时间 (毫秒时间戳)，None 表示使用全部本地历史
+    'end_ms': None,
+}
+
+# 每个子进程中缓存最近一次映射的历史数据
+_worker_history: Dict[str, "KlineHistory"] = {}
+
+
+class KlineHistory:
+    """
+    对齐到同一日期网格的历史日线：fields 为 (3, 币种, 天) 的数组，依次是开盘价、收盘价和成交量，
+    币种在某天没有 K 线 (尚未上线或已下架) 时为 NaN。
+    """
+
+    def __init__(self, symbols: Sequence[str], timestamps: np.ndarray, fields: np.ndarray):
+        self.symbols = list(symbols)
+        self.timestamps = timestamps
+        self.fields = fields
+        self._index = {s: i for i, s in enumerate(self.symbols)}
+
+    @property
+    def open(self) -> np.ndarray:
+        return self.fields[0]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.fields[1]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self.fields[2]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def rows(self, symbols: Sequence[str]) -> np.ndarray:
+        return np.array([self._index[s] for s in symbols], dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "KlineHistory":
+        """由 kline_store 格式的 (6, n) 数组构建，所有币种的时间戳取并集。"""
+        symbols = [s for s, k in arrays.items() if k is not None and k.shape[1]]
+        if not symbols:
+            return cls([], np.empty(0), np.empty((3, 0, 0)))
+        timestamps = np.unique(np.concatenate([arrays[s][0] for s in symbols]))
+        fields = np.full((3, len(symbols), len(timestamps)), np.nan)
+        for i, symbol in enumerate(symbols):
+            klines = arrays[symbol]
+            fields[:, i, np.searchsorted(timestamps, klines[0])] = klines[(_OPEN, _CLOSE, _VOLUME), :]
+        return cls(symbols, timestamps, fields)
+
+    @classmethod
+    def from_store(cls, bases: Sequence[str], scope: str = 'mainnet', timeframe: str = '1d') -> "KlineHistory":
+        """从本地 K 线仓库读取 (不访问交易所)，每个币种按 STABLECOIN_PREFERENCE 的顺序取第一个有数据的报价。"""
+        arrays = {}
+        for base in dict.fromkeys(b.upper() for b in bases):
+            for quote in STABLECOIN_PREFERENCE:
+                klines = kline_store.read_local(scope, f"{base}{quote}", timeframe)
+                if klines.shape[1]:
+                    arrays[base] = klines
+                    break
+        return cls.from_arrays(arrays)
+
+    def save(self, directory: Path) -> Dict[str, Any]:
+        """写成一个 .npy 文件供子进程内存映射，返回的清单只包含路径、币种和时间戳。"""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"history_{os.getpid()}_{int(time.time() * 1000)}.npy"
+        tmp_path = path.with_suffix('.tmp.npy')
+        np.save(tmp_path, np.ascontiguousarray(self.fields))
+        os.replace(tmp_path, path)
+        return {'path': str(path), 'symbols': self.symbols, 'timestamps': self.timestamps.tolist()}
+
+    @classmethod
+    def load(cls, manifest: Dict[str, Any]) -> "KlineHistory":
+        fields = np.asarray(np.load(manifest['path'], mmap_mode='r'))
+        return cls(manifest['symbols'], np.asarray(manifest['timestamps'], dtype=np.float64), fields)
+
+
+def benchmark_series(history: KlineHistory, members: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    相对强度基准在日期网格上的开盘/收盘价，与 screening_engine.build_benchmark 一致：
+    单个币种直接使用；多个币种只保留所有成员都有数据的日期，按第一个共同日期的收盘价归一化后等权平均。
+    基准缺失或价格不大于 1e-8 的日期为 NaN。
+    """
+    missing = [m for m in members if m not in history]
+    if missing:
+        raise ValueError(f"本地 K 线仓库中没有基准 {', '.join(missing)} 的历史数据。")
+    rows = history.rows(members)
+    opens, closes = history.open[rows], history.close[rows]
+    common = ~(np.isnan(opens) | np.isnan(closes)).any(axis=0)
+    common_days = np.flatnonzero(common)
+    if len(common_days) == 0:
+        return np.full(len(history.timestamps), np.nan), np.full(len(history.timestamps), np.nan)
+    scale = closes[:, common_days[0]][:, None] if len(members) > 1 else 1.0
+    bench_open = (opens / scale).mean(axis=0)
+    bench_close = (closes / scale).mean(axis=0)
+    ok = common & (bench_open > 1e-8) & (bench_close > 1e-8)
+    return np.where(ok, bench_open, np.nan), np.where(ok, bench_close, np.nan)
+
+
+# --- (币种 × 天) 的因子矩阵：第 t 列等于只用截至第 t 天的 K 线计算的结果 ---
+def _change_percent(open_: np.ndarray, close: np.ndarray, lengths: np.ndarray, days: int) -> np.ndarray:
+    """KlinePanel.change_percent 在每一天上的版本：数据不足为 NaN，开盘价非正时为 0.0。"""
+    result = np.full(close.shape, np.nan)
+    if days <= 0 or days >= close.shape[1]:
+        return result
+    start = np.full(close.shape, np.nan)
+    start[:, days:] = open_[:, :-days]
+    valid = (lengths >= days + 1) & ~np.isnan(close) & ~np.isnan(start)
+    positive = valid & (start > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = (close - start) / start * 100
+    result[positive] = change[positive]
+    result[valid & ~positive] = 0.0
+    return result
+
+
+def _volume_keep(volume: np.ndarray, lengths: np.ndarray, ma_days: int, spike_ratio: float) -> np.ndarray:
+    """volume_spike_mask 在每一天上的版本：前 N 天均量用累计和一次算出。"""
+    n, d = volume.shape
+    if ma_days <= 0 or ma_days >= d:
+        return np.zeros((n, d), dtype=bool)
+    cumulative = np.zeros((n, d + 1))
+    np.cumsum(np.nan_to_num(volume), axis=1, out=cumulative[:, 1:])
+    avg_volume = np.full((n, d), np.nan)
+    avg_volume[:, ma_days:] = (cumulative[:, ma_days:d] - cumulative[:, :d - ma_days]) / ma_days
+    with np.errstate(invalid='ignore', divide='ignore'):
+        active = (lengths >= ma_days + 1) & (avg_volume >= 1e-6)
+        return active & ((volume / avg_volume) <= spike_ratio)
+
+
+class _Selector:
+    """按筛选条件逐日选出做空目标：因子和过滤条件预先算成矩阵，每天只做一次排序。"""
+
+    def __init__(self, history: KlineHistory, rows: np.ndarray, criteria: Dict[str, Any], blacklist: Sequence[str]):
+        self.method = criteria.get('method')
+        self.top_n = criteria.get('top_n')
+        open_, close, volume = history.open[rows], history.close[rows], history.volume[rows]
+        lengths = np.cumsum(~np.isnan(close), axis=1)
+
+        blacklist_upper = {b.upper() for b in blacklist}
+        allowed = np.array([history.symbols[i].upper() not in blacklist_upper for i in rows], dtype=bool)
+        with np.errstate(invalid='ignore'):
+            # 日成交额近似代替实盘使用的 24 小时成交额做流动性筛选
+            liquid = close * volume > criteria.get('min_volume_usd', 0)
+        self.eligible = (allowed[:, None] & liquid & (lengths >= days_to_fetch(criteria))
+                         & _volume_keep(volume, lengths, criteria.get('rebalance_volume_ma_days', 20),
+                                        criteria.get('rebalance_volume_spike_ratio', 3.0)))
+
+        self.foam = self.abs_momentum = self.rel_strength = None
+        if self.method == 'foam':
+            self.foam = _change_percent(open_, close, lengths, criteria.get('foam_days', 1))
+        elif self.method == 'multi_factor_weakest':
+            self.abs_momentum = _change_percent(open_, close, lengths, criteria.get('abs_momentum_days', 30))
+            bench_open, bench_close = benchmark_series(history, parse_benchmark(criteria.get('benchmark', 'BTC')))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rel_open, rel_close = open_ / bench_open, close / bench_close
+            rel_lengths = np.cumsum(~np.isnan(rel_close), axis=1)
+            self.rel_strength = _change_percent(rel_open, rel_close, rel_lengths,
+                                                criteria.get('rel_strength_days', 60))
+
+    def select(self, day: int) -> np.ndarray:
+        candidates = np.flatnonzero(self.eligible[:, day])
+        if self.method == 'foam':
+            order = rank_candidates(self.method, foam=self.foam[candidates, day])
+        elif self.method == 'multi_factor_weakest':
+            order = rank_candidates(self.method, abs_momentum=self.abs_momentum[candidates, day],
+                                    rel_strength=self.rel_strength[candidates, day])
+        else:
+            return np.empty(0, dtype=np.int64)
+        return candidates[order][:self.top_n]
+
+
+def _rebalance_notional(current: np.ndarray, targets: np.ndarray, target_value: float,
+                        min_trade_value: float) -> np.ndarray:
+    """
+    按 generate_rebalance_plan 的规则得到调整后的各币种空头名义价值：不在目标中的全部平仓，
+    新目标直接开到理想仓位，已持有的目标偏离理想仓位超过 min_trade_value 时才调整。
+    """
+    new = np.zeros_like(current)
+    if len(targets) == 0:
+        return new
+    ideal = target_value / len(targets)
+    held = current[targets]
+    new[targets] = np.where((held == 0) | (np.abs(ideal - held) > min_trade_value), ideal, held)
+    return new
+
+
+def _summarize(equity: np.ndarray, turnover: np.ndarray, fees: np.ndarray, funding: np.ndarray,
+               holdings: np.ndarray) -> Dict[str, Any]:
+    daily = equity[1:] / equity[:-1] - 1 if len(equity) > 1 else np.empty(0)
+    years = len(daily) / _DAYS_PER_YEAR
+    growth = equity[-1] / equity[0]
+    std = daily.std(ddof=1) if len(daily) > 1 else 0.0
+    peak = np.maximum.accumulate(equity)
+    return {
+        'days': len(daily),
+        'final_equity': round(float(equity[-1]), 2),
+        'total_return': round(float(growth - 1), 6),
+        'annualized_return': round(float(growth ** (1 / years) - 1), 6) if years > 0 and growth > 0 else None,
+        'annualized_volatility': round(float(std * math.sqrt(_DAYS_PER_YEAR)), 6),
+        'sharpe': round(float(daily.mean() / std * math.sqrt(_DAYS_PER_YEAR)), 4) if std > 0 else None,
+        'max_drawdown': round(float(((equity - peak) / peak).min()), 6),
+        'avg_daily_turnover': round(float(turnover.mean()), 6) if len(turnover) else 0.0,
+        'total_fees': round(float(fees.sum()), 2),
+        'total_funding': round(float(funding.sum()), 2),
+        'avg_holdings': round(float(holdings.mean()), 2) if len(holdings) else 0.0,
+    }
+
+
+def run_backtest(history: KlineHistory, criteria: Dict[str, Any], params: Optional[Dict[str, Any]] = None,
+                 blacklist: Sequence[str] = (), universe: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    逐日重放"筛选 + 生成再平衡计划"：第 t 天收盘后用截至当天的日线筛选出做空目标，
+    按收盘价调整为等权空头篮子，持有到第 t+1 天收盘。
+    每天的盈亏 = -Σ 名义价值 × 收益率 + 资金费 - 按成交额计的手续费，空头仓位随价格变动自然漂移。
+    universe 为参与筛选的币种 (默认为历史中的全部币种)，基准只需要存在于 history 中。
+    """
+    p = {**DEFAULT_BACKTEST_PARAMS, **(params or {})}
+    universe = [s for s in (universe or history.symbols) if s in history]
+    if not universe:
+        raise ValueError("回测的币种在本地 K 线仓库中都没有历史数据。")
+    rows = history.rows(universe)
+    selector = _Selector(history, rows, criteria, blacklist)
+
+    timestamps = history.timestamps
+    first = int(np.searchsorted(timestamps, p['start_ms'])) if p['start_ms'] is not None else 0
+    last = (int(np.searchsorted(timestamps, p['end_ms'], side='right')) if p['end_ms'] is not None
+            else len(timestamps)) - 1
+    if last <= first:
+        raise ValueError("回测区间内的K线数据不足两天。")
+
+    close = history.close[rows]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.nan_to_num(close[:, 1:] / close[:, :-1] - 1, nan=0.0, posinf=0.0, neginf=0.0)
+
+    every = max(1, int(p['rebalance_every_days']))
+    steps = last - first
+    equity = np.empty(steps + 1)
+    turnover, fees, funding, holdings = (np.zeros(steps) for _ in range(4))
+    equity[0] = p['initial_capital']
+    notional = np.zeros(len(rows))
+    targets = np.empty(0, dtype=np.int64)
+    for step in range(steps):
+        day = first + step
+        value = equity[step]
+        if step % every == 0:
+            targets = selector.select(day)
+            rebalanced = _rebalance_notional(notional, targets, max(value, 0.0) * p['short_exposure'],
+                                             p['min_trade_value'])
+            traded = float(np.abs(rebalanced - notional).sum())
+            turnover[step] = traded / value if value > 0 else 0.0
+            fees[step] = traded * p['fee_rate']
+            notional = rebalanced
+        daily_return = returns[:, day]
+        funding[step] = float(notional.sum()) * p['funding_rate_daily']
+        pnl = -float(notional @ daily_return)
+        notional = notional * (1 + daily_return)
+        holdings[step] = np.count_nonzero(notional)
+        equity[step + 1] = value + pnl + funding[step] - fees[step]
+
+    return {
+        'criteria': criteria,
+        'params': p,
+        'summary': _summarize(equity, turnover, fees, funding, holdings),
+        'timestamps': timestamps[first:last + 1].astype(np.int64).tolist(),
+        'equity': np.round(equity, 4).tolist(),
+        'turnover': np.round(turnover, 6).tolist(),
+        'last_targets': [universe[i] for i in targets],
+    }
+
+
+# --- 多组回测并行：历史数据写成一个内存映射文件，子进程只读共享 ---
+def _run_chunk(manifest: Dict[str, Any], runs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+               blacklist: List[str], universe: Optional[List[str]]) -> List[Dict[str, Any]]:
+    history = _worker_history.get(manifest['path'])
+    if history is None:
+        history = KlineHistory.load(manifest)
+        _worker_history.clear()
+        _worker_history[manifest['path']] = history
+    return [_run_safely(history, criteria, params, blacklist, universe) for criteria, params in runs]
+
+
+def _run_safely(history: KlineHistory, criteria: Dict[str, Any], params: Dict[str, Any], blacklist: Sequence[str],
+                universe: Optional[Sequence[str]]) -> Dict[str, Any]:
+    try:
+        return run_backtest(history, criteria, params, blacklist, universe)
+    except ValueError as e:
+        return {'criteria': criteria, 'params': {**DEFAULT_BACKTEST_PARAMS, **params}, 'error': str(e)}
+
+
+def run_backtests(history: KlineHistory, runs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                  blacklist: Sequence[str] = (), universe: Optional[Sequence[str]] = None,
+                  export_dir: Optional[Path] = None, max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """并行执行多组互不相关的回测 (筛选条件, 回测参数)，结果顺序与 runs 一致。只有一个进程时直接在当前进程运行。"""
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(runs)))
+    blacklist, universe = list(blacklist), list(universe) if universe is not None else None
+    if workers == 1:
+        return [_run_safely(history, criteria, params, blacklist, universe) for criteria, params in runs]
+
+    manifest = history.save(export_dir or Path.cwd())
+    chunk_size = max(1, math.ceil(len(runs) / (workers * 4)))
+    chunks = [runs[i:i + chunk_size] for i in range(0, len(runs), chunk_size)]
+    try:
+        # spawn：与参数扫描的进程池保持一致，子进程不继承父进程的线程状态
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(_run_chunk, manifest, chunk, blacklist, universe) for chunk in chunks]
+            return [result for future in futures for result in future.result()]
+    finally:
+        Path(manifest['path']).unlink(missing_ok=True)
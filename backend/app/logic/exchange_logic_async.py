@@ -1,56 +1,107 @@
 # backend/app/logic/exchange_logic_async.py (最终PNL计算修正版)
 import asyncio
 import datetime
-from typing import List, Optional
+import time
+from typing import Dict, List, Optional
 
 import ccxt.async_support as ccxt
+import numpy as np
 
 from .exceptions import RetriableOrderError, InterruptedError
+from .kline_store import kline_store
+from .markets_cache import install_time_resync, load_markets_cached, refresh_markets_for_unknown_symbol
+from .market_data import market_data_cache
+from .order_batcher import get_order_batcher
+from .order_events import order_event_hub
+from .position_book import position_book
+from .rate_limiter import install_rate_limiter
 from .sl_tp_logic_async import _cancel_sl_tp_orders_async, set_tp_sl_for_position_async
 from .utils import resolve_full_symbol
 from ..config import i18n
 from ..config.config import load_settings
+from ..core.metrics import maker_orders_total, order_time_to_fill_seconds, retries_total
+from ..core.task_journal import task_journal
+from ..core.tracing import span, trace_store
+from ..core.work_scheduler import WorkClass, work_class, work_scheduler
 from ..models.schemas import Position
 
 
 async def initialize_exchange_async(api_key: str, api_secret: str, use_testnet: bool, enable_proxy: bool,
-                                    proxy_url: str) -> ccxt.binanceusdm:
+                                    proxy_url: str, session=None) -> ccxt.binanceusdm:
     if not api_key or not api_secret:
         raise ConnectionError("API Key/Secret cannot be empty.")
     config = {'apiKey': api_key, 'secret': api_secret,
               'options': {'adjustForTimeDifference': True, "warnOnFetchOpenOrdersWithoutSymbol": False}}
+    if session is not None:
+        # 复用连接池提供的 aiohttp 会话 (keep-alive)，close() 时不会关闭共享会话
+        config['session'] = session
     exchange = ccxt.binanceusdm(config)
-    exchange.enableRateLimit = True
+    # 所有实例共享同一个账户级限频器，而不是各自按 enableRateLimit 独立计算额度
+    install_rate_limiter(exchange)
+    # 缓存的服务器时间差只在启动时恢复，之后遇到 -1021 再重新同步
+    install_time_resync(exchange)
     if enable_proxy and proxy_url:
         exchange.https_proxy = proxy_url
         exchange.aiohttp_proxy = proxy_url
     if use_testnet:
         exchange.set_sandbox_mode(True)
-    await exchange.load_markets()
+    await load_markets_cached(exchange, use_testnet)
     return exchange
 
 
+async def _get_mark_prices_async(exchange: ccxt.binanceusdm, symbols: List[str]) -> Dict[str, float]:
+    """批量获取标记价格：命中行情推送缓存的直接返回，其余交易对合并为一次 fetch_tickers 请求。"""
+    mark_prices, missing, missing_ids = {}, [], []
+    for symbol in symbols:
+        market_id = exchange.market(symbol)['id']
+        mark = market_data_cache.get_mark_price(market_id)
+        if mark is not None:
+            mark_prices[symbol] = mark
+        else:
+            missing.append(symbol)
+            missing_ids.append(market_id)
+    if missing:
+        market_data_cache.track(missing_ids)
+        tickers = await exchange.fetch_tickers(missing)
+        for symbol in missing:
+            ticker = tickers.get(symbol)
+            if ticker:
+                mark_prices[symbol] = float(ticker.get('mark', ticker.get('last', 0.0)))
+    return mark_prices
+
+
 async def fetch_positions_with_pnl_async(exchange: ccxt.binanceusdm, leverage: int) -> List[Position]:
     try:
-        raw_positions = await exchange.fetch_positions(None)
+        if position_book.is_live(exchange):
+            raw_positions = position_book.get_raw_positions()
+        else:
+            raw_positions, _ = await position_book.refresh(exchange)
+        return await build_positions_with_pnl_async(exchange, raw_positions, leverage)
+    except Exception as e:
+        print(f"Error during fetch_positions_with_pnl_async: {e}")
+        return []
+
+
+async def build_positions_with_pnl_async(exchange: ccxt.binanceusdm, raw_positions: List[dict],
+                                         leverage: int) -> List[Position]:
+    """把 ccxt 格式的原始持仓转换为带 PNL 的 Position 列表 (标记价格优先取行情推送缓存)。"""
+    try:
         non_zero_positions = [p for p in raw_positions if float(p.get('contracts', 0) or 0) != 0]
         if not non_zero_positions: return []
-        symbols = [p['symbol'] for p in non_zero_positions]
-        tickers = await exchange.fetch_tickers(symbols)
+        mark_prices = await _get_mark_prices_async(exchange, [p['symbol'] for p in non_zero_positions])
         final_positions = []
         for raw_pos in non_zero_positions:
             try:
                 info = raw_pos.get('info', {})
                 signed_contracts = float(info.get('positionAmt', 0.0))
                 full_symbol = raw_pos['symbol']
-                ticker = tickers.get(full_symbol)
+                mark_price = mark_prices.get(full_symbol)
 
-                if not ticker: continue
+                if mark_price is None: continue
 
                 # --- 核心修改：在这里重新计算所有收益相关的指标 ---
 
                 # 1. 获取关键价格
-                mark_price = float(ticker.get('mark', ticker.get('last', 0.0)))
                 break_even_price = float(info.get('breakEvenPrice', raw_pos.get('entryPrice', 0.0)))
 
                 # 2. 重新计算 PNL
@@ -60,7 +111,9 @@ async def fetch_positions_with_pnl_async(exchange: ccxt.binanceusdm, leverage: i
 
                 # 3. 获取其他必要数据
                 notional = mark_price * abs(signed_contracts)
-                margin = float(raw_pos.get('initialMargin', 0.0)) or (notional / leverage if leverage > 0 else 0)
+                position_leverage = float(raw_pos.get('leverage') or leverage)
+                margin = float(raw_pos.get('initialMargin') or 0.0) or (
+                    notional / position_leverage if position_leverage > 0 else 0)
 
                 # 4. 重新计算 PNL 百分比
                 pnl_percentage = (pnl / margin) * 100 if margin > 0 else 0.0
@@ -82,15 +135,30 @@ async def fetch_positions_with_pnl_async(exchange: ccxt.binanceusdm, leverage: i
                 print(f"Error processing position {raw_pos.get('symbol', 'N/A')}: {e}")
         return final_positions
     except Exception as e:
-        print(f"Error during fetch_positions_with_pnl_async: {e}")
+        print(f"Error during build_positions_with_pnl_async: {e}")
         return []
 
 
+def _trace_outcome(result: bool, stop_event: asyncio.Event) -> str:
+    if result:
+        return 'ok'
+    return 'interrupted' if stop_event.is_set() else 'failed'
+
+
 async def close_position_async(exchange: ccxt.binanceusdm, full_symbol_to_close: str, ratio: float, async_logger,
                                stop_event: asyncio.Event):
+    with trace_store.trace('close', full_symbol_to_close, ratio=ratio) as trace:
+        result = await _close_position_async(exchange, full_symbol_to_close, ratio, async_logger, stop_event)
+        trace.outcome = _trace_outcome(result, stop_event)
+        return result
+
+
+async def _close_position_async(exchange: ccxt.binanceusdm, full_symbol_to_close: str, ratio: float, async_logger,
+                                stop_event: asyncio.Event):
     try:
         if stop_event.is_set(): raise InterruptedError()
-        all_positions = await exchange.fetch_positions([full_symbol_to_close])
+        with span('fetch_position'):
+            all_positions = await exchange.fetch_positions([full_symbol_to_close])
         target_pos = next(
             (p for p in all_positions if p['symbol'] == full_symbol_to_close and float(p.get('contracts', 0)) != 0),
             None)
@@ -113,7 +181,8 @@ async def close_position_async(exchange: ccxt.binanceusdm, full_symbol_to_close:
 
         if order_result and abs(ratio - 1.0) < 1e-9:
             await async_logger(f"✅ {full_symbol_to_close} 已完全平仓，准备清理其SL/TP挂单...", "info")
-            await _cancel_sl_tp_orders_async(exchange, full_symbol_to_close, async_logger)
+            with span('cancel_sltp'):
+                await _cancel_sl_tp_orders_async(exchange, full_symbol_to_close, async_logger)
 
         return order_result
     except InterruptedError:
@@ -124,114 +193,252 @@ async def close_position_async(exchange: ccxt.binanceusdm, full_symbol_to_close:
         return False
 
 
+async def _get_maker_price_async(exchange: ccxt.binanceusdm, symbol: str, side: str) -> float:
+    """挂单价格取买一/卖一。优先读取行情推送缓存，缓存过期或尚未订阅时回退到 REST 盘口。"""
+    market_id = exchange.market(symbol)['id']
+    best = market_data_cache.get_best_bid_ask(market_id)
+    if best is not None:
+        return best[0] if side == i18n.ORDER_SIDE_BUY else best[1]
+    market_data_cache.track([market_id])
+    order_book = await exchange.fetch_order_book(symbol, limit=5)
+    return order_book['bids'][0][0] if side == i18n.ORDER_SIDE_BUY else order_book['asks'][0][0]
+
+
+async def _wait_for_order_fill_async(exchange: ccxt.binanceusdm, order_id: str, symbol: str, timeout: float,
+                                     stop_event: asyncio.Event) -> bool:
+    """
+    等待限价单成交。用户数据流在线时等待 ORDER_TRADE_UPDATE 推送，否则回退到 REST 轮询。
+    订单被撤销/过期 (例如 postOnly 被拒) 时抛出 RetriableOrderError；超时返回 False。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        if stop_event.is_set(): raise InterruptedError()
+        if order_event_hub.connected:
+            update = await order_event_hub.wait_for_final_status(order_id, min(1.0, deadline - loop.time()))
+            if update is None:
+                continue
+            if update['status'] == 'FILLED':
+                return True
+            raise RetriableOrderError(f"订单 {order_id} 未成交即终止 ({update['status']})。")
+        fetched_order = await exchange.fetch_order(order_id, symbol)
+        if fetched_order['status'] == 'closed':
+            return True
+        await asyncio.sleep(2)
+
+    # 超时前的最后一次 REST 确认，防止推送丢失时误撤已成交的订单
+    fetched_order = await exchange.fetch_order(order_id, symbol)
+    return fetched_order['status'] == 'closed'
+
+
 async def _execute_maker_order_with_retry_async(exchange: ccxt.binanceusdm, symbol: str, side: str, params: dict,
                                                 timeout: int, retries: int, async_logger, stop_event: asyncio.Event,
-                                                value_to_trade: float = None, contracts_to_trade: float = None) -> bool:
+                                                value_to_trade: float = None, contracts_to_trade: float = None,
+                                                batch_orders: bool = False) -> bool:
     order_id = None
+    purpose = 'close' if params.get('reduceOnly') else 'open'
+    started = time.monotonic()
     for attempt in range(retries + 1):
-        if stop_event.is_set(): raise InterruptedError()
-        try:
-            order_book = await exchange.fetch_order_book(symbol, limit=5)
-            price = order_book['bids'][0][0] if side == i18n.ORDER_SIDE_BUY else order_book['asks'][0][0]
-            amount = contracts_to_trade or float(exchange.amount_to_precision(symbol, (value_to_trade or 0) / price))
-
-            min_amount = exchange.market(symbol).get('limits', {}).get('amount', {}).get('min')
-            if min_amount and amount < min_amount:
-                raise ValueError(f"计算数量 {amount} 小于最小下单量 {min_amount}。")
+        if stop_event.is_set():
+            maker_orders_total.inc(purpose, 'interrupted')
+            raise InterruptedError()
+        with span('maker.attempt', attempt=attempt + 1) as attempt_span:
+            try:
+                with span('maker.book'):
+                    price = await _get_maker_price_async(exchange, symbol, side)
+                amount = contracts_to_trade or float(
+                    exchange.amount_to_precision(symbol, (value_to_trade or 0) / price))
 
-            if stop_event.is_set(): raise InterruptedError()
-            order = await exchange.create_order(symbol, 'limit', side, amount, price, {**params, 'postOnly': True})
-            order_id = order['id']
-            await async_logger(f"✅ {symbol} 限价单已提交 (ID: {order['id']})，等待成交...")
+                min_amount = exchange.market(symbol).get('limits', {}).get('amount', {}).get('min')
+                if min_amount and amount < min_amount:
+                    raise ValueError(f"计算数量 {amount} 小于最小下单量 {min_amount}。")
 
-            start_time = asyncio.get_event_loop().time()
-            while asyncio.get_event_loop().time() - start_time < timeout:
                 if stop_event.is_set(): raise InterruptedError()
-                fetched_order = await exchange.fetch_order(order_id, symbol)
-                if fetched_order['status'] == 'closed':
+                create_order = get_order_batcher(exchange).create_order if batch_orders else exchange.create_order
+                order_params = {**params, 'postOnly': True}
+                # 任务日志中的子项使用可推算的客户订单号，进程重启后即使日志未写入也能向交易所查到该订单
+                client_order_id = task_journal.item_client_order_id(attempt + 1)
+                if client_order_id:
+                    order_params['clientOrderId'] = client_order_id
+                with span('maker.submit', price=price, amount=amount) as submit_span:
+                    order = await create_order(symbol, 'limit', side, amount, price, order_params)
+                    order_id = order['id']
+                    submit_span.set('order_id', order_id)
+                task_journal.item_order_submitted(attempt + 1, order_id, symbol)
+                await async_logger(f"✅ {symbol} 限价单已提交 (ID: {order['id']})，等待成交...")
+
+                with span('maker.wait'):
+                    filled = await _wait_for_order_fill_async(exchange, order_id, symbol, timeout, stop_event)
+                if filled:
+                    order_time_to_fill_seconds.observe(time.monotonic() - started, side, purpose)
+                    maker_orders_total.inc(purpose, 'filled')
+                    task_journal.item_filled()
                     await async_logger(f"✅ {symbol} 订单 {order_id} 已成交！", "success")
                     return True
-                await asyncio.sleep(2)
 
-            raise RetriableOrderError(f"订单 {order_id} 在 {timeout} 秒内超时未成交。")
-        except InterruptedError:
-            if order_id:
-                try:
-                    await exchange.cancel_order(order_id, symbol)
-                except Exception:
-                    pass
-            raise
-
-        except (ccxt.RequestTimeout, ccxt.DDoSProtection, ccxt.ExchangeNotAvailable, ccxt.OrderImmediatelyFillable,
-                ccxt.OrderNotFillable, RetriableOrderError) as e:
-            if order_id:
-                try:
-                    await exchange.cancel_order(order_id, symbol)
-                except Exception:
-                    pass
-
-            error_msg = f"⚠️ {symbol} 订单尝试失败 (第 {attempt + 1}/{retries + 1} 次)，可重试错误: {type(e).__name__}"
-            await async_logger(error_msg, "warning")
-
-            if attempt < retries:
-                if stop_event.is_set(): raise InterruptedError()
-                await asyncio.sleep(3)
-            else:
-                await async_logger(f"❌ {symbol} 订单在 {retries + 1} 次尝试后仍然失败。", "error")
-                return False
-        except Exception as e:
-            if order_id:
-                try:
-                    await exchange.cancel_order(order_id, symbol)
-                except Exception:
-                    pass
-            await async_logger(f"🚨 {symbol} 订单发生严重错误: {e}", "error")
-            raise
+                raise RetriableOrderError(f"订单 {order_id} 在 {timeout} 秒内超时未成交。")
+            except InterruptedError:
+                maker_orders_total.inc(purpose, 'interrupted')
+                if order_id:
+                    with span('maker.cancel'):
+                        try:
+                            await exchange.cancel_order(order_id, symbol)
+                        except Exception:
+                            pass
+                raise
+
+            except (ccxt.RequestTimeout, ccxt.DDoSProtection, ccxt.ExchangeNotAvailable, ccxt.OrderImmediatelyFillable,
+                    ccxt.OrderNotFillable, RetriableOrderError) as e:
+                attempt_span.set('error', type(e).__name__)
+                if order_id:
+                    with span('maker.cancel'):
+                        try:
+                            await exchange.cancel_order(order_id, symbol)
+                        except Exception:
+                            pass
+
+                error_msg = f"⚠️ {symbol} 订单尝试失败 (第 {attempt + 1}/{retries + 1} 次)，可重试错误: {type(e).__name__}"
+                await async_logger(error_msg, "warning")
+
+                if attempt < retries:
+                    retries_total.inc('maker_order', type(e).__name__)
+                    if stop_event.is_set():
+                        maker_orders_total.inc(purpose, 'interrupted')
+                        raise InterruptedError()
+                    with span('maker.backoff'):
+                        await asyncio.sleep(3)
+                else:
+                    maker_orders_total.inc(purpose, 'failed')
+                    await async_logger(f"❌ {symbol} 订单在 {retries + 1} 次尝试后仍然失败。", "error")
+                    return False
+            except Exception as e:
+                maker_orders_total.inc(purpose, 'error')
+                if order_id:
+                    with span('maker.cancel'):
+                        try:
+                            await exchange.cancel_order(order_id, symbol)
+                        except Exception:
+                            pass
+                await async_logger(f"🚨 {symbol} 订单发生严重错误: {e}", "error")
+                raise
 
     return False
 
 
 async def process_order_with_sl_tp_async(exchange: ccxt.binanceusdm, plan: dict, config: dict, async_logger,
-                                         stop_event: asyncio.Event) -> bool:
+                                         stop_event: asyncio.Event, batch_orders: bool = False) -> bool:
+    with trace_store.trace('open', plan['coin'], side=plan['side'], value=plan['value']) as trace:
+        result = await _process_order_with_sl_tp_async(exchange, plan, config, async_logger, stop_event, batch_orders)
+        trace.outcome = _trace_outcome(result, stop_event)
+        return result
+
+
+async def _process_order_with_sl_tp_async(exchange: ccxt.binanceusdm, plan: dict, config: dict, async_logger,
+                                          stop_event: asyncio.Event, batch_orders: bool) -> bool:
     base_coin = plan['coin']
-    full_symbol = resolve_full_symbol(exchange, base_coin)
+    with span('resolve_symbol'):
+        full_symbol = resolve_full_symbol(exchange, base_coin)
+        if not full_symbol and await refresh_markets_for_unknown_symbol(exchange):
+            full_symbol = resolve_full_symbol(exchange, base_coin)
     if not full_symbol: raise Exception(f"找不到 {base_coin} 的可用交易对。")
     if stop_event.is_set(): raise InterruptedError()
-    await exchange.set_leverage(config['leverage'], full_symbol)
+    with span('set_leverage'):
+        await exchange.set_leverage(config['leverage'], full_symbol)
 
     filled = await _execute_maker_order_with_retry_async(
         exchange, full_symbol, plan['side'], {}, config['open_order_fill_timeout_seconds'],
-        config['open_maker_retries'], async_logger, stop_event, value_to_trade=plan['value']
+        config['open_maker_retries'], async_logger, stop_event, value_to_trade=plan['value'],
+        batch_orders=batch_orders
     )
     if not filled:
         return False
 
     if stop_event.is_set(): return False
+    await _protect_opened_position_async(exchange, base_coin, config, async_logger, stop_event)
+    return True
+
+
+async def protect_opened_position_async(exchange: ccxt.binanceusdm, base_coin: str, config: dict, async_logger,
+                                        stop_event: asyncio.Event) -> bool:
+    """开仓单在进程重启前已成交时，只补做确认仓位和挂止盈止损的步骤。"""
+    with trace_store.trace('open', base_coin, resumed=True) as trace:
+        try:
+            await _protect_opened_position_async(exchange, base_coin, config, async_logger, stop_event)
+            result = True
+        except InterruptedError:
+            result = False
+        trace.outcome = _trace_outcome(result, stop_event)
+        return result
 
+
+async def _protect_opened_position_async(exchange: ccxt.binanceusdm, base_coin: str, config: dict, async_logger,
+                                         stop_event: asyncio.Event):
     final_pos = None
-    for _ in range(5):
-        if stop_event.is_set(): raise InterruptedError()
-        positions = await fetch_positions_with_pnl_async(exchange, config.get('leverage', 1))
-        final_pos = next((p for p in positions if p.symbol == base_coin), None)
-        if final_pos: break
-        await asyncio.sleep(2)
+    with span('confirm_position'):
+        for _ in range(5):
+            if stop_event.is_set(): raise InterruptedError()
+            positions = await fetch_positions_with_pnl_async(exchange, config.get('leverage', 1))
+            final_pos = next((p for p in positions if p.symbol == base_coin), None)
+            if final_pos: break
+            retries_total.inc('position_confirm', 'not_visible')
+            await asyncio.sleep(2)
 
     if not final_pos: raise Exception("下单成功后，无法获取最终仓位信息。")
 
-    await set_tp_sl_for_position_async(exchange, final_pos, config, async_logger, stop_event)
+    # 仓位已开出，挂止盈止损的请求按 PROTECT 类别在限频器中排在其他开仓请求之前
+    with span('sltp'), work_class(WorkClass.PROTECT):
+        await set_tp_sl_for_position_async(exchange, final_pos, config, async_logger, stop_event)
     await async_logger(f"✅ {base_coin} 订单流程完全成功！", "success")
-    return True
 
 
-async def fetch_klines_async(exchange: ccxt.binanceusdm, symbol: str, timeframe: str = '1d', days_ago: int = 61) -> \
-        Optional[List]:
+async def reconcile_client_orders_async(exchange: ccxt.binanceusdm, symbol: str, client_order_ids: List[str]
+                                        ) -> List[dict]:
+    """
+    按客户订单号查询进程退出前可能已提交的订单：仍在挂单的先撤销，按 client_order_ids 的顺序返回查到的订单 (最终状态)。
+    交易所查不到的订单号 (从未提交或已过查询期限的无成交订单) 直接跳过。
+    """
+    orders = []
+    for client_order_id in client_order_ids:
+        try:
+            order = await exchange.fetch_order(None, symbol, {'origClientOrderId': client_order_id})
+        except ccxt.OrderNotFound:
+            continue
+        if order['status'] == 'open':
+            try:
+                order = await exchange.cancel_order(order['id'], symbol)
+            except ccxt.OrderNotFound:
+                order = await exchange.fetch_order(order['id'], symbol)
+        orders.append(order)
+    return orders
+
+
+def is_below_min_order(exchange: ccxt.binanceusdm, symbol: str, contracts: float, price: float) -> bool:
+    """数量或名义价值低于交易对的最小下单限制 (剩余部分无法再单独下单)。"""
+    limits = exchange.market(symbol).get('limits', {})
+    min_amount = (limits.get('amount') or {}).get('min') or 0.0
+    min_cost = (limits.get('cost') or {}).get('min') or 0.0
+    return contracts <= 0 or contracts < min_amount or contracts * price < min_cost
+
+
+async def fetch_klines_array_async(exchange: ccxt.binanceusdm, symbol: str, timeframe: str = '1d',
+                                   days_ago: int = 61) -> Optional[np.ndarray]:
+    """返回过去 days_ago 天的 K 线，形状 (6, n) 的列式数组 (优先读本地 K 线仓库，只下载缺失部分)。"""
     if not symbol: return None
     try:
         since = exchange.parse8601(
             (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days_ago)).isoformat())
-        return await exchange.fetch_ohlcv(symbol, timeframe, since, limit=days_ago + 2)
+        # K线回补是最低优先级的工作，不与平仓、开仓争抢调度器名额
+        return await work_scheduler.run(WorkClass.BACKFILL, kline_store.fetch(exchange, symbol, timeframe, since),
+                                        flow='klines')
     except ccxt.BadSymbol:
         return None
     except Exception as e:
         print(f"Error fetching klines for '{symbol}': {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+async def fetch_klines_async(exchange: ccxt.binanceusdm, symbol: str, timeframe: str = '1d', days_ago: int = 61) -> \
+        Optional[List]:
+    klines = await fetch_klines_array_async(exchange, symbol, timeframe, days_ago)
+    if klines is None: return None
+    return [[int(row[0]), *row[1:]] for row in klines.T.tolist()]
\ No newline at end of file
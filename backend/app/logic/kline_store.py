@@ -0,0 +1,158 @@
+# backend/app/logic/kline_store.py
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+import ccxt.async_support as ccxt
+import numpy as np
+
+from ..config.config import load_settings, get_cache_dir
+
+# 列式存储的字段顺序，文件中每一行是一个字段: (6, n) float64
+KLINE_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+# 币安 K 线接口单次最多返回的根数
+MAX_KLINES_PER_REQUEST = 1500
+
+_EMPTY = np.empty((len(KLINE_FIELDS), 0), dtype=np.float64)
+
+
+def _timeframe_ms(exchange: ccxt.binanceusdm, timeframe: str) -> int:
+    return int(exchange.parse_timeframe(timeframe) * 1000)
+
+
+def _read_array(path: Path, mmap: bool = False) -> np.ndarray:
+    if not path.exists():
+        return _EMPTY
+    try:
+        data = np.load(path, mmap_mode='r' if mmap else None)
+    except (OSError, ValueError) as e:
+        print(f"--- [WARNING] K线缓存 {path} 读取失败，将重新下载: {e} ---")
+        return _EMPTY
+    if data.ndim != 2 or data.shape[0] != len(KLINE_FIELDS):
+        return _EMPTY
+    return data
+
+
+def _write_array(path: Path, data: np.ndarray):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp.npy')
+    np.save(tmp_path, np.ascontiguousarray(data, dtype=np.float64))
+    # 原子替换：并发读取方只会读到完整的旧文件或新文件。
+    # 注意 Windows 上文件仍被映射 (如 read_local 的调用方尚未释放) 时替换会失败 (PermissionError)
+    os.replace(tmp_path, path)
+
+
+def _covers(stored: np.ndarray, since: int, market: dict, tf_ms: int) -> bool:
+    """本地数据是否覆盖 since 起的历史；上线时间晚于 since 的新币，从第一根 K 线开始即视为覆盖。"""
+    if stored.shape[1] == 0:
+        return False
+    first_ts = stored[0, 0]
+    # since 通常不在 K 线边界上，第一根 K 线只要是包含 since 之后的那一根即可
+    if first_ts < since + tf_ms:
+        return True
+    listed_at = market.get('created') or (market.get('info') or {}).get('onboardDate')
+    return listed_at is not None and float(listed_at) > first_ts - tf_ms
+
+
+class KlineStore:
+    """
+    本地 K 线仓库：每个 (交易对, 周期) 一个 (6, n) 的 .npy 文件。
+    fetch() 返回读入内存的数组 (调用方如筛选快照会长期持有)，不映射文件，之后补齐时替换文件不受影响；
+    写入失败 (如 Windows 上文件被占用) 时仍返回已下载的数据，下次再写入。
+    fetch() 先读本地数据，只从交易所下载最后一根已存 K 线之后的部分 (最后一根可能尚未收盘，总是重新下载)；
+    文件在 kline_cache_ttl_seconds 内被更新过、且最后一根仍是当前周期的 K 线时不发任何请求。
+    """
+
+    def __init__(self):
+        self._locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
+        self.stats = {"hits": 0, "top_ups": 0, "full_downloads": 0, "candles_downloaded": 0, "write_errors": 0}
+
+    @staticmethod
+    def _path(scope: str, market_id: str, timeframe: str) -> Path:
+        settings = load_settings()
+        return get_cache_dir(settings, 'kline_cache_dir') / 'klines' / scope / f"{market_id}_{timeframe}.npy"
+
+    @staticmethod
+    def _ttl() -> float:
+        return float(load_settings().get('kline_cache_ttl_seconds', 300))
+
+    async def fetch(self, exchange: ccxt.binanceusdm, symbol: str, timeframe: str, since: int) -> np.ndarray:
+        """返回 timestamp >= since 的 K 线，形状 (6, n)。交易对不存在时抛出 ccxt.BadSymbol。"""
+        scope = exchange.options.get('marketsCacheScope') or 'mainnet'
+        market_id = exchange.market(symbol)['id']
+        key = (scope, market_id, timeframe)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            data = await self._load_and_top_up(exchange, symbol, timeframe, since, self._path(*key))
+        start = int(np.searchsorted(data[0], since, side='left'))
+        return data[:, start:]
+
+    def read_local(self, scope: str, market_id: str, timeframe: str) -> np.ndarray:
+        """
+        只读取本地已存的 K 线 (内存映射)，不访问交易所；供回测等离线场景使用。
+        映射期间 Windows 上无法替换该文件，调用方应尽快复制所需数据并释放数组，不要长期持有。
+        """
+        return _read_array(self._path(scope, market_id, timeframe), mmap=True)
+
+    async def _load_and_top_up(self, exchange: ccxt.binanceusdm, symbol: str, timeframe: str, since: int,
+                               path: Path) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        stored = await loop.run_in_executor(None, _read_array, path)
+        tf_ms = _timeframe_ms(exchange, timeframe)
+
+        # 本地数据不覆盖请求的起点 (首次使用或请求了更长的历史) 时整段重新下载
+        if not _covers(stored, since, exchange.market(symbol), tf_ms):
+            fetched = await self._download(exchange, symbol, timeframe, since, tf_ms)
+            self.stats["full_downloads"] += 1
+            await self._save(path, fetched)
+            return fetched
+
+        # 最后一根已存 K 线仍是当前周期时才直接使用本地数据；新的周期开始后 (如日线收盘) 必须补齐
+        now = time.time()
+        if now - path.stat().st_mtime < self._ttl() and stored[0, -1] + tf_ms > now * 1000:
+            self.stats["hits"] += 1
+            return stored
+
+        last_ts = int(stored[0, -1])
+        fetched = await self._download(exchange, symbol, timeframe, last_ts, tf_ms)
+        self.stats["top_ups"] += 1
+        keep = stored[:, stored[0] < fetched[0, 0]] if fetched.shape[1] else stored
+        merged = np.concatenate([keep, fetched], axis=1)
+        await self._save(path, merged)
+        return merged
+
+    async def _save(self, path: Path, data: np.ndarray):
+        """写入本地文件；失败不影响本次返回的数据，只是下次需要重新下载这一部分。"""
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _write_array, path, data)
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            print(f"--- [WARNING] K线缓存 {path} 写入失败，本次使用已下载的数据: {e} ---")
+
+    async def _download(self, exchange: ccxt.binanceusdm, symbol: str, timeframe: str, since: int,
+                        tf_ms: int) -> np.ndarray:
+        chunks = []
+        cursor = since
+        now_ms = exchange.milliseconds()
+        while cursor <= now_ms:
+            expected = (now_ms - cursor) // tf_ms + 1
+            limit = int(min(MAX_KLINES_PER_REQUEST, expected))
+            ohlcv = await exchange.fetch_ohlcv(symbol, timeframe, cursor, limit=limit)
+            if not ohlcv:
+                break
+            chunks.append(np.asarray(ohlcv, dtype=np.float64).T)
+            self.stats["candles_downloaded"] += len(ohlcv)
+            if len(ohlcv) < limit:
+                break
+            cursor = int(ohlcv[-1][0]) + tf_ms
+        if not chunks:
+            return _EMPTY
+        return np.concatenate(chunks, axis=1)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+
+kline_store = KlineStore()
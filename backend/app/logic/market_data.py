@@ -0,0 +1,115 @@
+# backend/app/logic/market_data.py
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# 行情数据超过该时长未更新即视为过期，调用方应回退到 REST
+BOOK_TICKER_MAX_AGE = 3.0
+MARK_PRICE_MAX_AGE = 10.0
+
+
+class MarketDataCache:
+    """
+    进程内行情缓存：由 core.market_stream 订阅的 bookTicker / markPrice 推送持续更新，
+    以交易所的 market id (如 'BTCUSDT') 为键，提供 O(1) 的最优买卖价和标记价格查询，并附带更新时间。
+    """
+
+    def __init__(self):
+        self.connected = False
+        self._books: Dict[str, Tuple[float, float, float]] = {}
+        self._marks: Dict[str, Tuple[float, float]] = {}
+        # market id -> 最近一次被查询或请求订阅的时间 (monotonic)
+        self._tracked: Dict[str, float] = {}
+        self._track_callbacks: List[Callable[[List[str]], None]] = []
+        self._untrack_callbacks: List[Callable[[List[str]], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+
+    def set_connected(self, connected: bool):
+        self.connected = connected
+
+    # --- 订阅管理 ---
+    def on_track(self, callback: Callable[[List[str]], None]):
+        """注册新增订阅的回调 (由行情流使用，用于发送 SUBSCRIBE)。"""
+        self._track_callbacks.append(callback)
+
+    def on_untrack(self, callback: Callable[[List[str]], None]):
+        """注册取消订阅的回调 (由行情流使用，用于发送 UNSUBSCRIBE)。"""
+        self._untrack_callbacks.append(callback)
+
+    def track(self, market_ids: Iterable[str]):
+        now = time.monotonic()
+        new_ids = []
+        for market_id in market_ids:
+            if not market_id:
+                continue
+            if market_id not in self._tracked:
+                new_ids.append(market_id)
+            self._tracked[market_id] = now
+        if not new_ids:
+            return
+        for callback in self._track_callbacks:
+            callback(new_ids)
+
+    def _touch(self, market_id: str):
+        if market_id in self._tracked:
+            self._tracked[market_id] = time.monotonic()
+
+    def prune(self, keep: Iterable[str], idle_seconds: float) -> List[str]:
+        """取消订阅 idle_seconds 内没有被查询、且不在 keep (如当前持仓) 中的交易对，返回被移除的 market id。"""
+        keep = set(keep)
+        cutoff = time.monotonic() - idle_seconds
+        stale = [m for m, used_at in self._tracked.items() if used_at < cutoff and m not in keep]
+        if not stale:
+            return stale
+        for market_id in stale:
+            del self._tracked[market_id]
+            self._books.pop(market_id, None)
+            self._marks.pop(market_id, None)
+        self.pruned += len(stale)
+        for callback in self._untrack_callbacks:
+            callback(stale)
+        return stale
+
+    @property
+    def tracked(self) -> Set[str]:
+        return set(self._tracked)
+
+    # --- 推送更新 ---
+    def handle_event(self, data: Dict):
+        event_type = data.get('e')
+        if event_type == 'bookTicker':
+            self._books[data['s']] = (float(data['b']), float(data['a']), time.monotonic())
+        elif event_type == 'markPriceUpdate':
+            self._marks[data['s']] = (float(data['p']), time.monotonic())
+
+    # --- 查询 ---
+    def get_best_bid_ask(self, market_id: str, max_age: float = BOOK_TICKER_MAX_AGE) -> Optional[Tuple[float, float]]:
+        self._touch(market_id)
+        book = self._books.get(market_id)
+        if book is None or time.monotonic() - book[2] > max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return book[0], book[1]
+
+    def get_mark_price(self, market_id: str, max_age: float = MARK_PRICE_MAX_AGE) -> Optional[float]:
+        self._touch(market_id)
+        mark = self._marks.get(market_id)
+        if mark is None or time.monotonic() - mark[1] > max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return mark[0]
+
+    def get_age(self, market_id: str) -> Dict[str, Optional[float]]:
+        now = time.monotonic()
+        book, mark = self._books.get(market_id), self._marks.get(market_id)
+        return {"book_age": now - book[2] if book else None, "mark_age": now - mark[1] if mark else None}
+
+    def get_stats(self) -> Dict:
+        return {"connected": self.connected, "tracked_symbols": len(self._tracked), "hits": self.hits,
+                "misses": self.misses, "pruned_symbols": self.pruned}
+
+
+market_data_cache = MarketDataCache()
@@ -0,0 +1,185 @@
+# backend/app/logic/markets_cache.py
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import ccxt.async_support as ccxt
+
+from ..config.config import load_settings, get_cache_dir
+
+# 缓存格式版本，修改缓存结构时递增，旧文件会被自动忽略
+CACHE_FORMAT_VERSION = 1
+# 未知交易对触发刷新的最小间隔，防止无效币种反复下载全量市场信息
+UNKNOWN_SYMBOL_REFRESH_COOLDOWN = 60
+
+_refresh_tasks: Dict[int, asyncio.Task] = {}
+_time_sync_tasks: Dict[int, asyncio.Task] = {}
+
+
+def _cache_scope(use_testnet: bool) -> str:
+    return 'testnet' if use_testnet else 'mainnet'
+
+
+def _cache_path(scope: str) -> Path:
+    settings = load_settings()
+    return get_cache_dir(settings, 'markets_cache_dir') / f"markets_{scope}.json"
+
+
+def _max_age() -> float:
+    return float(load_settings().get('markets_cache_max_age_seconds', 6 * 3600))
+
+
+def _read_cache_file(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"--- [WARNING] 市场信息缓存 {path} 读取失败，将重新下载: {e} ---")
+        return None
+    if data.get('version') != CACHE_FORMAT_VERSION or data.get('ccxt_version') != ccxt.__version__:
+        print(f"--- [INFO] 市场信息缓存 {path} 版本不匹配，将重新下载。 ---")
+        return None
+    return data
+
+
+def _write_cache_file(path: Path, data: Dict[str, Any]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+async def save_markets_cache(exchange: ccxt.binanceusdm):
+    """将交易所当前的市场、币种和服务器时间差写入本地缓存。"""
+    scope = exchange.options.get('marketsCacheScope')
+    if not scope or not exchange.markets:
+        return
+    data = {
+        'version': CACHE_FORMAT_VERSION,
+        'ccxt_version': ccxt.__version__,
+        'saved_at': time.time(),
+        'time_difference': exchange.options.get('timeDifference', 0),
+        'markets': exchange.markets,
+        'currencies': exchange.currencies,
+    }
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _write_cache_file, _cache_path(scope), data)
+    except Exception as e:
+        print(f"--- [WARNING] 写入市场信息缓存失败: {e} ---")
+
+
+async def load_markets_cached(exchange: ccxt.binanceusdm, use_testnet: bool):
+    """
+    优先从本地缓存恢复市场信息，避免冷启动时阻塞在 load_markets() 上。
+    缓存缺失时同步下载并写入缓存；缓存过期时先使用旧数据，再在后台刷新。
+    """
+    scope = _cache_scope(use_testnet)
+    exchange.options['marketsCacheScope'] = scope
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(None, _read_cache_file, _cache_path(scope))
+
+    if not data:
+        await exchange.load_markets()
+        exchange.options['marketsRefreshedAt'] = time.time()
+        await save_markets_cache(exchange)
+        return
+
+    exchange.set_markets(data['markets'], data.get('currencies'))
+    exchange.options['timeDifference'] = data.get('time_difference', 0)
+    exchange.options['marketsRefreshedAt'] = data.get('saved_at', 0)
+    refresh_markets_if_stale(exchange)
+
+
+def refresh_markets_if_stale(exchange: ccxt.binanceusdm):
+    """市场信息超过 markets_cache_max_age_seconds 未刷新时，调度一次后台刷新。"""
+    age = time.time() - exchange.options.get('marketsRefreshedAt', 0)
+    if age > _max_age():
+        print(f"--- [INFO] 市场信息缓存已过期 ({age / 3600:.1f} 小时)，将在后台刷新。 ---")
+        schedule_markets_refresh(exchange)
+
+
+async def _refresh_markets(exchange: ccxt.binanceusdm) -> bool:
+    try:
+        await exchange.load_markets(reload=True)
+        await save_markets_cache(exchange)
+        print(f"--- [INFO] 市场信息已刷新，共 {len(exchange.markets)} 个交易对。 ---")
+        return True
+    except Exception as e:
+        print(f"--- [WARNING] 后台刷新市场信息失败: {e} ---")
+        return False
+    finally:
+        _refresh_tasks.pop(id(exchange), None)
+
+
+def schedule_markets_refresh(exchange: ccxt.binanceusdm) -> asyncio.Task:
+    """在后台刷新市场信息，同一实例同时只会有一个刷新任务。任务结果表示刷新是否成功。"""
+    key = id(exchange)
+    task = _refresh_tasks.get(key)
+    if task is None or task.done():
+        exchange.options['marketsRefreshedAt'] = time.time()
+        task = asyncio.create_task(_refresh_markets(exchange))
+        _refresh_tasks[key] = task
+    return task
+
+
+async def refresh_markets_for_unknown_symbol(exchange: ccxt.binanceusdm) -> bool:
+    """
+    遇到本地市场信息中不存在的币种时调用 (例如新上线的合约)。
+    返回 True 表示刷新成功，调用方可重新解析交易对；刷新失败或仍在冷却期内返回 False。
+    """
+    key = id(exchange)
+    if time.time() - exchange.options.get('marketsRefreshedAt', 0) < UNKNOWN_SYMBOL_REFRESH_COOLDOWN:
+        task = _refresh_tasks.get(key)
+        if task is None or task.done():
+            return False
+    return await schedule_markets_refresh(exchange)
+
+
+async def _sync_time_difference(exchange: ccxt.binanceusdm) -> bool:
+    try:
+        previous = exchange.options.get('timeDifference', 0)
+        await exchange.load_time_difference()
+        print(f"--- [INFO] 服务器时间差已重新同步: {previous} -> {exchange.options['timeDifference']} ms ---")
+        await save_markets_cache(exchange)
+        return True
+    except Exception as e:
+        print(f"--- [WARNING] 重新同步服务器时间差失败: {e} ---")
+        return False
+    finally:
+        _time_sync_tasks.pop(id(exchange), None)
+
+
+def resync_time_difference(exchange: ccxt.binanceusdm) -> asyncio.Task:
+    """重新获取服务器时间差 (缓存中的值只在启动时恢复)，同一实例同时只会有一个同步任务。"""
+    key = id(exchange)
+    task = _time_sync_tasks.get(key)
+    if task is None or task.done():
+        task = asyncio.create_task(_sync_time_difference(exchange))
+        _time_sync_tasks[key] = task
+    return task
+
+
+def install_time_resync(exchange: ccxt.binanceusdm):
+    """
+    请求因时间戳超出 recvWindow 被拒 (-1021，ccxt 抛出 InvalidNonce) 时，重新同步时间差后重试一次。
+    被拒的请求不会被交易所执行，重试时重新签名，下单也可以安全重试。
+    """
+    original_fetch2 = exchange.fetch2
+
+    async def fetch2(path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+        try:
+            return await original_fetch2(path, api, method, params, headers, body, config)
+        except ccxt.InvalidNonce:
+            if not await resync_time_difference(exchange):
+                raise
+            return await original_fetch2(path, api, method, params, headers, body, config)
+
+    exchange.fetch2 = fetch2
+    return exchange
@@ -0,0 +1,64 @@
+# backend/app/logic/memo_cache.py
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+def memo_key(*parts: Any) -> str:
+    """把若干可 JSON 序列化的部分 (字典按键排序) 哈希成缓存键。"""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class MemoCache(Generic[T]):
+    """
+    带容量和有效期的 LRU 记忆缓存：超过 max_entries 时淘汰最久未使用的条目，超过 max_age 秒的条目视为失效。
+    只在事件循环线程中使用，不加锁。
+    """
+
+    def __init__(self, max_entries: int = 64, max_age: float = 24 * 3600):
+        self._max_entries = max_entries
+        self._max_age = max_age
+        self._entries: "OrderedDict[str, tuple[float, T]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: str) -> Optional[T]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at > self._max_age:
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def put(self, key: str, value: T):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "max_entries": self._max_entries,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,121 @@
+# backend/app/logic/order_batcher.py
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import ccxt.async_support as ccxt
+
+# 币安 U 本位合约 POST /fapi/v1/batchOrders 单次最多 5 个订单
+BINANCE_BATCH_LIMIT = 5
+
+
+def _batch_error_to_exception(exchange: ccxt.binanceusdm, item: Dict[str, Any]) -> Exception:
+    """把批量下单结果中的单个错误 ({"code": -4005, "msg": ...}) 转换为与单笔下单一致的 ccxt 异常。"""
+    code, message = str(item.get('code')), str(item.get('msg', ''))
+    feedback = f"{exchange.id} {json.dumps(item)}"
+    linear = exchange.safe_dict(exchange.exceptions, 'linear', {})
+    try:
+        for exact in (exchange.safe_dict(linear, 'exact', {}), exchange.exceptions.get('exact', {})):
+            exchange.throw_exactly_matched_exception(exact, code, feedback)
+            exchange.throw_exactly_matched_exception(exact, message, feedback)
+        for broad in (exchange.safe_dict(linear, 'broad', {}), exchange.exceptions.get('broad', {})):
+            exchange.throw_broadly_matched_exception(broad, message, feedback)
+    except ccxt.BaseError as e:
+        return e
+    return ccxt.ExchangeError(feedback)
+
+
+class OrderBatcher:
+    """
+    把并发提交的下单请求合并为 batchOrders 调用。
+    调用方像使用 exchange.create_order 一样 await create_order()，请求在 linger 秒内或凑满 BINANCE_BATCH_LIMIT 个后发出，
+    每个订单的结果或错误被单独分发回对应的调用方。只有一个待发订单时直接走单笔下单接口。
+    """
+
+    def __init__(self, exchange: ccxt.binanceusdm, max_batch: int = BINANCE_BATCH_LIMIT, linger: float = 0.02):
+        self._exchange = exchange
+        self._max_batch = max_batch
+        self._linger = linger
+        self._pending: List[Tuple[Tuple, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.stats = {"orders": 0, "requests": 0}
+
+    async def create_order(self, symbol: str, type: str, side: str, amount: float, price: Optional[float] = None,
+                           params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((symbol, type, side, amount, price, params or {}), future))
+        self.stats["orders"] += 1
+        if len(self._pending) >= self._max_batch:
+            self._schedule_flush(0)
+        elif self._flush_handle is None:
+            self._schedule_flush(self._linger)
+        return await future
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(delay, lambda: loop.create_task(self._flush()))
+
+    async def _flush(self):
+        self._flush_handle = None
+        while self._pending:
+            batch, self._pending = self._pending[:self._max_batch], self._pending[self._max_batch:]
+            self.stats["requests"] += 1
+            if len(batch) == 1:
+                await self._send_single(*batch[0])
+            else:
+                await self._send_batch(batch)
+
+    async def _send_single(self, request: Tuple, future: asyncio.Future):
+        try:
+            result = await self._exchange.create_order(*request)
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+    async def _send_batch(self, batch: List[Tuple[Tuple, asyncio.Future]]):
+        exchange = self._exchange
+        # 逐个构造请求：某个订单的精度/参数错误只拒绝它自己，其余订单照常发送
+        valid = []
+        for request, future in batch:
+            try:
+                valid.append((request, future, exchange.create_order_request(*request)))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+        if not valid:
+            return
+        if len(valid) == 1:
+            await self._send_single(valid[0][0], valid[0][1])
+            return
+
+        try:
+            response = await exchange.fapiPrivatePostBatchOrders({'batchOrders': [item[2] for item in valid]})
+        except Exception as e:
+            for _, future, _ in valid:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (request, future, _), item in zip(valid, response):
+            if future.done():
+                continue
+            if item.get('orderId') is None:
+                future.set_exception(_batch_error_to_exception(exchange, item))
+            else:
+                future.set_result(exchange.parse_order(item, exchange.market(request[0])))
+        for _, future, _ in valid[len(response):]:
+            if not future.done():
+                future.set_exception(ccxt.ExchangeError(f"{exchange.id} batchOrders 返回结果数量不足"))
+
+
+def get_order_batcher(exchange: ccxt.binanceusdm) -> OrderBatcher:
+    """每个交易所实例共享一个批量下单器。"""
+    batcher = getattr(exchange, '_order_batcher', None)
+    if batcher is None:
+        batcher = OrderBatcher(exchange)
+        exchange._order_batcher = batcher
+    return batcher
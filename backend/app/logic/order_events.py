@@ -0,0 +1,89 @@
+# backend/app/logic/order_events.py
+import asyncio
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+# Binance 订单的终态，收到后不会再有后续状态变化
+TERMINAL_ORDER_STATUSES = {'FILLED', 'CANCELED', 'EXPIRED', 'EXPIRED_IN_MATCH', 'REJECTED'}
+
+
+class OrderEventHub:
+    """
+    用户数据流 (user-data-stream) 事件的分发中心。
+    WebSocket 连接由 core.user_stream 维护并把原始事件推送进来；
+    交易逻辑通过 wait_for_final_status 以 awaitable 的方式等待某个订单进入终态，不再轮询 fetch_order。
+    """
+
+    def __init__(self, recent_capacity: int = 2000):
+        self.connected = False
+        self.connected_since: Optional[float] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = defaultdict(list)
+        # 记录最近进入终态的订单，处理"事件先于等待方注册到达"的情况
+        self._recent_final: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._recent_capacity = recent_capacity
+        self._listeners: Dict[str, List[Callable[[Dict[str, Any]], None]]] = defaultdict(list)
+        self.events_received = 0
+
+    def set_connected(self, connected: bool):
+        if connected and not self.connected:
+            self.connected_since = time.time()
+        self.connected = connected
+
+    def add_listener(self, event_type: str, callback: Callable[[Dict[str, Any]], None]):
+        """订阅指定类型 (字段 'e') 的原始事件，例如 ACCOUNT_UPDATE。"""
+        self._listeners[event_type].append(callback)
+
+    def dispatch(self, event: Dict[str, Any]):
+        self.events_received += 1
+        event_type = event.get('e')
+        if event_type == 'ORDER_TRADE_UPDATE':
+            self._on_order_update(event.get('o', {}))
+        for callback in self._listeners.get(event_type, []):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"--- [WARNING] 处理用户数据流事件 {event_type} 时出错: {e} ---")
+
+    def _on_order_update(self, order: Dict[str, Any]):
+        status = order.get('X')
+        if status not in TERMINAL_ORDER_STATUSES:
+            return
+        order_id = str(order.get('i'))
+        update = {'id': order_id, 'symbol': order.get('s'), 'status': status,
+                  'filled': float(order.get('z', 0) or 0), 'average': float(order.get('ap', 0) or 0)}
+        self._recent_final[order_id] = update
+        self._recent_final.move_to_end(order_id)
+        while len(self._recent_final) > self._recent_capacity:
+            self._recent_final.popitem(last=False)
+        for future in self._waiters.pop(order_id, []):
+            if not future.done():
+                future.set_result(update)
+
+    async def wait_for_final_status(self, order_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待订单进入终态，返回 {'status', 'filled', ...}；超时返回 None。"""
+        order_id = str(order_id)
+        if order_id in self._recent_final:
+            return self._recent_final[order_id]
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[order_id].append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(order_id)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    self._waiters.pop(order_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "events_received": self.events_received,
+            "pending_waiters": sum(len(w) for w in self._waiters.values()),
+        }
+
+
+order_event_hub = OrderEventHub()
@@ -0,0 +1,158 @@
+# backend/app/logic/position_book.py
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .order_events import order_event_hub
+
+# 两次 REST 对账之间允许的最长间隔，超过后读取方会回退到 REST 并重新建立快照
+MAX_SNAPSHOT_AGE = 300.0
+
+
+class PositionBook:
+    """
+    内存中的持仓簿。先用一次 fetch_positions(None) 建立快照，随后由用户数据流的 ACCOUNT_UPDATE 事件增量更新，
+    并定期通过 REST 对账纠正漂移。只有在用户数据流自快照以来一直在线时才视为可信 (is_live)。
+    输出的条目与 ccxt 的 position 结构保持一致，fetch_positions_with_pnl_async 可直接复用原有的计算逻辑。
+    """
+
+    def __init__(self):
+        self._positions: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._symbol_by_id: Dict[str, str] = {}
+        self._api_key: Optional[str] = None
+        self.snapshot_at: Optional[float] = None
+        self.updated_at: Optional[float] = None
+        self.events_applied = 0
+        self.events_replayed = 0
+        self.reconcile_drift = 0
+        # REST 快照请求进行中时收到的 ACCOUNT_UPDATE (接收时间, 事件)，快照替换持仓簿后重放
+        self._fetches_in_flight = 0
+        self._events_during_fetch: Deque[Tuple[float, Dict[str, Any]]] = deque()
+
+    def is_live(self, exchange) -> bool:
+        if self.snapshot_at is None or self._api_key != exchange.apiKey:
+            return False
+        connected_since = order_event_hub.connected_since
+        if not order_event_hub.connected or connected_since is None or connected_since > self.snapshot_at:
+            return False
+        return time.time() - self.snapshot_at < MAX_SNAPSHOT_AGE
+
+    async def refresh(self, exchange) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        用一次 fetch_positions(None) 重建快照，返回 (REST 返回的原始持仓, 漂移的交易对数量)。
+        请求期间推送的事件不一定包含在 REST 结果中 (如刚开出的仓位)，替换后按顺序重放；
+        事件携带的是仓位的绝对数量，重放较旧的事件时后续事件会再次纠正，不会累积误差。
+        """
+        started_at = time.time()
+        self._fetches_in_flight += 1
+        try:
+            raw_positions = await exchange.fetch_positions(None)
+            drift = self.apply_snapshot(raw_positions, exchange, started_at)
+        finally:
+            self._fetches_in_flight -= 1
+            if not self._fetches_in_flight:
+                self._events_during_fetch.clear()
+        return raw_positions, drift
+
+    def apply_snapshot(self, raw_positions: List[Dict[str, Any]], exchange, requested_at: Optional[float] = None
+                       ) -> int:
+        """
+        用 REST 返回的持仓替换整个持仓簿，返回与增量维护结果不一致的交易对数量。
+        requested_at 为发出请求的时间：快照只代表该时刻之后的状态，之后收到的事件在替换后重放。
+        """
+        requested_at = time.time() if requested_at is None else requested_at
+        self._symbol_by_id = {m['id']: m['symbol'] for m in exchange.markets.values()}
+        fresh = {}
+        for raw_pos in raw_positions:
+            info = raw_pos.get('info', {})
+            amount = float(info.get('positionAmt', 0.0) or 0.0)
+            if amount == 0:
+                continue
+            key = (raw_pos['symbol'], info.get('positionSide', 'BOTH'))
+            fresh[key] = {
+                'amount': amount,
+                'entry_price': float(raw_pos.get('entryPrice') or 0.0),
+                'break_even_price': float(info.get('breakEvenPrice', raw_pos.get('entryPrice', 0.0)) or 0.0),
+                'leverage': float(raw_pos.get('leverage') or 0.0),
+                'initial_margin': float(raw_pos.get('initialMargin') or 0.0),
+            }
+
+        replay = [event for received_at, event in self._events_during_fetch if received_at >= requested_at]
+        # 请求期间有推送的仓位两边谁更新无法判断，重放后自然一致，不计为漂移
+        in_flight = {(self._symbol_by_id.get(pos.get('s')), pos.get('ps', 'BOTH'))
+                     for event in replay for pos in event.get('a', {}).get('P', [])}
+        drift = 0
+        if self._api_key == exchange.apiKey and self.snapshot_at is not None:
+            for key in (set(fresh) | set(self._positions)) - in_flight:
+                old, new = self._positions.get(key), fresh.get(key)
+                if (old is None) != (new is None) or (old and new and abs(old['amount'] - new['amount']) > 1e-12):
+                    drift += 1
+            self.reconcile_drift += drift
+
+        self._positions = fresh
+        self._api_key = exchange.apiKey
+        self.snapshot_at = requested_at
+        self.updated_at = time.time()
+        for event in replay:
+            self._apply_account_update(event)
+        self.events_replayed += len(replay)
+        return drift
+
+    def on_account_update(self, event: Dict[str, Any]):
+        if self._fetches_in_flight:
+            self._events_during_fetch.append((time.time(), event))
+        self._apply_account_update(event)
+        self.events_applied += 1
+        self.updated_at = time.time()
+
+    def _apply_account_update(self, event: Dict[str, Any]):
+        for pos in event.get('a', {}).get('P', []):
+            symbol = self._symbol_by_id.get(pos.get('s'))
+            if symbol is None:
+                continue
+            key = (symbol, pos.get('ps', 'BOTH'))
+            amount = float(pos.get('pa', 0.0) or 0.0)
+            if amount == 0:
+                self._positions.pop(key, None)
+                continue
+            entry = self._positions.setdefault(key, {'leverage': 0.0, 'initial_margin': 0.0})
+            entry['amount'] = amount
+            entry['entry_price'] = float(pos.get('ep', 0.0) or 0.0)
+            entry['break_even_price'] = float(pos.get('bep', pos.get('ep', 0.0)) or 0.0)
+            # 数量变化后保证金不再准确，交由读取方按杠杆重新估算
+            entry['initial_margin'] = 0.0
+
+    def get_raw_positions(self) -> List[Dict[str, Any]]:
+        """以 ccxt position 的结构返回当前非零持仓。"""
+        result = []
+        for (symbol, position_side), entry in self._positions.items():
+            amount = entry['amount']
+            result.append({
+                'symbol': symbol,
+                'side': 'long' if amount > 0 else 'short',
+                'contracts': abs(amount),
+                'entryPrice': entry['entry_price'],
+                'initialMargin': entry['initial_margin'],
+                'leverage': entry['leverage'],
+                'info': {'positionAmt': amount, 'breakEvenPrice': entry['break_even_price'],
+                         'positionSide': position_side},
+            })
+        return result
+
+    def held_market_ids(self) -> List[str]:
+        """当前持仓的交易所 market id (如 'BTCUSDT')。"""
+        id_by_symbol = {symbol: market_id for market_id, symbol in self._symbol_by_id.items()}
+        return [id_by_symbol[symbol] for symbol, _ in self._positions if symbol in id_by_symbol]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "positions": len(self._positions),
+            "snapshot_age_seconds": round(time.time() - self.snapshot_at, 1) if self.snapshot_at else None,
+            "events_applied": self.events_applied,
+            "events_replayed": self.events_replayed,
+            "reconcile_drift": self.reconcile_drift,
+        }
+
+
+position_book = PositionBook()
+order_event_hub.add_listener('ACCOUNT_UPDATE', position_book.on_account_update)
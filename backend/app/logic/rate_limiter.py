@@ -0,0 +1,201 @@
+# backend/app/logic/rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.metrics import rate_limit_wait_seconds
+from ..core.work_scheduler import WorkClass, current_work_class
+
+# 请求优先级，数字越小越先放行
+PRIORITY_ORDER = 0  # 下单、撤单
+PRIORITY_DEFAULT = 1  # 持仓、账户、普通行情查询
+PRIORITY_BULK = 2  # K线等批量数据
+
+_ORDER_PATHS = {'order', 'batchOrders', 'allOpenOrders', 'countdownCancelAll'}
+_BULK_PATHS = {'klines', 'continuousKlines', 'markPriceKlines', 'indexPriceKlines', 'premiumIndexKlines'}
+_ORDER_COUNT_WINDOWS = {'10s': 10, '1m': 60}
+
+
+def classify_request(path: str, method: str) -> Tuple[int, int]:
+    """返回 (优先级, 计入下单频率的订单数)。"""
+    if path in _ORDER_PATHS and method != 'GET':
+        return PRIORITY_ORDER, 1 if method == 'POST' else 0
+    if path in _BULK_PATHS:
+        return PRIORITY_BULK, 0
+    return PRIORITY_DEFAULT, 0
+
+
+class WeightRateLimiter:
+    """
+    账户/IP 级的共享限频器，所有交易所实例的 REST 请求都经由它放行。
+    - 权重按币安的整分钟窗口累计 (ccxt 的接口定义中已包含各端点的权重)，并用响应头 X-MBX-USED-WEIGHT-1M 自我校正；
+    - 下单数按 10 秒 / 1 分钟窗口累计，并用 X-MBX-ORDER-COUNT-* 响应头校正；
+    - 收到 429/418 时按 Retry-After 暂停所有请求；
+    - 预算不足时按优先级排队 (下单/撤单先于 K 线)，同优先级再按发起方的工作类别 (平仓先于开仓) 排序，
+      最后先来先服务。
+    """
+
+    def __init__(self, weight_limit: int = 2400, order_limits: Optional[Dict[str, int]] = None,
+                 safety_ratio: float = 0.9):
+        self._weight_budget = weight_limit * safety_ratio
+        limits = order_limits or {'10s': 300, '1m': 1200}
+        self._order_budgets = {k: v * safety_ratio for k, v in limits.items()}
+        self._weight_window = 0
+        self._used_weight = 0.0
+        self._server_used_weight = 0
+        self._order_windows = {k: 0 for k in _ORDER_COUNT_WINDOWS}
+        self._order_counts = {k: 0 for k in _ORDER_COUNT_WINDOWS}
+        self._blocked_until = 0.0
+        self._queue: List[Tuple[int, int, int, float, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._stats = {"granted": 0, "queued": 0, "bans": 0}
+
+    # --- 窗口与预算 ---
+    def _roll_windows(self, now: float):
+        window = int(now // 60)
+        if window != self._weight_window:
+            self._weight_window, self._used_weight, self._server_used_weight = window, 0.0, 0
+        for name, length in _ORDER_COUNT_WINDOWS.items():
+            window = int(now // length)
+            if window != self._order_windows[name]:
+                self._order_windows[name], self._order_counts[name] = window, 0
+
+    def _wait_time(self, cost: float, orders: int, now: float) -> float:
+        """返回还需等待的秒数，0 表示可以立即放行。"""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._roll_windows(now)
+        wait = 0.0
+        if self._used_weight > 0 and self._used_weight + cost > self._weight_budget:
+            wait = max(wait, 60 - now % 60)
+        if orders:
+            for name, length in _ORDER_COUNT_WINDOWS.items():
+                if self._order_counts[name] + orders > self._order_budgets[name]:
+                    wait = max(wait, length - now % length)
+        return wait
+
+    def _consume(self, cost: float, orders: int):
+        self._used_weight += cost
+        for name in _ORDER_COUNT_WINDOWS:
+            self._order_counts[name] += orders
+        self._stats["granted"] += 1
+
+    # --- 放行 ---
+    async def acquire(self, cost: float, priority: int = PRIORITY_DEFAULT, orders: int = 0):
+        now = time.time()
+        if not self._queue and self._wait_time(cost, orders, now) == 0:
+            self._consume(cost, orders)
+            rate_limit_wait_seconds.observe(0.0, str(priority))
+            return
+        future = asyncio.get_running_loop().create_future()
+        # 不在调度器中发起的请求 (如界面查询持仓) 与开仓同级
+        # (RISK 的值为 0，不能用 or 取默认值)
+        work_class = current_work_class()
+        work_rank = int(WorkClass.OPEN if work_class is None else work_class)
+        heapq.heappush(self._queue, (priority, work_rank, next(self._seq), cost, orders, future))
+        self._stats["queued"] += 1
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        rate_limit_wait_seconds.observe(time.time() - now, str(priority))
+
+    def _pump(self):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        while self._queue:
+            priority, _, _, cost, orders, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = self._wait_time(cost, orders, time.time())
+            if wait > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+            heapq.heappop(self._queue)
+            self._consume(cost, orders)
+            future.set_result(None)
+
+    # --- 响应反馈 ---
+    def observe_response(self, status_code: int, headers: Optional[Dict[str, Any]]):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.time()
+        self._roll_windows(now)
+        used = headers.get('x-mbx-used-weight-1m')
+        if used is not None:
+            try:
+                self._server_used_weight = int(used)
+                self._used_weight = max(self._used_weight, float(used))
+            except ValueError:
+                pass
+        for name in _ORDER_COUNT_WINDOWS:
+            count = headers.get(f'x-mbx-order-count-{name}')
+            if count is not None:
+                try:
+                    self._order_counts[name] = max(self._order_counts[name], int(count))
+                except ValueError:
+                    pass
+        if status_code in (418, 429):
+            try:
+                retry_after = float(headers.get('retry-after', 60))
+            except ValueError:
+                retry_after = 60.0
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._stats["bans"] += 1
+            print(f"--- [WARNING] 币安返回 {status_code} 限频，所有请求暂停 {retry_after:.0f} 秒。 ---")
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        self._roll_windows(now)
+        by_priority: Dict[int, int] = {}
+        for priority, _, _, _, _, future in self._queue:
+            if not future.done():
+                by_priority[priority] = by_priority.get(priority, 0) + 1
+        return {
+            **self._stats,
+            "used_weight_1m": round(self._used_weight, 2),
+            "server_used_weight_1m": self._server_used_weight,
+            "weight_budget_1m": self._weight_budget,
+            "order_count_10s": self._order_counts['10s'],
+            "order_count_1m": self._order_counts['1m'],
+            "queue_depth": sum(by_priority.values()),
+            "queue_depth_by_priority": by_priority,
+            "blocked_for_seconds": round(max(0.0, self._blocked_until - now), 1),
+        }
+
+
+shared_rate_limiter = WeightRateLimiter()
+
+
+def install_rate_limiter(exchange, limiter: WeightRateLimiter = shared_rate_limiter):
+    """
+    用共享限频器替换 ccxt 实例自带的 (按实例计算的) 限频：
+    所有 REST 请求在发出前按端点权重和优先级排队，响应头用于校正已用额度。
+    """
+    exchange.enableRateLimit = False
+    original_fetch2 = exchange.fetch2
+    original_on_rest_response = exchange.on_rest_response
+
+    async def fetch2(path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+        cost = exchange.calculate_rate_limiter_cost(api, method, path, params, config)
+        priority, orders = classify_request(path, method)
+        if path == 'batchOrders' and method == 'POST':
+            orders = max(1, len(params.get('batchOrders') or []))
+        await limiter.acquire(cost, priority, orders)
+        return await original_fetch2(path, api, method, params, headers, body, config)
+
+    def on_rest_response(code, reason, url, method, response_headers, response_body, request_headers, request_body):
+        limiter.observe_response(code, response_headers)
+        return original_on_rest_response(code, reason, url, method, response_headers, response_body,
+                                         request_headers, request_body)
+
+    exchange.fetch2 = fetch2
+    exchange.on_rest_response = on_rest_response
+    return exchange
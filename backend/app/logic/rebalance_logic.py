@@ -2,6 +2,7 @@
 from typing import List, Dict, Optional, Any, Tuple
 import numpy as np
 
+from . import screening_engine
 from ..models.schemas import Position
 
 
@@ -23,6 +24,16 @@ def screen_coins_advanced(
         criteria: Dict[str, Any],
         blacklist: List[str]
 ) -> List[str]:
+    # 实际计算由向量化引擎完成，结果与下方的逐币种参考实现一致
+    return screening_engine.screen_coin_data(coin_data, criteria, blacklist)
+
+
+def screen_coins_reference(
+        coin_data: List[Dict[str, Any]],
+        criteria: Dict[str, Any],
+        blacklist: List[str]
+) -> List[str]:
+    """逐币种计算的原始实现，保留用于校验向量化引擎的结果和性能对比。"""
     method = criteria.get('method')
     top_n = criteria.get('top_n')
     blacklist_upper = [b.upper() for b in blacklist]
@@ -0,0 +1,299 @@
+# backend/app/logic/screening_engine.py
+import functools
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# K线列下标，与 ccxt 的 OHLCV 以及 kline_store 的列式数组一致
+_OPEN, _CLOSE, _VOLUME = 1, 4, 5
+
+
+class KlinePanel:
+    """
+    多个币种的 K 线按"最后一根对齐"打包成的二维面板 (币种 × 天)，长度不足的币种在左侧以 NaN 填充。
+    原有逻辑只用倒数第 k 根 K 线 (klines[-1 - days])，右对齐后同一列就是所有币种的同一个相对位置。
+    width 只保留计算需要的最近若干天，lengths 记录每个币种实际的 K 线根数用于数据量检查。
+    """
+
+    def __init__(self, open_: np.ndarray, close: np.ndarray, volume: np.ndarray, lengths: np.ndarray):
+        self.open = open_
+        self.close = close
+        self.volume = volume
+        self.lengths = lengths
+
+    @property
+    def width(self) -> int:
+        return self.open.shape[1]
+
+    @classmethod
+    def from_klines(cls, klines_list: Sequence[Any], width: int) -> "KlinePanel":
+        """klines_list 的元素可以是 ccxt 的 K 线列表，也可以是 kline_store 的 (6, n) 数组；None 视为没有数据。"""
+        n = len(klines_list)
+        lengths = np.zeros(n, dtype=np.int64)
+        for i, klines in enumerate(klines_list):
+            if klines is not None:
+                lengths[i] = klines.shape[1] if isinstance(klines, np.ndarray) else len(klines)
+        width = max(0, min(width, int(lengths.max(initial=0))))
+        fields = np.full((3, n, width), np.nan)
+        # kline_store 的数组中 K 线足够的币种 (通常是绝大多数) 一次性打包最后 width 根
+        full = [i for i, klines in enumerate(klines_list)
+                if isinstance(klines, np.ndarray) and width and lengths[i] >= width]
+        if full:
+            tails = np.stack([klines_list[i][:, -width:] for i in full], axis=1)
+            fields[:, full, :] = tails[(_OPEN, _CLOSE, _VOLUME), :, :]
+        packed = set(full)
+        for i, klines in enumerate(klines_list):
+            take = min(width, int(lengths[i]))
+            if take == 0 or i in packed:
+                continue
+            if isinstance(klines, np.ndarray):
+                tail = klines[(_OPEN, _CLOSE, _VOLUME), -take:]
+            else:
+                tail = np.asarray(klines[-take:], dtype=np.float64)[:, (_OPEN, _CLOSE, _VOLUME)].T
+            fields[:, i, width - take:] = tail
+        return cls(fields[0], fields[1], fields[2], lengths)
+
+    @classmethod
+    def from_rows(cls, klines_list: Sequence[Optional[List[List[float]]]], width: int, open_days: Sequence[int],
+                  volume_days: Optional[int] = None) -> "KlinePanel":
+        """
+        从 ccxt 的 K 线列表打包面板，只读取筛选会用到的位置：最后一根的收盘价、open_days 中每个 days 对应的
+        倒数第 days+1 根的开盘价，以及最近 volume_days+1 根的成交量 (None 时不读成交量)，其余位置为 NaN。
+        把窗口内的每根 K 线都转换成 float 数组，比逐币种参考实现直接取这几个数还慢。
+        """
+        n = len(klines_list)
+        lengths = np.array([len(k) if k is not None else 0 for k in klines_list], dtype=np.int64)
+        width = max(0, min(width, int(lengths.max(initial=0))))
+        fields = np.full((3, n, width), np.nan)
+        if width == 0:
+            return cls(fields[0], fields[1], fields[2], lengths)
+
+        def rows(min_length: int) -> List[int]:
+            return np.flatnonzero(lengths >= min_length).tolist()
+
+        has_data = rows(1)
+        fields[1, has_data, -1] = [klines_list[i][-1][_CLOSE] for i in has_data]
+        for days in sorted(set(d for d in open_days if 0 <= d < width)):
+            valid = rows(days + 1)
+            fields[0, valid, -1 - days] = [klines_list[i][-1 - days][_OPEN] for i in valid]
+        if volume_days is not None and volume_days >= 0:
+            take = min(volume_days + 1, width)
+            full = rows(take)
+            if full:
+                fields[2, full, width - take:] = [[k[_VOLUME] for k in klines_list[i][-take:]] for i in full]
+            for i in np.flatnonzero((lengths > 0) & (lengths < take)).tolist():
+                fields[2, i, width - lengths[i]:] = [k[_VOLUME] for k in klines_list[i]]
+        return cls(fields[0], fields[1], fields[2], lengths)
+
+    def change_percent(self, days: int) -> np.ndarray:
+        """向量化的 calculate_change_percent：数据不足的币种为 NaN，开盘价非正时为 0.0。"""
+        n = len(self.lengths)
+        result = np.full(n, np.nan)
+        if days <= 0 or days + 1 > self.width:
+            return result
+        valid = self.lengths >= days + 1
+        start = self.open[:, -1 - days]
+        end = self.close[:, -1]
+        positive = valid & (start > 0)
+        result[positive] = ((end[positive] - start[positive]) / start[positive]) * 100
+        result[valid & ~positive] = 0.0
+        return result
+
+
+class _Workspace(threading.local):
+    """每个线程复用的扁平缓冲区 (6 行，与 K 线数组相同)，合成相对K线时不再为每根 K 线创建列表。"""
+
+    def __init__(self):
+        self.buffer = np.empty((6, 0))
+
+    def take(self, size: int) -> np.ndarray:
+        if self.buffer.shape[1] < size:
+            self.buffer = np.empty((6, max(size, self.buffer.shape[1] * 2)))
+        return self.buffer[:, :size]
+
+
+_workspace = _Workspace()
+
+
+def build_benchmark(klines_list: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    相对强度的基准 K 线 (6, n)。单个币种 (如 BTC、ETH) 直接作为基准；
+    多个币种组成篮子时，只保留所有成员都有数据的时间点，各成员按第一个共同时间点的收盘价归一化后等权平均。
+    """
+    if len(klines_list) == 1:
+        return klines_list[0]
+    timestamps = functools.reduce(np.intersect1d, [k[0] for k in klines_list])
+    basket = np.zeros((6, len(timestamps)))
+    basket[0] = timestamps
+    if len(timestamps) == 0:
+        return basket
+    for klines in klines_list:
+        rows = klines[:, np.searchsorted(klines[0], timestamps)]
+        basket[1:5] += rows[1:5] / rows[4, 0]
+        basket[5] += rows[5]
+    basket[1:5] /= len(klines_list)
+    return basket
+
+
+def relative_panel(klines_list: Sequence[Optional[np.ndarray]], benchmark: np.ndarray, width: int) -> KlinePanel:
+    """
+    一次性合成所有币种相对基准的 K 线面板 (开盘/收盘价之比)，结果与逐根 K 线按时间戳匹配的原实现一致：
+    只保留基准在同一时间戳有数据、且基准 OHLC 均大于 1e-8 的 K 线。
+    面板只需要每个币种最后 width 根匹配上的 K 线，所以先只对齐最后 width 根；
+    其中有 K 线匹配不上基准的币种再用全部历史重新对齐。因此 lengths 不足 width 时与全部历史一致，
+    否则只保证不小于 width，足以判断数据量。
+    """
+    sizes = np.array([k.shape[1] if k is not None else 0 for k in klines_list], dtype=np.int64)
+    windows = np.minimum(sizes, max(width, 0))
+    panel = _relative_window(klines_list, benchmark, width, windows)
+    retry = (panel.lengths < width) & (windows < sizes)
+    if retry.any():
+        windows[retry] = sizes[retry]
+        panel = _relative_window(klines_list, benchmark, width, windows)
+    return panel
+
+
+def _relative_window(klines_list: Sequence[Optional[np.ndarray]], benchmark: np.ndarray, width: int,
+                     windows: np.ndarray) -> KlinePanel:
+    """relative_panel 的对齐：各币种最后 windows[i] 根 K 线的时间戳拼接后用 searchsorted 一次完成与基准的对齐。"""
+    n = len(klines_list)
+    flat = _workspace.take(int(windows.sum()))
+    tails = [klines[:, -size:] for klines, size in zip(klines_list, windows.tolist()) if size]
+    if tails:
+        np.concatenate(tails, axis=1, out=flat)
+    owner = np.repeat(np.arange(n), windows)
+
+    bench_ts = benchmark[0]
+    bench_ok = (benchmark[1:5] > 1e-8).all(axis=0)
+    idx = np.searchsorted(bench_ts, flat[0])
+    clipped = np.minimum(idx, max(len(bench_ts) - 1, 0))
+    matched = np.flatnonzero((idx < len(bench_ts)) & (bench_ts[clipped] == flat[0]) & bench_ok[clipped])
+    matched_owner = owner[matched]
+
+    # 每个币种保留最后 width 根匹配上的 K 线，右对齐写入面板 (按展平后的下标一次写入)
+    lengths = np.bincount(matched_owner, minlength=n).astype(np.int64)
+    width = max(0, min(width, int(lengths.max(initial=0))))
+    starts = np.cumsum(lengths) - lengths
+    column = width - lengths[matched_owner] + (np.arange(len(matched_owner)) - starts[matched_owner])
+    keep = column >= 0
+    src, bench = matched[keep], idx[matched[keep]]
+    target = matched_owner[keep] * width + column[keep]
+
+    open_ = np.full(n * width, np.nan)
+    close = np.full(n * width, np.nan)
+    open_[target] = flat[_OPEN, src] / benchmark[_OPEN, bench]
+    close[target] = flat[_CLOSE, src] / benchmark[_CLOSE, bench]
+    return KlinePanel(open_.reshape(n, width), close.reshape(n, width), np.full((n, width), np.nan), lengths)
+
+
+def required_width(criteria: Dict[str, Any], relative: bool = False) -> int:
+    """screen_coins_vectorized 需要的最近 K 线根数 (relative=True 时为相对基准面板所需的根数)。"""
+    if relative:
+        return max(criteria.get('rel_strength_days', 60), 0) + 1
+    return max(criteria.get('rebalance_volume_ma_days', 20), criteria.get('abs_momentum_days', 30),
+               criteria.get('foam_days', 1), 0) + 1
+
+
+def volume_spike_mask(panel: KlinePanel, volume_ma_days: int, volume_spike_ratio: float,
+                      symbols: Optional[Sequence[str]] = None) -> np.ndarray:
+    """成交量过滤：最新一天的成交量不超过前 N 天均量的 volume_spike_ratio 倍的币种为 True。"""
+    n = len(panel.lengths)
+    if volume_ma_days <= 0 or volume_ma_days + 1 > panel.width:
+        return np.zeros(n, dtype=bool)
+    has_data = panel.lengths >= volume_ma_days + 1
+    # 使用倒数 N+1 天到倒数第 2 天的数据来计算均量, 不包括今天
+    avg_volume = panel.volume[:, -(volume_ma_days + 1):-1].mean(axis=1)
+    latest_volume = panel.volume[:, -1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        active = has_data & (avg_volume >= 1e-6)
+        spiked = active & ~((latest_volume / avg_volume) <= volume_spike_ratio)
+    if symbols is not None:
+        for i in np.flatnonzero(spiked):
+            print(f"--- [REBALANCE_FILTER] 剔除币种 {symbols[i]}: 成交量异常放大 ({latest_volume[i]:,.0f} vs 均量 "
+                  f"{avg_volume[i]:,.0f}, 超过 {volume_spike_ratio}x) ---")
+    return active & ~spiked
+
+
+def _ranks(order: np.ndarray) -> np.ndarray:
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    return ranks
+
+
+def rank_candidates(method: str, foam: Optional[np.ndarray] = None, abs_momentum: Optional[np.ndarray] = None,
+                    rel_strength: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    按筛选方法对候选币种排序，返回因子数组中的下标 (因子为 NaN 的币种不参与排名)。
+    rel_strength 为 NaN 或未提供时按原实现退回到绝对动量。
+    """
+    if method == 'foam':
+        qualified = np.flatnonzero(~np.isnan(foam))
+        # 降序的稳定排序：并列的币种保持原有顺序
+        return qualified[np.argsort(-foam[qualified], kind='stable')]
+    if method == 'multi_factor_weakest':
+        qualified = np.flatnonzero(~np.isnan(abs_momentum))
+        abs_q = abs_momentum[qualified]
+        rel_q = abs_q if rel_strength is None else rel_strength[qualified]
+        rel_q = np.where(np.isnan(rel_q), abs_q, rel_q)
+        order_abs = np.argsort(abs_q, kind='stable')
+        order_rel = order_abs[np.argsort(rel_q[order_abs], kind='stable')]
+        score = _ranks(order_abs) * 0.6 + _ranks(order_rel) * 0.4
+        return qualified[order_rel[np.argsort(score[order_rel], kind='stable')]]
+    return np.empty(0, dtype=np.int64)
+
+
+def screen_coins_vectorized(symbols: Sequence[str], usdt_panel: KlinePanel, rel_panel: Optional[KlinePanel],
+                            criteria: Dict[str, Any], blacklist: List[str], verbose: bool = True) -> List[str]:
+    """
+    screen_coins_advanced 的向量化实现，结果与逐币种计算完全一致 (包括并列时的顺序)：
+    Python 的 list.sort 是稳定排序，这里对应使用 kind='stable' 的 argsort，并按原实现的先后顺序逐次排序。
+    rel_panel 是相对基准 (如 BTC) 合成的 K 线面板，与 symbols 一一对应。
+    """
+    method = criteria.get('method')
+    top_n = criteria.get('top_n')
+    blacklist_upper = {b.upper() for b in blacklist}
+
+    keep = volume_spike_mask(usdt_panel, criteria.get('rebalance_volume_ma_days', 20),
+                             criteria.get('rebalance_volume_spike_ratio', 3.0), symbols if verbose else None)
+    keep &= np.array([s.upper() not in blacklist_upper for s in symbols], dtype=bool)
+    candidates = np.flatnonzero(keep)
+    if len(candidates) == 0:
+        return []
+
+    if method == 'foam':
+        order = rank_candidates(method, foam=usdt_panel.change_percent(criteria.get('foam_days', 1))[candidates])
+    elif method == 'multi_factor_weakest':
+        abs_momentum = usdt_panel.change_percent(criteria.get('abs_momentum_days', 30))[candidates]
+        rel_strength = None
+        if rel_panel is not None:
+            rel_strength = rel_panel.change_percent(criteria.get('rel_strength_days', 60))[candidates]
+        order = rank_candidates(method, abs_momentum=abs_momentum, rel_strength=rel_strength)
+    else:
+        return []
+
+    return [symbols[i] for i in candidates[order][:top_n]]
+
+
+def screen_coin_data(coin_data: List[Dict[str, Any]], criteria: Dict[str, Any], blacklist: List[str]) -> List[str]:
+    """接受与 screen_coins_advanced 相同的 coin_data 结构 ({'symbol', 'usdt_klines', 'btc_klines'})。"""
+    symbols = [d['symbol'] for d in coin_data]
+    usdt_panel = KlinePanel.from_rows([d.get('usdt_klines') for d in coin_data], required_width(criteria),
+                                      [criteria.get('abs_momentum_days', 30), criteria.get('foam_days', 1)],
+                                      criteria.get('rebalance_volume_ma_days', 20))
+    rel_panel = None
+    if criteria.get('method') == 'multi_factor_weakest':
+        rel_panel = KlinePanel.from_rows([d.get('btc_klines') for d in coin_data],
+                                         required_width(criteria, relative=True),
+                                         [criteria.get('rel_strength_days', 60)])
+    return screen_coins_vectorized(symbols, usdt_panel, rel_panel, criteria, blacklist)
+
+
+def screen_coin_arrays(symbols: Sequence[str], klines_list: Sequence[np.ndarray], benchmark: Optional[np.ndarray],
+                       criteria: Dict[str, Any], blacklist: List[str], verbose: bool = True) -> List[str]:
+    """筛选流水线 (screening_pipeline) 使用的入口：直接接受 kline_store 的列式数组，相对强度基准由 build_benchmark 生成。"""
+    usdt_panel = KlinePanel.from_klines(klines_list, required_width(criteria))
+    rel_panel = None
+    if criteria.get('method') == 'multi_factor_weakest' and benchmark is not None:
+        rel_panel = relative_panel(klines_list, benchmark, required_width(criteria, relative=True))
+    return screen_coins_vectorized(symbols, usdt_panel, rel_panel, criteria, blacklist, verbose)
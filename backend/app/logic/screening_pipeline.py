@@ -0,0 +1,158 @@
+# backend/app/logic/screening_pipeline.py
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import ccxt.async_support as ccxt
+import numpy as np
+
+from . import screening_engine
+from .exchange_logic_async import fetch_klines_array_async
+from .utils import resolve_full_symbol
+from ..config.config import STABLECOIN_PREFERENCE
+
+_DAY_MS = 24 * 3600 * 1000
+_snapshot_counter = itertools.count(1)
+
+AsyncLogger = Callable[[str, str], Awaitable[None]]
+
+
+def parse_benchmark(benchmark: str) -> List[str]:
+    """相对强度基准：单个币种 (如 "BTC"、"ETH") 或逗号分隔的等权篮子 (如 "BTC,ETH")。"""
+    members = list(dict.fromkeys(m.strip().upper() for m in (benchmark or "").split(",") if m.strip()))
+    return members or ["BTC"]
+
+
+def days_to_fetch(criteria: Dict[str, Any]) -> int:
+    return max(criteria.get('abs_momentum_days', 30), criteria.get('rel_strength_days', 60),
+               criteria.get('foam_days', 1), criteria.get('rebalance_volume_ma_days', 20), 2)
+
+
+class ScreeningInputs:
+    """
+    筛选所需的市场数据快照：短仓池中各币种的成交额 (按 fetch_tickers 的顺序)、K线数组和相对强度基准的成员 K 线。
+    同一份快照可以为不同的 RebalanceCriteria 重复排名，只要它覆盖该条件需要的数据 (见 covers)。
+    """
+
+    def __init__(self, short_pool: FrozenSet[str], min_volume_usd: float, fetch_days: int,
+                 volumes: List[Tuple[str, float]], klines: Dict[str, np.ndarray],
+                 benchmarks: Dict[str, np.ndarray], as_of: Optional[float] = None, version: Optional[str] = None):
+        self.short_pool = short_pool
+        self.min_volume_usd = min_volume_usd
+        self.fetch_days = fetch_days
+        self.volumes = volumes
+        self.klines = klines
+        self.benchmarks = benchmarks
+        self.as_of = as_of if as_of is not None else time.time()
+        # 数据版本：每次获取快照都不同，用于区分基于不同数据计算的缓存结果
+        self.version = version or f"{int(self.as_of * 1000)}-{next(_snapshot_counter)}"
+        # 排名使用的最后一根已收盘日线的开盘时间 (快照时尚未收盘的当日 K 线不参与排名)
+        closed = [_trim(k, 0, self.as_of * 1000 - _DAY_MS) for k in klines.values()]
+        self.last_candle_ms = max((int(k[0, -1]) for k in closed if k.shape[1]), default=None)
+
+    def covers(self, criteria: Dict[str, Any], short_pool: FrozenSet[str]) -> bool:
+        if short_pool != self.short_pool or criteria.get('min_volume_usd', 0) < self.min_volume_usd:
+            return False
+        if days_to_fetch(criteria) > self.fetch_days:
+            return False
+        if criteria.get('method') == 'multi_factor_weakest':
+            return all(m in self.benchmarks for m in parse_benchmark(criteria.get('benchmark', 'BTC')))
+        return True
+
+    def liquid_symbols(self, min_volume_usd: float) -> List[str]:
+        """按原有流动性筛选的顺序返回成交额超过门槛的币种 (同一币种只取第一个满足条件的报价)。"""
+        liquid, seen = [], set()
+        for base, quote_volume in self.volumes:
+            if base not in seen and quote_volume > min_volume_usd:
+                liquid.append(base)
+                seen.add(base)
+        return liquid
+
+
+async def collect_screening_inputs(exchange: ccxt.binanceusdm, short_pool: FrozenSet[str], min_volume_usd: float,
+                                   fetch_days: int, benchmark_members: Sequence[str],
+                                   async_logger: AsyncLogger) -> ScreeningInputs:
+    """获取全市场行情做流动性筛选，再并发获取通过筛选的币种和基准成员的 K 线 (经由本地 K 线仓库)。"""
+    if not short_pool:
+        raise ValueError("做空交易列表为空，无法进行智能再平衡筛选。请先在'通用开仓设置'中配置。")
+    await async_logger(f"将使用您配置的 {len(short_pool)} 个币种的做空列表进行筛选。", "info")
+
+    await async_logger("正在获取全市场行情以进行流动性筛选...", "info")
+    all_tickers = await exchange.fetch_tickers()
+
+    stablecoins = set(STABLECOIN_PREFERENCE)
+    volumes = []
+    for symbol, ticker in all_tickers.items():
+        if '/' not in symbol: continue
+        base, quote = symbol.split('/')[:2]
+        quote = quote.split(':')[0]
+        quote_volume = ticker.get('quoteVolume', 0)
+        if quote in stablecoins and base in short_pool and quote_volume is not None:
+            volumes.append((base, quote_volume))
+
+    inputs_bases = {base for base, quote_volume in volumes if quote_volume > min_volume_usd}
+    fetch_limit = fetch_days + 2
+    full_symbols = {base: resolve_full_symbol(exchange, base) for base in inputs_bases}
+    full_symbols = {base: full for base, full in full_symbols.items() if full}
+    await async_logger(f"准备并发获取 {len(full_symbols)} 个币种过去 {fetch_limit} 天的K线...", "info")
+
+    bases = list(full_symbols)
+    results = await asyncio.gather(
+        *[fetch_klines_array_async(exchange, full_symbols[base], '1d', fetch_limit) for base in bases],
+        return_exceptions=True)
+    klines = {base: k for base, k in zip(bases, results) if isinstance(k, np.ndarray)}
+
+    benchmarks = {}
+    for member in benchmark_members:
+        member_symbol = resolve_full_symbol(exchange, member)
+        if not member_symbol:
+            raise ValueError(f"在交易所中找不到 {member}/USDT 交易对。")
+        member_klines = await fetch_klines_array_async(exchange, member_symbol, '1d', fetch_limit)
+        if member_klines is None or member_klines.shape[1] < fetch_days:
+            raise ValueError(f"获取 {member}/USDT K线数据失败，无法计算相对强度。")
+        benchmarks[member] = member_klines
+
+    return ScreeningInputs(short_pool, min_volume_usd, fetch_days, volumes, klines, benchmarks)
+
+
+def _trim(klines: np.ndarray, since_ms: float, until_ms: float) -> np.ndarray:
+    """截取开盘时间在 [since_ms, until_ms] 内的 K 线。"""
+    return klines[:, int(np.searchsorted(klines[0], since_ms, side='left')):
+                     int(np.searchsorted(klines[0], until_ms, side='right'))]
+
+
+def rank_screening_inputs(inputs: ScreeningInputs, criteria: Dict[str, Any], blacklist: List[str],
+                          verbose: bool = True) -> List[str]:
+    """
+    用快照为一组筛选条件排名：K 线按该条件本身的获取窗口截取，流动性门槛按该条件重新应用。在线程池中调用。
+    只使用快照时已收盘的日线：收盘后刚开始的当日 K 线成交量接近为零，会让放量过滤失效、动量停在一根空 K 线上，
+    而预计算的排名要使用一整天。
+    """
+    liquid = inputs.liquid_symbols(criteria.get('min_volume_usd', 0))
+    if not liquid:
+        raise ValueError("您选择的做空币种中，没有币种通过流动性筛选。请检查或降低交易额门槛。")
+
+    needed_days = days_to_fetch(criteria)
+    since_ms = inputs.as_of * 1000 - (needed_days + 2) * _DAY_MS
+    until_ms = inputs.as_of * 1000 - _DAY_MS
+    symbols, klines_list = [], []
+    for base in liquid:
+        klines = inputs.klines.get(base)
+        if klines is None:
+            continue
+        klines = _trim(klines, since_ms, until_ms)
+        if klines.shape[1] >= needed_days:
+            symbols.append(base)
+            klines_list.append(klines)
+    if not symbols:
+        raise ValueError("成功获取K线数据的币种为0，无法进行下一步计算。")
+
+    benchmark = None
+    if criteria.get('method') == 'multi_factor_weakest':
+        members = parse_benchmark(criteria.get('benchmark', 'BTC'))
+        benchmark = screening_engine.build_benchmark([_trim(inputs.benchmarks[m], since_ms, until_ms) for m in members])
+        if benchmark.shape[1] < needed_days:
+            raise ValueError(f"{'+'.join(members)} 基准的共同K线数据不足，无法计算相对强度。")
+
+    return screening_engine.screen_coin_arrays(symbols, klines_list, benchmark, criteria, blacklist, verbose)
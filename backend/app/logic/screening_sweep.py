@@ -0,0 +1,202 @@
+# backend/app/logic/screening_sweep.py
+import asyncio
+import itertools
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .screening_pipeline import ScreeningInputs, rank_screening_inputs
+
+# 每个子进程中缓存最近一次映射的快照，同一快照的后续任务不再重新打开文件
+_worker_snapshot: Dict[str, ScreeningInputs] = {}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+# 正在进行的扫描所使用的快照版本 -> 扫描数；这些版本的导出文件可能仍被子进程映射，不能删除
+_exports_in_use: Dict[str, int] = {}
+# 导出与清理都在线程池中执行，互斥进行：清理判断某版本无人使用后，新登记该版本的扫描会在清理结束后重新导出
+_export_lock = threading.Lock()
+
+
+def expand_grid(base: Dict[str, Any], grid: Dict[str, Sequence[Any]], max_combinations: int) -> List[Dict[str, Any]]:
+    """在 base 筛选条件上展开参数网格 (笛卡尔积)，参数名必须是 base 中已有的字段。"""
+    unknown = [k for k in grid if k not in base]
+    if unknown:
+        raise ValueError(f"参数网格中包含未知的筛选参数: {', '.join(unknown)}")
+    keys = [k for k, values in grid.items() if values]
+    total = math.prod(len(grid[k]) for k in keys)
+    if total > max_combinations:
+        raise ValueError(f"参数组合数 {total} 超过上限 {max_combinations}，请缩小参数网格。")
+    return [{**base, **dict(zip(keys, values))} for values in itertools.product(*(grid[k] for k in keys))]
+
+
+# --- 快照导出：所有 K 线打包成一个内存映射文件，子进程只读共享 ---
+def _pack(arrays: Dict[str, np.ndarray], names: List[str], offsets: List[int]) -> np.ndarray:
+    packed = np.empty((6, offsets[-1]), dtype=np.float64)
+    for i, name in enumerate(names):
+        packed[:, offsets[i]:offsets[i + 1]] = arrays[name]
+    return packed
+
+
+def export_snapshot(inputs: ScreeningInputs, directory: Path) -> Dict[str, Any]:
+    """
+    把快照写成 {version}_klines.npy / {version}_bench.npy 两个文件 (同一版本只写一次)，
+    返回传给子进程的清单：只包含文件路径、偏移量和成交额等少量元数据，K 线本身不经过 pickle。
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest: Dict[str, Any] = {
+        'version': inputs.version, 'as_of': inputs.as_of, 'short_pool': sorted(inputs.short_pool),
+        'min_volume_usd': inputs.min_volume_usd, 'fetch_days': inputs.fetch_days, 'volumes': inputs.volumes,
+    }
+    with _export_lock:
+        for name, arrays in (('klines', inputs.klines), ('bench', inputs.benchmarks)):
+            path = directory / f"{inputs.version}_{name}.npy"
+            names = list(arrays)
+            offsets = list(itertools.accumulate((arrays[n].shape[1] for n in names), initial=0))
+            if not path.exists():
+                tmp_path = path.with_suffix('.tmp.npy')
+                np.save(tmp_path, _pack(arrays, names, offsets))
+                os.replace(tmp_path, path)
+            manifest[name] = {'path': str(path), 'names': names, 'offsets': offsets}
+    return manifest
+
+
+def remove_stale_exports(directory: Path, keep: str):
+    """
+    删除 keep 以外、不再被任何扫描使用的旧版本导出文件，在扫描结束后于线程池中调用。
+    子进程会缓存最近一次映射的快照，Windows 上仍被映射的文件无法删除，留到下一次空闲时再清理。
+    """
+    with _export_lock:
+        in_use = {keep, *_exports_in_use.copy()}
+        for path in directory.glob('*.npy'):
+            if any(path.name.startswith(f"{version}_") for version in in_use):
+                continue
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+
+def _load_snapshot(manifest: Dict[str, Any]) -> ScreeningInputs:
+    inputs = _worker_snapshot.get(manifest['version'])
+    if inputs is not None:
+        return inputs
+    unpacked = {}
+    for name in ('klines', 'bench'):
+        section = manifest[name]
+        # 转为普通 ndarray 视图 (仍共享映射的内存)，避免 np.memmap 子类在每次运算上的额外开销
+        packed = np.asarray(np.load(section['path'], mmap_mode='r'))
+        offsets = section['offsets']
+        unpacked[name] = {n: packed[:, offsets[i]:offsets[i + 1]] for i, n in enumerate(section['names'])}
+    inputs = ScreeningInputs(frozenset(manifest['short_pool']), manifest['min_volume_usd'], manifest['fetch_days'],
+                             [tuple(v) for v in manifest['volumes']], unpacked['klines'], unpacked['bench'],
+                             as_of=manifest['as_of'], version=manifest['version'])
+    _worker_snapshot.clear()
+    _worker_snapshot[manifest['version']] = inputs
+    return inputs
+
+
+def _evaluate_chunk(manifest: Dict[str, Any], criteria_list: List[Dict[str, Any]],
+                    blacklist: List[str]) -> List[Tuple[Optional[List[str]], Optional[str]]]:
+    """子进程入口：对一批筛选条件排名，返回 (币种列表, 错误信息)。"""
+    inputs = _load_snapshot(manifest)
+    results = []
+    for criteria in criteria_list:
+        try:
+            results.append((rank_screening_inputs(inputs, criteria, blacklist, verbose=False), None))
+        except ValueError as e:
+            results.append((None, str(e)))
+    return results
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    进程池的大小只由配置 (或 CPU 核心数) 决定，与单次扫描的组合数无关，并发扫描共用同一个进程池。
+    配置变化后只在没有扫描进行时重建，不会取消其他扫描正在执行的任务。
+    """
+    global _pool, _pool_workers
+    if _pool is None or (_pool_workers != max_workers and not _exports_in_use):
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # spawn：子进程不继承事件循环和线程池的状态
+        _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        _pool_workers = max_workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _jaccard(a: set, b: set) -> float:
+    union = a | b
+    return len(a & b) / len(union) if union else 1.0
+
+
+def overlap_statistics(coin_lists: List[Optional[List[str]]]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """每组结果与第一组 (基准) 的 Jaccard 重合度、与其余各组的平均重合度，以及各币种被选中的次数。"""
+    sets = [set(c) if c is not None else None for c in coin_lists]
+    valid = [i for i, s in enumerate(sets) if s is not None]
+    baseline = sets[valid[0]] if valid else None
+    stats = []
+    for i, s in enumerate(sets):
+        if s is None:
+            stats.append({'overlap_with_baseline': None, 'mean_overlap': None})
+            continue
+        others = [_jaccard(s, sets[j]) for j in valid if j != i]
+        stats.append({
+            'overlap_with_baseline': round(_jaccard(s, baseline), 4),
+            'mean_overlap': round(sum(others) / len(others), 4) if others else None,
+        })
+    frequency: Dict[str, int] = {}
+    for s in sets:
+        for coin in s or ():
+            frequency[coin] = frequency.get(coin, 0) + 1
+    return stats, dict(sorted(frequency.items(), key=lambda item: -item[1]))
+
+
+async def run_sweep(inputs: ScreeningInputs, criteria_list: List[Dict[str, Any]], blacklist: List[str],
+                    export_dir: Path, max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """在进程池中并行评估所有参数组合。"""
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    pool = _get_pool(max(1, max_workers or os.cpu_count() or 1))
+    # 组合数较少时只切出较少的分块，单次扫描的并行度由分块数限制，进程池本身保持不变
+    workers = min(_pool_workers, len(criteria_list))
+    _exports_in_use[inputs.version] = _exports_in_use.get(inputs.version, 0) + 1
+    try:
+        manifest = await loop.run_in_executor(None, export_snapshot, inputs, export_dir)
+        chunk_size = max(1, math.ceil(len(criteria_list) / (workers * 4)))
+        chunks = [criteria_list[i:i + chunk_size] for i in range(0, len(criteria_list), chunk_size)]
+        chunk_results = await asyncio.gather(
+            *[loop.run_in_executor(pool, _evaluate_chunk, manifest, chunk, blacklist) for chunk in chunks])
+    finally:
+        _exports_in_use[inputs.version] -= 1
+        if not _exports_in_use[inputs.version]:
+            del _exports_in_use[inputs.version]
+        # 本次快照保留给下一次扫描复用，其余版本只要没有扫描在用就可以删除
+        await loop.run_in_executor(None, remove_stale_exports, export_dir, inputs.version)
+    outcomes = [outcome for chunk in chunk_results for outcome in chunk]
+
+    stats, frequency = overlap_statistics([coins for coins, _ in outcomes])
+    results = [
+        {'criteria': criteria, 'coins': coins, 'error': error, **overlap}
+        for criteria, (coins, error), overlap in zip(criteria_list, outcomes, stats)
+    ]
+    return {
+        'results': results,
+        'coin_frequency': frequency,
+        'combinations': len(criteria_list),
+        'workers': workers,
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,655 @@
+# backend/app/logic/sim_exchange.py
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import ccxt.async_support as ccxt
+import numpy as np
+
+from ..config import config as app_config
+
+# 模拟行情历史的起点 (2020-01-01 UTC)，各币种的上线时间在此之后
+_HISTORY_EPOCH_MS = 1577836800000
+_DAY_MS = 24 * 3600 * 1000
+_MIN_NOTIONAL = 5.0
+_MAKER_FEE, _TAKER_FEE = 0.0002, 0.0005
+_FINAL_STATUSES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED')
+# 这些币种使用接近真实的价格，其余币种的价格由名称哈希决定
+_REFERENCE_PRICES = {'BTC': 60000.0, 'ETH': 3000.0, 'BNB': 550.0, 'SOL': 150.0}
+# 盘口价格按离散的跳动变化 (平均每秒的跳动次数)，两次请求之间价格通常不变
+_PRICE_JUMPS_PER_SECOND = 1.0
+# 对数价格向参考价回归的时间常数 (天)：保留数周级别的趋势，但价格不会随时间漂移到不现实的水平
+_MEAN_REVERSION_DAYS = 90.0
+
+SIM_API_KEY = 'simulated'
+
+
+class _VenueError(Exception):
+    """与币安错误响应 ({"code": -2011, "msg": ...}) 一致的错误，由 SimulatedExchange 交给 ccxt 的 handle_errors 转换为异常。"""
+
+    def __init__(self, code: int, msg: str, http_status: int = 400):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+        self.http_status = http_status
+
+
+def _stable_hash(*parts: Any) -> int:
+    return int.from_bytes(hashlib.sha1(":".join(map(str, parts)).encode('utf-8')).digest()[:8], 'big')
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.10f}".rstrip('0').rstrip('.') or '0'
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    if mean > 30:
+        return max(0, round(rng.gauss(mean, math.sqrt(mean))))
+    threshold, count, product = math.exp(-mean), 0, rng.random()
+    while product > threshold:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _mean_reverting(mean: float, phi: float, shocks: np.ndarray) -> np.ndarray:
+    """AR(1) 序列 x_t = mean + phi * (x_{t-1} - mean) + shock_t (x_0 = mean)，分块用折现累加向量化计算。"""
+    deviations = np.empty(len(shocks))
+    # 块内 phi 的负幂不超过 1e6，避免数值溢出
+    block = max(1, int(math.log(1e6) / -math.log(phi))) if phi < 1 else len(shocks) or 1
+    level = 0.0
+    for start in range(0, len(shocks), block):
+        chunk = shocks[start:start + block]
+        powers = phi ** np.arange(1, len(chunk) + 1)
+        deviations[start:start + len(chunk)] = powers * (level + np.cumsum(chunk / powers))
+        level = deviations[start + len(chunk) - 1]
+    return mean + deviations
+
+
+class _Instrument:
+    """一个模拟的永续合约：交易规则、日线波动率、日均成交额，以及随时间随机游走的盘口中间价。"""
+
+    def __init__(self, base: str, seed: int):
+        self.base = base
+        self.id = f"{base}USDT"
+        rng = random.Random(_stable_hash(seed, base))
+        anchor = _REFERENCE_PRICES.get(base) or 10 ** rng.uniform(-3, 3)
+        self.sigma_daily = 0.03 if base in _REFERENCE_PRICES else rng.uniform(0.03, 0.09)
+        self.quote_volume = 10 ** rng.uniform(9, 10) if base in _REFERENCE_PRICES else 10 ** rng.uniform(6.5, 9)
+        listed_days = 0 if base in _REFERENCE_PRICES else rng.randrange(0, 4 * 365)
+        self.onboard_ms = _HISTORY_EPOCH_MS + listed_days * _DAY_MS
+        self.spread_ticks = rng.randint(1, 3)
+        self._seed = _stable_hash(seed, base, 'path')
+        self._anchor = anchor
+        self._paths: Dict[int, Tuple[int, np.ndarray]] = {}
+
+        # 按当前价格确定交易规则：价格精度约为 5 位有效数字，数量精度保证最小下单价值不超过约 100 美元
+        current = int(time.time() * 1000) // _DAY_MS
+        price = math.exp(self._log_closes(_DAY_MS, current)[current - _HISTORY_EPOCH_MS // _DAY_MS - 1])
+        magnitude = math.floor(math.log10(price))
+        self.tick = 10.0 ** (magnitude - 4)
+        self.step = 10.0 ** min(0, max(-3, 1 - magnitude))
+        self.mid: Optional[float] = None
+        self.updated_at = 0.0
+
+    # --- 行情历史：以 2020-01-01 为起点、向参考价回归的确定性对数随机游走，同一种子下每次生成的结果相同 ---
+    def _log_closes(self, tf_ms: int, last_period: int) -> np.ndarray:
+        first_period = _HISTORY_EPOCH_MS // tf_ms
+        cached = self._paths.get(tf_ms)
+        if cached is not None and cached[0] >= last_period:
+            return cached[1]
+        count = last_period - first_period + 1
+        sigma = self.sigma_daily * math.sqrt(tf_ms / _DAY_MS)
+        rng = np.random.default_rng(self._seed + tf_ms)
+        phi = math.exp(-tf_ms / _DAY_MS / _MEAN_REVERSION_DAYS)
+        path = _mean_reverting(math.log(self._anchor), phi, rng.normal(0.0, sigma, count))
+        self._paths[tf_ms] = (last_period, path)
+        return path
+
+    def candles(self, tf_ms: int, start_ms: Optional[int], end_ms: Optional[int], limit: int, now: float) -> List[list]:
+        current = int(now * 1000) // tf_ms
+        first = max(_HISTORY_EPOCH_MS, self.onboard_ms) // tf_ms
+        start = max(first, (start_ms + tf_ms - 1) // tf_ms if start_ms is not None else current - limit + 1)
+        end = min(current, end_ms // tf_ms if end_ms is not None else current, start + limit - 1)
+        if end < start:
+            return []
+        path = self._log_closes(tf_ms, current)
+        offset = _HISTORY_EPOCH_MS // tf_ms
+        periods = np.arange(start, end + 1)
+        closes = np.exp(path[periods - offset])
+        opens = np.exp(path[np.maximum(periods - offset - 1, 0)])
+        if end == current and self.mid is not None:
+            # 当前周期尚未收盘：收盘价即盘口中间价
+            closes[-1] = self.mid
+        noise = np.random.default_rng(self._seed + tf_ms + 1).random((2, len(periods)))
+        wick = self.sigma_daily * math.sqrt(tf_ms / _DAY_MS) * 0.5
+        highs = np.maximum(opens, closes) * (1 + wick * noise[0])
+        lows = np.minimum(opens, closes) * (1 - wick * noise[1])
+        quote_volumes = self.quote_volume * tf_ms / _DAY_MS * (0.5 + noise[0] + noise[1] * 0.5)
+        return [
+            [int(p * tf_ms), _fmt(o), _fmt(h), _fmt(l), _fmt(c), _fmt(qv / c), int(p * tf_ms + tf_ms - 1), _fmt(qv),
+             1000, _fmt(qv / c / 2), _fmt(qv / 2), '0']
+            for p, o, h, l, c, qv in zip(periods, opens, highs, lows, closes, quote_volumes)
+        ]
+
+    # --- 盘口 ---
+    def advance(self, now: float, rng: random.Random, volatility_multiplier: float):
+        """
+        盘口中间价按泊松过程离散跳动，总体波动率与日线波动率一致 (乘以 volatility_multiplier)，
+        与历史 K 线一样向参考价回归，长时间运行的进程中价格也不会无限漂移。
+        """
+        if self.mid is None:
+            # 从当前周期的开盘价 (即上一根日线的收盘价) 开始
+            current = int(now * 1000) // _DAY_MS
+            self.mid = float(math.exp(self._log_closes(_DAY_MS, current)[current - _HISTORY_EPOCH_MS // _DAY_MS - 1]))
+            self.updated_at = now
+            return
+        elapsed = now - self.updated_at
+        if elapsed <= 0:
+            return
+        jumps = _poisson(rng, _PRICE_JUMPS_PER_SECOND * elapsed)
+        if jumps:
+            sigma = self.sigma_daily * volatility_multiplier * math.sqrt(jumps / _PRICE_JUMPS_PER_SECOND / 86400)
+            pull = 1 - math.exp(-elapsed / 86400 / _MEAN_REVERSION_DAYS)
+            self.mid *= math.exp(pull * math.log(self._anchor / self.mid) + rng.gauss(0.0, sigma))
+        self.updated_at = now
+
+    def best(self) -> Tuple[float, float]:
+        bid = math.floor(self.mid / self.tick) * self.tick
+        return bid, bid + self.spread_ticks * self.tick
+
+    def round_qty(self, qty: float) -> float:
+        return math.floor(qty / self.step + 1e-9) * self.step
+
+
+class SimulatedVenue:
+    """
+    离线的币安 U 本位合约：按 REST 接口路径处理请求并返回与币安相同格式的原始 JSON，
+    因此 ccxt 的解析、精度处理和错误映射都与实盘一致。
+    挂单在价格穿过时全部成交，否则按每秒 fill_probability 的概率成交 (可能只部分成交)；
+    止损/止盈单在标记价格 (中间价) 触发后按对手价成交；持仓为单向持仓模式。
+    """
+
+    def __init__(self):
+        self.config: Dict[str, Any] = {}
+        self._seed: Optional[int] = None
+        self._rng = random.Random()
+        self._reset()
+
+    def _reset(self):
+        self._instruments: Dict[str, _Instrument] = {}
+        self._by_id: Dict[str, _Instrument] = {}
+        self._orders: Dict[int, Dict[str, Any]] = {}
+        self._open_by_symbol: Dict[str, List[int]] = {}
+        self._positions: Dict[str, Dict[str, float]] = {}
+        self._leverage: Dict[str, int] = {}
+        self._order_ids = itertools.count(1)
+        self.stats = {"requests": 0, "orders_created": 0, "orders_rejected": 0, "fills": 0, "partial_fills": 0,
+                      "stop_triggers": 0, "rate_limit_errors": 0, "fees_paid": 0.0}
+
+    def configure(self, settings: Dict[str, Any], bases: List[str]):
+        """应用设置中的模拟参数；种子变化时重置整个模拟账户。"""
+        seed = int(settings.get('sim_seed', 42))
+        if seed != self._seed:
+            self._reset()
+            self._seed = seed
+            self._rng.seed(seed)
+        self.config = {
+            'latency_ms': float(settings.get('sim_latency_ms', 50)),
+            'latency_jitter_ms': float(settings.get('sim_latency_jitter_ms', 20)),
+            'fill_probability': float(settings.get('sim_fill_probability', 0.2)),
+            'partial_fill_probability': float(settings.get('sim_partial_fill_probability', 0.3)),
+            'rate_limit_error_rate': float(settings.get('sim_rate_limit_error_rate', 0.0)),
+            'volatility_multiplier': float(settings.get('sim_volatility_multiplier', 1.0)),
+        }
+        for base in bases:
+            base = base.upper()
+            if base and base not in self._instruments:
+                instrument = _Instrument(base, seed)
+                self._instruments[base] = instrument
+                self._by_id[instrument.id] = instrument
+
+    def latency(self) -> float:
+        delay = self._rng.gauss(self.config['latency_ms'], self.config['latency_jitter_ms'])
+        return max(0.0, delay) / 1000
+
+    def should_throttle(self) -> bool:
+        if self._rng.random() < self.config['rate_limit_error_rate']:
+            self.stats["rate_limit_errors"] += 1
+            return True
+        return False
+
+    # --- 请求路由 ---
+    def handle(self, method: str, path: str, params: Dict[str, str]) -> Any:
+        self.stats["requests"] += 1
+        handler = self._ROUTES.get((method, path))
+        if handler is None:
+            raise _VenueError(-1000, f"Simulated exchange does not support {method} {path}.", 404)
+        return handler(self, params)
+
+    def _instrument(self, market_id: Optional[str]) -> _Instrument:
+        instrument = self._by_id.get(market_id)
+        if instrument is None:
+            raise _VenueError(-1121, "Invalid symbol.")
+        return instrument
+
+    def _touch(self, instrument: _Instrument, now: float):
+        instrument.advance(now, self._rng, self.config['volatility_multiplier'])
+        self._match(instrument, now)
+
+    def _touch_all(self, now: float):
+        for instrument in self._instruments.values():
+            if instrument.mid is not None or self._open_by_symbol.get(instrument.id):
+                self._touch(instrument, now)
+
+    # --- 公共接口 ---
+    def _time(self, params):
+        return {'serverTime': int(time.time() * 1000)}
+
+    def _exchange_info(self, params):
+        symbols = []
+        for instrument in self._instruments.values():
+            price_decimals = max(0, -round(math.log10(instrument.tick)))
+            qty_decimals = max(0, -round(math.log10(instrument.step)))
+            symbols.append({
+                'symbol': instrument.id, 'pair': instrument.id, 'contractType': 'PERPETUAL',
+                'deliveryDate': 4133404800000, 'onboardDate': instrument.onboard_ms, 'status': 'TRADING',
+                'baseAsset': instrument.base, 'quoteAsset': 'USDT', 'marginAsset': 'USDT',
+                'pricePrecision': price_decimals, 'quantityPrecision': qty_decimals,
+                'baseAssetPrecision': 8, 'quotePrecision': 8, 'underlyingType': 'COIN', 'underlyingSubType': [],
+                'triggerProtect': '0.0500', 'liquidationFee': '0.012500', 'marketTakeBound': '0.05',
+                'filters': [
+                    {'filterType': 'PRICE_FILTER', 'minPrice': _fmt(instrument.tick), 'maxPrice': '10000000',
+                     'tickSize': _fmt(instrument.tick)},
+                    {'filterType': 'LOT_SIZE', 'minQty': _fmt(instrument.step), 'maxQty': '100000000',
+                     'stepSize': _fmt(instrument.step)},
+                    {'filterType': 'MARKET_LOT_SIZE', 'minQty': _fmt(instrument.step), 'maxQty': '100000000',
+                     'stepSize': _fmt(instrument.step)},
+                    {'filterType': 'MAX_NUM_ORDERS', 'limit': 200},
+                    {'filterType': 'MIN_NOTIONAL', 'notional': _fmt(_MIN_NOTIONAL)},
+                    {'filterType': 'PERCENT_PRICE', 'multiplierUp': '1.0500', 'multiplierDown': '0.9500',
+                     'multiplierDecimal': '4'},
+                ],
+                'orderTypes': ['LIMIT', 'MARKET', 'STOP', 'STOP_MARKET', 'TAKE_PROFIT', 'TAKE_PROFIT_MARKET'],
+                'timeInForce': ['GTC', 'IOC', 'FOK', 'GTX'],
+            })
+        return {'timezone': 'UTC', 'serverTime': int(time.time() * 1000), 'rateLimits': [], 'exchangeFilters': [],
+                'assets': [{'asset': 'USDT', 'marginAvailable': True}], 'symbols': symbols}
+
+    def _depth(self, params):
+        instrument = self._instrument(params.get('symbol'))
+        now = time.time()
+        self._touch(instrument, now)
+        bid, ask = instrument.best()
+        limit = int(params.get('limit', 5))
+        level_value = instrument.quote_volume / 20000
+        book = {'bids': [], 'asks': []}
+        for i in range(limit):
+            size = instrument.round_qty(level_value / instrument.mid * self._rng.uniform(0.2, 2.0)) or instrument.step
+            book['bids'].append([_fmt(bid - i * instrument.tick), _fmt(size)])
+            book['asks'].append([_fmt(ask + i * instrument.tick), _fmt(size)])
+        ms = int(now * 1000)
+        return {'lastUpdateId': ms, 'E': ms, 'T': ms, **book}
+
+    def _ticker_24hr(self, params):
+        now = time.time()
+        market_id = params.get('symbol')
+        instruments = [self._instrument(market_id)] if market_id else list(self._instruments.values())
+        tickers = []
+        for instrument in instruments:
+            if now * 1000 < instrument.onboard_ms:
+                continue
+            self._touch(instrument, now)
+            candles = instrument.candles(_DAY_MS, None, None, 2, now)
+            previous, current = candles[0], candles[-1]
+            last = instrument.mid
+            open_price = float(current[1])
+            tickers.append({
+                'symbol': instrument.id, 'priceChange': _fmt(last - open_price),
+                'priceChangePercent': f"{(last - open_price) / open_price * 100:.3f}",
+                'weightedAvgPrice': _fmt(last), 'lastPrice': _fmt(last), 'lastQty': _fmt(instrument.step),
+                'openPrice': current[1], 'highPrice': _fmt(max(float(current[2]), last)),
+                'lowPrice': _fmt(min(float(current[3]), last)),
+                # 24 小时成交额取上一根完整日线，避免刚开盘时成交额过小
+                'volume': previous[5], 'quoteVolume': previous[7],
+                'openTime': int(now * 1000) - _DAY_MS, 'closeTime': int(now * 1000), 'firstId': 1, 'lastId': 1000,
+                'count': 1000,
+            })
+        return tickers[0] if market_id else tickers
+
+    def _klines(self, params):
+        instrument = self._instrument(params.get('symbol'))
+        tf_ms = ccxt.Exchange.parse_timeframe(params.get('interval', '1d')) * 1000
+        now = time.time()
+        self._touch(instrument, now)
+        start = int(params['startTime']) if 'startTime' in params else None
+        end = int(params['endTime']) if 'endTime' in params else None
+        return instrument.candles(tf_ms, start, end, min(int(params.get('limit', 500)), 1500), now)
+
+    # --- 账户接口 ---
+    def _listen_key(self, params):
+        return {'listenKey': f"simulated-{self._seed}"}
+
+    def _set_leverage(self, params):
+        instrument = self._instrument(params.get('symbol'))
+        leverage = int(params.get('leverage', 1))
+        if not 1 <= leverage <= 125:
+            raise _VenueError(-4028, "Leverage is not valid.")
+        self._leverage[instrument.id] = leverage
+        return {'symbol': instrument.id, 'leverage': leverage, 'maxNotionalValue': '1000000000'}
+
+    def _leverage_bracket(self, params):
+        return [{'symbol': instrument.id,
+                 'brackets': [{'bracket': 1, 'initialLeverage': 125, 'notionalCap': 1000000000, 'notionalFloor': 0,
+                               'maintMarginRatio': 0.004, 'cum': 0.0}]}
+                for instrument in self._instruments.values()]
+
+    def _position_risk(self, params):
+        now = time.time()
+        self._touch_all(now)
+        result = []
+        for market_id, position in self._positions.items():
+            if params.get('symbol') and params['symbol'] != market_id:
+                continue
+            instrument = self._instrument(market_id)
+            amount, entry = position['amount'], position['entry_price']
+            mark = instrument.mid
+            result.append({
+                'symbol': market_id, 'positionAmt': _fmt(amount), 'entryPrice': _fmt(entry),
+                'breakEvenPrice': _fmt(entry), 'markPrice': _fmt(mark),
+                'unRealizedProfit': _fmt((mark - entry) * amount), 'liquidationPrice': '0',
+                'leverage': str(self._leverage.get(market_id, 20)), 'maxNotionalValue': '1000000000',
+                'marginType': 'cross', 'isolatedMargin': '0', 'isAutoAddMargin': 'false', 'positionSide': 'BOTH',
+                'notional': _fmt(mark * amount), 'isolatedWallet': '0', 'updateTime': int(position['updated'] * 1000),
+            })
+        return result
+
+    def _open_orders(self, params):
+        now = time.time()
+        market_id = params.get('symbol')
+        if market_id:
+            self._touch(self._instrument(market_id), now)
+            ids = self._open_by_symbol.get(market_id, [])
+        else:
+            self._touch_all(now)
+            ids = [i for order_ids in self._open_by_symbol.values() for i in order_ids]
+        return [self._public_order(self._orders[i]) for i in ids]
+
+    def _find_order(self, params) -> Dict[str, Any]:
+        order = None
+        if params.get('orderId'):
+            order = self._orders.get(int(params['orderId']))
+        elif params.get('origClientOrderId'):
+            order = next((o for o in self._orders.values() if o['clientOrderId'] == params['origClientOrderId']), None)
+        if order is None or order['symbol'] != params.get('symbol'):
+            raise _VenueError(-2013, "Order does not exist.")
+        return order
+
+    def _get_order(self, params):
+        instrument = self._instrument(params.get('symbol'))
+        self._touch(instrument, time.time())
+        return self._public_order(self._find_order(params))
+
+    def _cancel_order(self, params):
+        instrument = self._instrument(params.get('symbol'))
+        self._touch(instrument, time.time())
+        try:
+            order = self._find_order(params)
+        except _VenueError:
+            raise _VenueError(-2011, "Unknown order sent.")
+        if order['status'] in _FINAL_STATUSES:
+            raise _VenueError(-2011, "Unknown order sent.")
+        self._close_order(order, 'CANCELED')
+        return self._public_order(order)
+
+    def _create_order(self, params):
+        return self._public_order(self._new_order(params))
+
+    def _batch_orders(self, params):
+        results = []
+        for request in json.loads(params.get('batchOrders', '[]')):
+            try:
+                results.append(self._public_order(self._new_order({k: str(v) for k, v in request.items()})))
+            except _VenueError as e:
+                results.append({'code': e.code, 'msg': e.msg})
+        return results
+
+    # --- 撮合 ---
+    def _price_param(self, params: Dict[str, str], name: str) -> Optional[float]:
+        """缺失时返回 None；格式错误或不为正数时与币安一样返回 -1102。"""
+        if not params.get(name):
+            return None
+        try:
+            value = float(params[name])
+        except (TypeError, ValueError):
+            value = float('nan')
+        if not value > 0:
+            raise self._reject(-1102, f"Mandatory parameter '{name}' was not sent, was empty/null, or malformed.")
+        return value
+
+    def _new_order(self, params: Dict[str, str]) -> Dict[str, Any]:
+        instrument = self._instrument(params.get('symbol'))
+        now = time.time()
+        self._touch(instrument, now)
+        order_type = params.get('type', 'LIMIT')
+        side = params.get('side')
+        quantity = float(params.get('quantity', 0))
+        reduce_only = str(params.get('reduceOnly')).lower() == 'true'
+        bid, ask = instrument.best()
+        price = self._price_param(params, 'price')
+        stop_price = self._price_param(params, 'stopPrice')
+
+        if order_type == 'LIMIT' and price is None:
+            raise self._reject(-1102, "Mandatory parameter 'price' was not sent, was empty/null, or malformed.")
+        if quantity <= 0:
+            raise self._reject(-4003, "Quantity less than or equal to zero.")
+        reference = price or (ask if side == 'BUY' else bid)
+        if not reduce_only and quantity * reference < _MIN_NOTIONAL:
+            raise self._reject(-4164, f"Order's notional must be no smaller than {_fmt(_MIN_NOTIONAL)} "
+                                      f"(unless you choose reduce only).")
+        if reduce_only and order_type in ('LIMIT', 'MARKET') and not self._reduces(instrument.id, side):
+            raise self._reject(-2022, "ReduceOnly Order is rejected.")
+        if order_type == 'LIMIT':
+            crosses = price >= ask if side == 'BUY' else price <= bid
+            if crosses and params.get('timeInForce') == 'GTX':
+                raise self._reject(-5022, "Due to the order could not be executed as maker, the Post Only order will "
+                                          "be rejected. The order will not be recorded in the order history")
+        elif order_type in ('STOP_MARKET', 'TAKE_PROFIT_MARKET'):
+            if stop_price is None:
+                raise self._reject(-1102, "Mandatory parameter 'stopPrice' was not sent, was empty/null, or malformed.")
+            if self._triggered(order_type, side, stop_price, instrument.mid):
+                raise self._reject(-2021, "Order would immediately trigger.")
+        elif order_type != 'MARKET':
+            raise self._reject(-1116, "Invalid orderType.")
+
+        order_id = next(self._order_ids)
+        order = {
+            'orderId': order_id, 'symbol': instrument.id, 'status': 'NEW',
+            'clientOrderId': params.get('newClientOrderId') or f"sim-{order_id}",
+            'price': price or 0.0, 'avgPrice': 0.0, 'origQty': quantity, 'executedQty': 0.0, 'cumQuote': 0.0,
+            'timeInForce': params.get('timeInForce', 'GTC'), 'type': order_type, 'reduceOnly': reduce_only,
+            'side': side, 'stopPrice': stop_price or 0.0, 'time': now, 'updateTime': now, 'checked_at': now,
+        }
+        self._orders[order_id] = order
+        self.stats["orders_created"] += 1
+        if order_type == 'MARKET' or (order_type == 'LIMIT' and crosses):
+            self._fill(order, instrument, quantity, ask if side == 'BUY' else bid, taker=True)
+        if order['status'] not in _FINAL_STATUSES:
+            self._open_by_symbol.setdefault(instrument.id, []).append(order_id)
+        return order
+
+    def _reject(self, code: int, msg: str) -> _VenueError:
+        self.stats["orders_rejected"] += 1
+        return _VenueError(code, msg)
+
+    def _reduces(self, market_id: str, side: str) -> bool:
+        amount = self._positions.get(market_id, {}).get('amount', 0.0)
+        return amount < 0 if side == 'BUY' else amount > 0
+
+    @staticmethod
+    def _triggered(order_type: str, side: str, stop_price: float, mark: float) -> bool:
+        # 买入止损在价格上涨到触发价时触发，买入止盈在价格下跌到触发价时触发；卖出方向相反
+        rising = (order_type == 'STOP_MARKET') == (side == 'BUY')
+        return mark >= stop_price if rising else mark <= stop_price
+
+    def _match(self, instrument: _Instrument, now: float):
+        order_ids = self._open_by_symbol.get(instrument.id)
+        if not order_ids:
+            return
+        bid, ask = instrument.best()
+        for order_id in list(order_ids):
+            order = self._orders[order_id]
+            elapsed, order['checked_at'] = now - order['checked_at'], now
+            remaining = order['origQty'] - order['executedQty']
+            if order['type'] == 'LIMIT':
+                side_buy = order['side'] == 'BUY'
+                if (ask <= order['price']) if side_buy else (bid >= order['price']):
+                    self._fill(order, instrument, remaining, order['price'], taker=False)
+                elif self._rng.random() < 1 - (1 - self.config['fill_probability']) ** max(elapsed, 0.0):
+                    quantity = remaining
+                    if self._rng.random() < self.config['partial_fill_probability']:
+                        quantity = instrument.round_qty(remaining * self._rng.uniform(0.1, 0.9))
+                        quantity = min(max(quantity, instrument.step), remaining)
+                    self._fill(order, instrument, quantity, order['price'], taker=False)
+            elif self._triggered(order['type'], order['side'], order['stopPrice'], instrument.mid):
+                self.stats["stop_triggers"] += 1
+                self._fill(order, instrument, remaining, ask if order['side'] == 'BUY' else bid, taker=True)
+
+    def _fill(self, order: Dict[str, Any], instrument: _Instrument, quantity: float, price: float, taker: bool):
+        position = self._positions.setdefault(instrument.id, {'amount': 0.0, 'entry_price': 0.0, 'updated': 0.0})
+        signed = quantity if order['side'] == 'BUY' else -quantity
+        if order['reduceOnly']:
+            # 只减仓：不能超过当前反向持仓，没有可减的仓位时订单失效
+            if position['amount'] == 0 or (position['amount'] > 0) == (signed > 0):
+                self._close_order(order, 'EXPIRED')
+                return
+            signed = math.copysign(min(abs(signed), abs(position['amount'])), signed)
+            quantity = abs(signed)
+
+        amount = position['amount']
+        new_amount = amount + signed
+        if amount == 0 or (amount > 0) == (signed > 0):
+            position['entry_price'] = (position['entry_price'] * abs(amount) + price * quantity) / abs(new_amount)
+        elif abs(signed) > abs(amount):
+            # 反手：剩余部分以成交价开新仓
+            position['entry_price'] = price
+        position['amount'] = 0.0 if abs(new_amount) < instrument.step / 2 else new_amount
+        if position['amount'] == 0:
+            position['entry_price'] = 0.0
+        position['updated'] = time.time()
+
+        executed = order['executedQty'] + quantity
+        order['avgPrice'] = (order['avgPrice'] * order['executedQty'] + price * quantity) / executed
+        order['executedQty'] = executed
+        order['cumQuote'] += price * quantity
+        order['updateTime'] = time.time()
+        self.stats["fees_paid"] += price * quantity * (_TAKER_FEE if taker else _MAKER_FEE)
+        if executed >= order['origQty'] - instrument.step / 2 or order['reduceOnly'] and position['amount'] == 0:
+            self.stats["fills"] += 1
+            self._close_order(order, 'FILLED')
+        else:
+            self.stats["partial_fills"] += 1
+            order['status'] = 'PARTIALLY_FILLED'
+
+    def _close_order(self, order: Dict[str, Any], status: str):
+        order['status'] = status
+        order['updateTime'] = time.time()
+        order_ids = self._open_by_symbol.get(order['symbol'], [])
+        if order['orderId'] in order_ids:
+            order_ids.remove(order['orderId'])
+
+    @staticmethod
+    def _public_order(order: Dict[str, Any]) -> Dict[str, Any]:
+        """币安 /fapi/v1/order 的响应格式。"""
+        return {
+            'orderId': order['orderId'], 'symbol': order['symbol'], 'status': order['status'],
+            'clientOrderId': order['clientOrderId'], 'price': _fmt(order['price']), 'avgPrice': _fmt(order['avgPrice']),
+            'origQty': _fmt(order['origQty']), 'executedQty': _fmt(order['executedQty']),
+            'cumQuote': _fmt(order['cumQuote']), 'timeInForce': order['timeInForce'], 'type': order['type'],
+            'reduceOnly': order['reduceOnly'], 'closePosition': False, 'side': order['side'], 'positionSide': 'BOTH',
+            'stopPrice': _fmt(order['stopPrice']), 'workingType': 'CONTRACT_PRICE', 'priceProtect': False,
+            'origType': order['type'], 'time': int(order['time'] * 1000), 'updateTime': int(order['updateTime'] * 1000),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "fees_paid": round(self.stats["fees_paid"], 4),
+            "instruments": len(self._instruments),
+            "open_orders": sum(len(ids) for ids in self._open_by_symbol.values()),
+            "positions": sum(1 for p in self._positions.values() if p['amount'] != 0),
+            "config": self.config,
+        }
+
+    _ROUTES = {
+        ('GET', '/fapi/v1/time'): _time,
+        ('GET', '/fapi/v1/exchangeInfo'): _exchange_info,
+        ('GET', '/fapi/v1/depth'): _depth,
+        ('GET', '/fapi/v1/ticker/24hr'): _ticker_24hr,
+        ('GET', '/fapi/v1/klines'): _klines,
+        ('POST', '/fapi/v1/listenKey'): _listen_key,
+        ('PUT', '/fapi/v1/listenKey'): _listen_key,
+        ('POST', '/fapi/v1/leverage'): _set_leverage,
+        ('GET', '/fapi/v1/leverageBracket'): _leverage_bracket,
+        ('GET', '/fapi/v2/positionRisk'): _position_risk,
+        ('GET', '/fapi/v1/openOrders'): _open_orders,
+        ('GET', '/fapi/v1/order'): _get_order,
+        ('POST', '/fapi/v1/order'): _create_order,
+        ('DELETE', '/fapi/v1/order'): _cancel_order,
+        ('POST', '/fapi/v1/batchOrders'): _batch_orders,
+    }
+
+
+simulated_venue = SimulatedVenue()
+
+
+class SimulatedExchange(ccxt.binanceusdm):
+    """
+    接入模拟交易所的 ccxt 实例：只替换最底层的 HTTP 请求 (fetch)，请求在本进程内由 SimulatedVenue 处理。
+    签名、参数构造、响应解析和错误映射仍由 ccxt 完成，交易逻辑中用到的所有 ccxt 方法 (包括批量下单) 都无需改动。
+    """
+
+    def __init__(self, venue: SimulatedVenue, config: Optional[Dict[str, Any]] = None):
+        super().__init__(config or {})
+        self._venue = venue
+
+    async def fetch(self, url, method='GET', headers=None, body=None):
+        parts = urlsplit(url)
+        params = dict(parse_qsl(parts.query))
+        if body:
+            params.update(parse_qsl(body))
+        await asyncio.sleep(self._venue.latency())
+        try:
+            if self._venue.should_throttle():
+                raise _VenueError(-1003, "Too many requests; simulated rate limit.", 429)
+            return self._venue.handle(method, parts.path, params)
+        except _VenueError as e:
+            payload = {'code': e.code, 'msg': e.msg}
+            text = json.dumps(payload)
+            self.handle_errors(e.http_status, 'Simulated', url, method, {}, text, payload, headers, body)
+            raise ccxt.ExchangeError(f"{self.id} {text}")
+
+
+def _universe(settings: Dict[str, Any]) -> List[str]:
+    """模拟的合约：币种池、多空列表中的所有币种，以及常用的相对强度基准。"""
+    return list(dict.fromkeys([*_REFERENCE_PRICES, *app_config.AVAILABLE_COINS,
+                               *settings.get('long_coin_list', []), *settings.get('short_coin_list', [])]))
+
+
+async def initialize_simulated_exchange_async(settings: Dict[str, Any]) -> SimulatedExchange:
+    """按设置中的模拟参数创建模拟交易所实例并加载市场 (模拟账户在进程内共享，重建实例不会丢失持仓)。"""
+    simulated_venue.configure(settings, _universe(settings))
+    exchange = SimulatedExchange(simulated_venue, {
+        'apiKey': SIM_API_KEY, 'secret': SIM_API_KEY,
+        'options': {'warnOnFetchOpenOrdersWithoutSymbol': False, 'fetchCurrencies': False,
+                    # K 线仓库按该范围分目录存放，模拟行情不会混入实盘数据
+                    'marketsCacheScope': 'simulated'},
+    })
+    await exchange.load_markets()
+    return exchange
@@ -1,48 +1,208 @@
 # backend/app/logic/sl_tp_logic_async.py (最终修复版)
 import asyncio
-from typing import Set
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
 
 import ccxt.async_support as ccxt
 
 from .exceptions import InterruptedError
+from .order_batcher import get_order_batcher
 from ..config import i18n
+from ..config.config import load_settings
 from ..models.schemas import Position
 
+_SL_ORDER_TYPES = ('stop_market', 'stop')
+_TP_ORDER_TYPES = ('take_profit_market', 'take_profit')
 
-async def _cancel_sl_tp_orders_async(exchange: ccxt.binanceusdm, symbol: str, async_logger):
+
+class SltpSyncSnapshot:
+    """
+    一次 SL/TP 同步任务共享的账户快照：任务开始时各取一次全账户的持仓和挂单，按交易对建立索引，
+    各仓位的处理逻辑从这里读取，并在撤单/下单后同步更新，使 N 个仓位的同步只需要常数次快照请求。
+    """
+
+    def __init__(self, raw_positions: List[dict], open_orders: List[dict]):
+        self.raw_positions = [p for p in raw_positions if float(p.get('contracts', 0) or 0) != 0]
+        self._positions_by_symbol = {p['symbol']: p for p in self.raw_positions}
+        self._orders_by_symbol: Dict[str, List[dict]] = defaultdict(list)
+        for order in open_orders:
+            self._orders_by_symbol[order['symbol']].append(order)
+
+    @classmethod
+    async def capture(cls, exchange: ccxt.binanceusdm) -> "SltpSyncSnapshot":
+        raw_positions, open_orders = await asyncio.gather(exchange.fetch_positions(None), exchange.fetch_open_orders())
+        return cls(raw_positions, open_orders)
+
+    def get_position(self, symbol: str) -> Optional[dict]:
+        return self._positions_by_symbol.get(symbol)
+
+    def get_open_orders(self, symbol: str) -> List[dict]:
+        return list(self._orders_by_symbol.get(symbol, []))
+
+    def all_open_orders(self) -> List[dict]:
+        return [order for orders in self._orders_by_symbol.values() for order in orders]
+
+    def remove_orders(self, symbol: str, order_ids: Set[str]):
+        self._orders_by_symbol[symbol] = [o for o in self._orders_by_symbol.get(symbol, []) if o['id'] not in order_ids]
+
+    def add_order(self, symbol: str, order: dict):
+        self._orders_by_symbol[symbol].append(order)
+
+
+async def _get_open_orders_async(exchange: ccxt.binanceusdm, symbol: str,
+                                 snapshot: Optional[SltpSyncSnapshot]) -> List[dict]:
+    if snapshot is not None:
+        return snapshot.get_open_orders(symbol)
+    return await exchange.fetch_open_orders(symbol)
+
+
+def _order_gone(result) -> bool:
+    """撤单成功，或订单已不存在 (已触发或已被撤销)：两种情况下该挂单都不再生效。"""
+    return not isinstance(result, BaseException) or isinstance(result, ccxt.OrderNotFound)
+
+
+async def _cancel_orders_async(exchange: ccxt.binanceusdm, symbol: str, orders: List[dict],
+                               snapshot: Optional[SltpSyncSnapshot]) -> List[bool]:
+    """撤销一组挂单，按顺序返回每个挂单是否已不再生效；其他原因撤单失败的挂单可能仍然有效。"""
+    results = await asyncio.gather(*[exchange.cancel_order(o['id'], symbol) for o in orders], return_exceptions=True)
+    gone = [_order_gone(res) for res in results]
+    if snapshot is not None:
+        snapshot.remove_orders(symbol, {o['id'] for o, ok in zip(orders, gone) if ok})
+    return gone
+
+
+async def _cancel_sl_tp_orders_async(exchange: ccxt.binanceusdm, symbol: str, async_logger,
+                                     snapshot: Optional[SltpSyncSnapshot] = None):
     try:
-        open_orders = await exchange.fetch_open_orders(symbol)
+        open_orders = await _get_open_orders_async(exchange, symbol, snapshot)
         orders_to_cancel = [
             order for order in open_orders
-            if order.get('reduceOnly') and order['type'] in ['stop_market', 'stop', 'take_profit_market', 'take_profit']
+            if order.get('reduceOnly') and order['type'] in _SL_ORDER_TYPES + _TP_ORDER_TYPES
         ]
         if not orders_to_cancel:
             return True
-        tasks = [exchange.cancel_order(order['id'], symbol) for order in orders_to_cancel]
-        await asyncio.gather(*tasks, return_exceptions=True)
-        await async_logger(f"  > 为 {symbol} 清理了 {len(orders_to_cancel)} 个旧的SL/TP订单。", "info")
-        return True
+        gone = await _cancel_orders_async(exchange, symbol, orders_to_cancel, snapshot)
+        await async_logger(f"  > 为 {symbol} 清理了 {sum(gone)} 个旧的SL/TP订单。", "info")
+        if not all(gone):
+            await async_logger(f"  > ❌ {symbol} 有 {len(gone) - sum(gone)} 个旧的SL/TP订单撤销失败。", "error")
+        return all(gone)
     except Exception as e:
         await async_logger(f"  > ❌ 为 {symbol} 清理SL/TP订单时出错: {e}", "error")
         return False
 
 
+def _record_created_orders(symbol: str, results: list, snapshot: Optional[SltpSyncSnapshot]):
+    if snapshot is None:
+        return
+    for res in results:
+        if isinstance(res, dict) and res.get('id'):
+            snapshot.add_order(symbol, res)
+
+
+def _order_matches(exchange: ccxt.binanceusdm, order: dict, side: str, target_price: float, amount: str) -> bool:
+    """挂单的方向、触发价和数量 (均按交易所精度比较) 是否与目标一致。"""
+    stop_price = order.get('stopPrice') or order.get('triggerPrice')
+    if not stop_price or not order.get('amount') or order.get('side') != side:
+        return False
+    symbol = order['symbol']
+    return (float(exchange.price_to_precision(symbol, stop_price)) == target_price and
+            exchange.amount_to_precision(symbol, order['amount']) == amount)
+
+
+async def _reconcile_sl_tp_orders_async(exchange: ccxt.binanceusdm, position: Position, sl_side: str,
+                                        target_sl_price: float, target_tp_price: float, async_logger,
+                                        stop_event: asyncio.Event, report: Optional[Dict[str, Dict[str, int]]],
+                                        snapshot: Optional[SltpSyncSnapshot]) -> bool:
+    """
+    对账模式：对比现有的 SL/TP 挂单与目标，只撤销/新建不一致的部分。
+    已在目标价格和数量上的挂单保持不动 (unchanged)，不一致的撤单重下 (amended)，缺失的直接新建 (created)。
+    同类旧挂单撤销失败时不提交新单 (cancel_failed)，避免同时存在两个有效的止损/止盈。
+    """
+    full_symbol = position.full_symbol
+    open_orders = await _get_open_orders_async(exchange, full_symbol, snapshot)
+    amount = exchange.amount_to_precision(full_symbol, position.contracts)
+    counts = {'unchanged': 0, 'amended': 0, 'created': 0, 'cancel_failed': 0}
+    to_cancel, to_create = [], []
+
+    for order_type, type_group, target_price in (('STOP_MARKET', _SL_ORDER_TYPES, target_sl_price),
+                                                 ('TAKE_PROFIT_MARKET', _TP_ORDER_TYPES, target_tp_price)):
+        existing = [o for o in open_orders if o.get('reduceOnly') and o['type'] in type_group]
+        keep = next((o for o in existing if _order_matches(exchange, o, sl_side, target_price, amount)), None)
+        to_cancel.extend((order_type, o) for o in existing if o is not keep)
+        if keep:
+            counts['unchanged'] += 1
+        else:
+            to_create.append((order_type, target_price))
+
+    if report is not None:
+        report[position.symbol] = counts
+    if not to_cancel and not to_create:
+        await async_logger(f"✅ {position.symbol} 的SL/TP已在目标价格，无需改动。", "success")
+        return True
+
+    blocked = set()
+    if to_cancel:
+        gone = await _cancel_orders_async(exchange, full_symbol, [o for _, o in to_cancel], snapshot)
+        blocked = {order_type for (order_type, _), ok in zip(to_cancel, gone) if not ok}
+        counts['cancel_failed'] = len(gone) - sum(gone)
+    cancelled_types = {order_type for order_type, _ in to_cancel}
+    for order_type, _ in to_create:
+        if order_type not in blocked:
+            counts['amended' if order_type in cancelled_types else 'created'] += 1
+    to_create = [(order_type, price) for order_type, price in to_create if order_type not in blocked]
+    if blocked:
+        await async_logger(f"  > ❌ {position.symbol} 有 {counts['cancel_failed']} 个旧的SL/TP订单撤销失败，"
+                           f"对应的新订单暂不提交。", "error")
+    if stop_event.is_set(): raise InterruptedError()
+    if not to_create:
+        if blocked:
+            await async_logger(f"⚠️ {position.symbol} SL/TP未能完全设置，请检查！", "warning")
+            return False
+        await async_logger(f"✅ {position.symbol} 已清理 {len(to_cancel)} 个重复的SL/TP订单。", "success")
+        return True
+
+    await async_logger(
+        f"  > {position.symbol} SL/TP对账: 未变 {counts['unchanged']}, 修改 {counts['amended']}, 新建 {counts['created']}")
+    batcher = get_order_batcher(exchange)
+    results = await asyncio.gather(*[
+        batcher.create_order(full_symbol, order_type, sl_side, position.contracts, None,
+                             {'stopPrice': price, 'reduceOnly': True})
+        for order_type, price in to_create
+    ], return_exceptions=True)
+
+    _record_created_orders(full_symbol, results, snapshot)
+    failed = [res for res in results if not (isinstance(res, dict) and res.get('id'))]
+    for res in failed:
+        await async_logger(f"  > ❌ {position.symbol} 订单提交失败: {res}", "error")
+    if failed or blocked:
+        await async_logger(f"⚠️ {position.symbol} SL/TP未能完全设置，请检查！", "warning")
+    else:
+        await async_logger(f"✅ {position.symbol} 止盈和止损均已校准！", "success")
+    return not failed and not blocked
+
+
 async def set_tp_sl_for_position_async(exchange: ccxt.binanceusdm, position: Position, config: dict, async_logger,
-                                       stop_event: asyncio.Event) -> bool:
+                                       stop_event: asyncio.Event,
+                                       report: Optional[Dict[str, Dict[str, int]]] = None,
+                                       snapshot: Optional[SltpSyncSnapshot] = None) -> bool:
     full_symbol = position.full_symbol
     if stop_event.is_set(): raise InterruptedError()
 
     try:
-        # --- 核心修改：换回使用 fetch_positions (复数)，这是经过验证的正确方法 ---
-        live_positions_raw = await exchange.fetch_positions([full_symbol])
-        live_pos = next(
-            (p for p in live_positions_raw if p['symbol'] == full_symbol and float(p.get('contracts', 0)) != 0), None)
+        if snapshot is not None:
+            live_pos = snapshot.get_position(full_symbol)
+        else:
+            # --- 核心修改：换回使用 fetch_positions (复数)，这是经过验证的正确方法 ---
+            live_positions_raw = await exchange.fetch_positions([full_symbol])
+            live_pos = next(
+                (p for p in live_positions_raw if p['symbol'] == full_symbol and float(p.get('contracts', 0)) != 0),
+                None)
+            # --- 修改结束 ---
 
         if not live_pos:
             await async_logger(f"⚠️ 为 {position.symbol} 校准前检查发现仓位已不存在，将仅执行清理操作。", "warning")
-            await _cancel_sl_tp_orders_async(exchange, full_symbol, async_logger)
+            await _cancel_sl_tp_orders_async(exchange, full_symbol, async_logger, snapshot)
             return True  # 视为成功
-        # --- 修改结束 ---
 
         is_long = position.side == i18n.SIDE_LONG
 
@@ -52,7 +212,7 @@ async def set_tp_sl_for_position_async(exchange: ccxt.binanceusdm, position: Pos
         if (is_long and not config.get('enable_long_sl_tp', False)) or (
                 not is_long and not config.get('enable_short_sl_tp', False)) or sl_perc <= 0 or tp_perc <= 0:
             await async_logger(f"{position.symbol} 的SL/TP已禁用或参数无效，将清理现有挂单。", "info")
-            return await _cancel_sl_tp_orders_async(exchange, full_symbol, async_logger)
+            return await _cancel_sl_tp_orders_async(exchange, full_symbol, async_logger, snapshot)
 
         leverage = config.get('leverage', 1)
         sl_ratio = float(sl_perc) / 100 / leverage
@@ -63,20 +223,32 @@ async def set_tp_sl_for_position_async(exchange: ccxt.binanceusdm, position: Pos
         target_tp_price = float(
             exchange.price_to_precision(full_symbol, entry_price * (1 + (tp_ratio if is_long else -tp_ratio))))
 
-        await _cancel_sl_tp_orders_async(exchange, full_symbol, async_logger)
+        sl_side = i18n.ORDER_SIDE_SELL if is_long else i18n.ORDER_SIDE_BUY
+        # 请求中未指定时 (开仓流程、界面同步) 使用设置中的模式
+        sync_mode = config.get('sltp_sync_mode') or load_settings().get('sltp_sync_mode', 'reconcile')
+        if sync_mode == 'reconcile':
+            return await _reconcile_sl_tp_orders_async(exchange, position, sl_side, target_sl_price, target_tp_price,
+                                                       async_logger, stop_event, report, snapshot)
+
+        # replace 模式：撤销全部旧的 SL/TP 后重新提交；有旧单撤销失败时不重下，避免重复的止损/止盈
+        if not await _cancel_sl_tp_orders_async(exchange, full_symbol, async_logger, snapshot):
+            await async_logger(f"⚠️ {position.symbol} 旧的SL/TP未能全部撤销，未提交新订单，请检查！", "warning")
+            return False
         if stop_event.is_set(): raise InterruptedError()
 
-        sl_side = i18n.ORDER_SIDE_SELL if is_long else i18n.ORDER_SIDE_BUY
         sl_params = {'stopPrice': target_sl_price, 'reduceOnly': True}
         tp_params = {'stopPrice': target_tp_price, 'reduceOnly': True}
 
         await async_logger(
             f"  > 正在为 {position.symbol} 提交新的 SL ({target_sl_price}) / TP ({target_tp_price}) 订单...")
 
-        sl_task = exchange.create_order(full_symbol, 'STOP_MARKET', sl_side, position.contracts, None, sl_params)
-        tp_task = exchange.create_order(full_symbol, 'TAKE_PROFIT_MARKET', sl_side, position.contracts, None, tp_params)
+        # SL/TP 通过批量下单器提交，并发同步多个仓位时会合并为 batchOrders 请求
+        batcher = get_order_batcher(exchange)
+        sl_task = batcher.create_order(full_symbol, 'STOP_MARKET', sl_side, position.contracts, None, sl_params)
+        tp_task = batcher.create_order(full_symbol, 'TAKE_PROFIT_MARKET', sl_side, position.contracts, None, tp_params)
 
         results = await asyncio.gather(sl_task, tp_task, return_exceptions=True)
+        _record_created_orders(full_symbol, results, snapshot)
 
         success_count = sum(1 for res in results if isinstance(res, dict) and res.get('id'))
 
@@ -104,10 +276,11 @@ async def set_tp_sl_for_position_async(exchange: ccxt.binanceusdm, position: Pos
         return False
 
 
-async def cleanup_orphan_sltp_orders_async(exchange: ccxt.binanceusdm, active_symbols: Set[str], async_logger):
+async def cleanup_orphan_sltp_orders_async(exchange: ccxt.binanceusdm, active_symbols: Set[str], async_logger,
+                                           snapshot: Optional[SltpSyncSnapshot] = None):
     await async_logger("开始全局清理无主(孤儿)SL/TP订单...", "info")
     try:
-        all_open_orders = await exchange.fetch_open_orders()
+        all_open_orders = snapshot.all_open_orders() if snapshot is not None else await exchange.fetch_open_orders()
         orphan_orders = [
             order for order in all_open_orders
             if order.get('reduceOnly') and order['symbol'] not in active_symbols
@@ -118,5 +291,8 @@ async def cleanup_orphan_sltp_orders_async(exchange: ccxt.binanceusdm, active_sy
         await async_logger(f"发现 {len(orphan_orders)} 个无主订单，正在取消...", "warning")
         tasks = [exchange.cancel_order(order['id'], order['symbol']) for order in orphan_orders]
         await asyncio.gather(*tasks, return_exceptions=True)
+        if snapshot is not None:
+            for order in orphan_orders:
+                snapshot.remove_orders(order['symbol'], {order['id']})
     except Exception as e:
         await async_logger(f"!!! 清理无主订单时发生错误: {e}", "error")
\ No newline at end of file
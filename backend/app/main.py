@@ -1,4 +1,5 @@
 # backend/app/main.py (优化心跳后的完整代码)
+import asyncio
 import os
 from pathlib import Path
 import json
@@ -7,8 +8,17 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, status
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from .api import positions, trading, rebalance, settings, status
+from .api import positions, trading, rebalance, settings, status, metrics, traces
+from .core.exchange_manager import exchange_pool
+from .core.market_stream import market_data_stream
+from .core.position_sync import position_reconciler
+from .core.screening_scheduler import screening_scheduler
+from .core.task_journal import task_journal
+from .core.trading_service import trading_service
+from .core.user_stream import user_data_stream
 from .core.websocket_manager import manager, log_message
+from .config.config import is_simulated_exchange, load_settings
+from .logic import screening_sweep
 from .core.security import APP_ACCESS_KEY
 
 app = FastAPI(title="Trading API")
@@ -32,6 +42,8 @@ app.include_router(positions.router)
 app.include_router(trading.router)
 app.include_router(rebalance.router)
 app.include_router(status.router)
+app.include_router(metrics.router)
+app.include_router(traces.router)
 
 
 @app.websocket("/ws")
@@ -44,7 +56,8 @@ async def websocket_endpoint(websocket: WebSocket):
                 # REFACTOR: 增加心跳响应逻辑
                 message = json.loads(data)
                 if isinstance(message, dict) and message.get('type') == 'ping':
-                    await websocket.send_text('{"type":"pong"}')
+                    # 经由该连接的发送队列回应，不与广播的写协程并发写同一个连接
+                    manager.send_to(websocket, {"type": "pong"})
             except json.JSONDecodeError:
                 # 忽略无法解析的或非json格式的消息
                 pass
@@ -84,6 +97,19 @@ else:
 
 @app.on_event("startup")
 async def startup_event():
+    task_journal.start()
+    await exchange_pool.start()
+    asyncio.create_task(exchange_pool.warm_up())
+    if is_simulated_exchange(load_settings()):
+        # 模拟交易所没有 WebSocket 数据流，订单状态和行情都走 REST
+        print("--- [INFO] 使用离线模拟交易所，跳过用户数据流和行情推送。 ---")
+    else:
+        await user_data_stream.start()
+        await market_data_stream.start()
+    await position_reconciler.start()
+    await screening_scheduler.start()
+    # 交易所连接和订单推送就绪后，与交易所对账并继续上次未完成的任务
+    asyncio.create_task(trading_service.resume_journaled_tasks())
     print("---" * 20)
     print("✅ Application startup complete.")
     print(f"🔑 Your APP_ACCESS_KEY is: {APP_ACCESS_KEY}")
@@ -92,4 +118,10 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    pass
\ No newline at end of file
+    await user_data_stream.stop()
+    await market_data_stream.stop()
+    await position_reconciler.stop()
+    await screening_scheduler.stop()
+    screening_sweep.shutdown_pool()
+    await exchange_pool.close()
+    await task_journal.stop()
\ No newline at end of file
@@ -61,6 +61,7 @@ class TradePlanRequest(BaseTaskRequest):
     short_take_profit_percentage: float
     rebalance_volume_ma_days: int
     rebalance_volume_spike_ratio: float
+    rebalance_benchmark: str = "BTC"
 
 
 class SyncSltpRequest(BaseTaskRequest):
@@ -71,6 +72,8 @@ class SyncSltpRequest(BaseTaskRequest):
     short_stop_loss_percentage: float
     short_take_profit_percentage: float
     leverage: int
+    # reconcile: 只改动与目标不一致的挂单; replace: 全部撤销后重下; 不传则使用设置中的 sltp_sync_mode
+    sltp_sync_mode: Optional[str] = None
 
 class ClosePositionRequest(BaseTaskRequest):
     full_symbol: str
@@ -103,9 +106,35 @@ class RebalanceCriteria(BaseModel):
     foam_days: int = 1
     rebalance_volume_ma_days: int = 20
     rebalance_volume_spike_ratio: float = 3.0
+    benchmark: str = "BTC"  # 相对强度基准：单个币种或逗号分隔的等权篮子，如 "BTC,ETH"
+
+class SweepRequest(BaseModel):
+    base: RebalanceCriteria = RebalanceCriteria()
+    # 参数名 -> 取值列表，例如 {"abs_momentum_days": [14, 30], "top_n": [20, 50]}，在 base 上展开笛卡尔积
+    grid: Dict[str, List[Any]] = {}
+
+
+class SweepResponse(BaseModel):
+    results: List[Dict[str, Any]]
+    coin_frequency: Dict[str, int]
+    combinations: int
+    workers: int
+    elapsed_seconds: float
+    data_as_of: Optional[float] = None
+
 
 class RebalancePlanResponse(BaseModel):
     target_ratio_perc: float
     positions_to_close: List[Dict[str, Any]]
     positions_to_open: List[Dict[str, Any]]
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    # 筛选所用数据的新鲜度
+    screening_source: Optional[str] = None  # precomputed: 后台预计算; snapshot: 用现有快照即时排名
+    screened_at: Optional[float] = None
+    data_as_of: Optional[float] = None
+    data_age_seconds: Optional[float] = None
+    last_candle_time: Optional[int] = None
+    # 后台预计算最近一次失败的原因、时间和下一次重试时间 (刷新成功后为空)
+    refresh_error: Optional[str] = None
+    refresh_failed_at: Optional[float] = None
+    next_retry_at: Optional[float] = None
\ No newline at end of file
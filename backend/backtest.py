@@ -0,0 +1,152 @@
+# backend/backtest.py
+"""
+再平衡策略回测命令行工具，使用本地 K 线仓库 (cache/klines) 中的日线：
+
+    python backtest.py --days 365 --top-n 20 50 --abs-momentum-days 14 30 --workers 4 --output result.json
+
+多个取值的参数展开为笛卡尔积，各组回测在进程池中并行执行。
+本地历史不足时加 --download，用设置中的 API Key 从交易所补齐 (经由 K 线仓库，下次直接使用本地数据)。
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+# 将 backend 目录添加到 Python 的模块搜索路径中
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.config import config as app_config
+from app.config.config import get_cache_dir, load_settings
+from app.logic.backtest import DEFAULT_BACKTEST_PARAMS, KlineHistory, run_backtests
+from app.logic.screening_pipeline import days_to_fetch, parse_benchmark
+
+_DAY_MS = 24 * 3600 * 1000
+
+# 命令行参数 -> 筛选条件字段
+_CRITERIA_ARGS = {
+    'method': 'method', 'top_n': 'top_n', 'min_volume_usd': 'min_volume_usd',
+    'abs_momentum_days': 'abs_momentum_days', 'rel_strength_days': 'rel_strength_days', 'foam_days': 'foam_days',
+    'volume_ma_days': 'rebalance_volume_ma_days', 'volume_spike_ratio': 'rebalance_volume_spike_ratio',
+    'benchmark': 'benchmark',
+}
+# 命令行参数 -> 回测参数
+_PARAM_ARGS = ('initial_capital', 'short_exposure', 'rebalance_every_days', 'min_trade_value', 'fee_rate',
+               'funding_rate_daily')
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="再平衡策略回测 (筛选条件与回测参数均可给出多个取值)")
+    parser.add_argument('--symbols', nargs='+', help="参与筛选的币种，默认为设置中的做空列表")
+    parser.add_argument('--days', type=int, default=365, help="回测最近多少天")
+    parser.add_argument('--scope', choices=['mainnet', 'testnet'], help="K线仓库的范围，默认跟随设置中的 use_testnet")
+    parser.add_argument('--download', action='store_true', help="先从交易所补齐本地 K 线仓库")
+    parser.add_argument('--workers', type=int, default=0, help="并行进程数，0 表示使用全部 CPU 核心")
+    parser.add_argument('--output', type=Path, help="把完整结果 (含权益曲线) 写入 JSON 文件")
+
+    parser.add_argument('--method', nargs='+', choices=['multi_factor_weakest', 'foam'])
+    parser.add_argument('--top-n', nargs='+', type=int)
+    parser.add_argument('--min-volume-usd', nargs='+', type=float)
+    parser.add_argument('--abs-momentum-days', nargs='+', type=int)
+    parser.add_argument('--rel-strength-days', nargs='+', type=int)
+    parser.add_argument('--foam-days', nargs='+', type=int)
+    parser.add_argument('--volume-ma-days', nargs='+', type=int)
+    parser.add_argument('--volume-spike-ratio', nargs='+', type=float)
+    parser.add_argument('--benchmark', nargs='+', help='相对强度基准，如 BTC 或 "BTC,ETH"')
+
+    for name in _PARAM_ARGS:
+        value_type = int if name == 'rebalance_every_days' else float
+        parser.add_argument(f"--{name.replace('_', '-')}", nargs='+', type=value_type,
+                            help=f"默认 {DEFAULT_BACKTEST_PARAMS[name]}")
+    return parser.parse_args()
+
+
+def _expand_runs(args: argparse.Namespace, base_criteria: dict):
+    """把多个取值的参数展开为 (筛选条件, 回测参数) 的列表，同时返回取值不止一个的参数名用于输出。"""
+    options = {}
+    for arg, field in _CRITERIA_ARGS.items():
+        options[('criteria', field)] = getattr(args, arg) or [base_criteria[field]]
+    for name in _PARAM_ARGS:
+        options[('params', name)] = getattr(args, name) or [DEFAULT_BACKTEST_PARAMS[name]]
+    keys = list(options)
+    runs = []
+    for values in itertools.product(*(options[k] for k in keys)):
+        criteria, params = dict(base_criteria), {}
+        for (section, field), value in zip(keys, values):
+            (criteria if section == 'criteria' else params)[field] = value
+        runs.append((criteria, params))
+    varying = [field for (section, field) in keys if len(options[(section, field)]) > 1]
+    return runs, varying
+
+
+async def _download(symbols, since_ms: int, settings: dict):
+    from app.logic.exchange_logic_async import initialize_exchange_async
+    from app.logic.kline_store import kline_store
+    from app.logic.utils import resolve_full_symbol
+
+    exchange = await initialize_exchange_async(settings.get('api_key'), settings.get('api_secret'),
+                                               settings.get('use_testnet', False), settings.get('enable_proxy', False),
+                                               settings.get('proxy_url', ''))
+    try:
+        for base in symbols:
+            full_symbol = resolve_full_symbol(exchange, base)
+            if not full_symbol:
+                print(f"--- [WARNING] 在交易所中找不到 {base} 的交易对，跳过。 ---")
+                continue
+            klines = await kline_store.fetch(exchange, full_symbol, '1d', since_ms)
+            print(f"--- [INFO] {full_symbol}: 本地共 {klines.shape[1]} 根日线 ---")
+    finally:
+        await exchange.close()
+
+
+def main():
+    args = _parse_args()
+    settings = load_settings()
+    from app.core.screening_scheduler import criteria_from_settings
+    runs, varying = _expand_runs(args, criteria_from_settings(settings).model_dump())
+
+    universe = [s.upper() for s in (args.symbols or settings.get('short_coin_list', []))]
+    if not universe:
+        sys.exit("做空列表为空，请用 --symbols 指定回测的币种。")
+    members = {m for criteria, _ in runs if criteria['method'] == 'multi_factor_weakest'
+               for m in parse_benchmark(criteria['benchmark'])}
+    scope = args.scope or ('testnet' if settings.get('use_testnet') else 'mainnet')
+    warm_up = max(days_to_fetch(criteria) for criteria, _ in runs) + 2
+
+    if args.download:
+        since_ms = int(time.time() * 1000) - (args.days + warm_up) * _DAY_MS
+        asyncio.run(_download(list(dict.fromkeys(universe + sorted(members))), since_ms, settings))
+
+    history = KlineHistory.from_store(universe + sorted(members), scope)
+    if not len(history.timestamps):
+        sys.exit("本地 K 线仓库中没有这些币种的日线，请先使用 --download 下载。")
+    start_ms = float(history.timestamps[-1]) - args.days * _DAY_MS
+    for _, params in runs:
+        params['start_ms'] = start_ms
+    print(f"--- [INFO] {len(universe)} 个币种，{len(history.timestamps)} 天历史，{len(runs)} 组回测 ---")
+
+    started = time.perf_counter()
+    results = run_backtests(history, runs, app_config.AVAILABLE_LONG_COINS, universe,
+                            get_cache_dir(settings, 'kline_cache_dir') / 'backtest', args.workers or None)
+    elapsed = time.perf_counter() - started
+
+    for result in results:
+        label = ", ".join(f"{k}={result['criteria'].get(k, result['params'].get(k))}" for k in varying) or "默认参数"
+        if 'error' in result:
+            print(f"{label}: 失败 - {result['error']}")
+            continue
+        s = result['summary']
+        print(f"{label}: 收益 {s['total_return']:+.2%}, 年化 {s['annualized_return'] or 0:+.2%}, "
+              f"夏普 {s['sharpe'] or 0:.2f}, 最大回撤 {s['max_drawdown']:.2%}, 日均换手 {s['avg_daily_turnover']:.2%}, "
+              f"手续费 {s['total_fees']:,.2f}, 资金费 {s['total_funding']:,.2f}")
+    print(f"--- [INFO] 回测完成，用时 {elapsed:.2f} 秒 ---")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'elapsed_seconds': round(elapsed, 3)}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# backend/benchmarks/__init__.py
+"""
+热点路径的基准测试套件，全部离线运行，输入数据由固定随机种子生成：
+
+    python -m benchmarks                      # 运行全部用例
+    python -m benchmarks --filter screening   # 只运行名称包含 screening 的用例
+    python -m benchmarks --output bench.json --compare baseline.json
+
+结果以稳定的键顺序写入 JSON，可在不同提交之间对比耗时，发现性能回退。
+
+修改筛选引擎后运行 `python -m benchmarks.parity`，用随机用例校验向量化结果与逐币种参考实现一致。
+"""
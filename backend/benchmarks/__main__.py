@@ -0,0 +1,63 @@
+# backend/benchmarks/__main__.py
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# 将 backend 目录添加到 Python 的模块搜索路径中
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import cases  # noqa: F401  注册全部用例
+from benchmarks.harness import SCHEMA_VERSION, compare, environment, registered_cases, result_key, run_cases
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="运行热点路径的基准测试")
+    parser.add_argument('--filter', help="只运行名称包含该字符串的用例")
+    parser.add_argument('--list', action='store_true', help="列出全部用例后退出")
+    parser.add_argument('--quick', action='store_true', help="减少重复次数，用于快速检查")
+    parser.add_argument('--repeat', type=int, help="覆盖每个用例的重复次数")
+    parser.add_argument('--output', type=Path, help="把结果写入 JSON 文件")
+    parser.add_argument('--compare', type=Path, help="与之前保存的结果对比最快耗时")
+    parser.add_argument('--threshold', type=float, default=0.2, help="最快耗时增加超过该比例视为回退 (默认 0.2)")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    selected = registered_cases(args.filter)
+    if args.list:
+        for case in selected:
+            print(f"{case.name}: {len(case.params)} 组参数, 重复 {case.repeat} 次")
+        return
+    if not selected:
+        sys.exit(f"没有名称包含 '{args.filter}' 的基准用例。")
+
+    def progress(entry):
+        throughput = f", {entry['items_per_second']:,.0f} 条/秒" if entry.get('items_per_second') else ""
+        print(f"{result_key(entry)}: 中位 {entry['median_ms']:.3f} ms, 最快 {entry['min_ms']:.3f} ms{throughput}")
+
+    results = run_cases(selected, repeat=args.repeat, quick=args.quick, progress=progress)
+    report = {'schema': SCHEMA_VERSION, 'environment': environment(), 'results': results}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold)
+        print(f"\n--- 与 {args.compare} 对比 (基线提交 {baseline.get('environment', {}).get('git_commit')}) ---")
+        for row in rows:
+            flag = " <- 回退" if row['regression'] else ""
+            changed = " (结果已变化)" if row['result_changed'] else ""
+            print(f"{row['key']}: {row['baseline_ms']:.3f} -> {row['current_ms']:.3f} ms "
+                  f"(x{row['ratio']:.2f}){flag}{changed}")
+        if any(row['regression'] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
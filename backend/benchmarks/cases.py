@@ -0,0 +1,263 @@
+# backend/benchmarks/cases.py
+"""各热点路径的基准用例。交易所、WebSocket 客户端均为进程内的替身，延迟按固定种子生成，不访问网络。"""
+import asyncio
+import itertools
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.adaptive_concurrency import AdaptiveConcurrencyLimiter
+from app.core.task_registry import ManagedTask
+from app.core.trading_service import TradingService
+from app.core.work_scheduler import WorkClass
+from app.core.websocket_manager import WebSocketManager
+from app.logic.exchange_logic_async import fetch_positions_with_pnl_async
+from app.logic.market_data import market_data_cache
+from app.logic.plan_calculator import calculate_trade_plan
+from app.logic.rebalance_logic import screen_coins_advanced, screen_coins_reference
+from app.logic.screening_engine import screen_coin_arrays
+from app.models.schemas import RebalanceCriteria
+
+from .harness import benchmark
+
+_SEED = 20240101
+_DAY_MS = 24 * 3600 * 1000
+_START_MS = 1_700_006_400_000  # 固定的起始日 (UTC 零点)，保证生成的 K 线与运行日期无关
+
+
+# --- 交易所替身 ---
+class LatencyExchange:
+    """下单、查单各等待一次注入的延迟 (按种子生成的固定序列循环使用)，订单立即成交。"""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, seed: int = _SEED):
+        rng = np.random.default_rng(seed)
+        delays = np.clip(rng.normal(latency_ms, jitter_ms, 1024), 0.0, None) / 1000.0
+        self._delays = itertools.cycle(delays.tolist())
+        self._order_ids = itertools.count(1)
+        self.calls = 0
+
+    async def _round_trip(self):
+        self.calls += 1
+        await asyncio.sleep(next(self._delays))
+
+    async def create_order(self, symbol: str, order_type: str, side: str, amount: float, price: float):
+        await self._round_trip()
+        return {'id': str(next(self._order_ids)), 'symbol': symbol, 'status': 'open', 'amount': amount}
+
+    async def fetch_order(self, order_id: str, symbol: str):
+        await self._round_trip()
+        return {'id': order_id, 'symbol': symbol, 'status': 'closed'}
+
+
+class PositionsExchange:
+    """fetch_positions / fetch_tickers 直接返回预先生成的 ccxt 结构，只衡量持仓的后处理。"""
+
+    def __init__(self, raw_positions: List[Dict[str, Any]], tickers: Dict[str, Dict[str, Any]]):
+        self.apiKey = 'benchmark'
+        self.markets = {p['symbol']: {'id': p['symbol'].split('/')[0] + 'USDT', 'symbol': p['symbol']}
+                        for p in raw_positions}
+        self._raw_positions = raw_positions
+        self._tickers = tickers
+
+    def market(self, symbol: str) -> Dict[str, Any]:
+        return self.markets[symbol]
+
+    async def fetch_positions(self, symbols=None):
+        return self._raw_positions
+
+    async def fetch_tickers(self, symbols):
+        return {s: self._tickers[s] for s in symbols}
+
+
+class NullWebSocket:
+    """只统计收到的字节数的 WebSocket 替身。"""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.bytes_sent += len(text)
+
+
+class StalledWebSocket(NullWebSocket):
+    """发送永远不返回的 WebSocket 替身 (卡住的浏览器标签页)。"""
+
+    async def send_text(self, text: str):
+        await asyncio.Event().wait()
+
+
+# --- 合成数据 ---
+def _symbols(count: int) -> List[str]:
+    return [f"C{i:04d}" for i in range(count)]
+
+
+def _synthetic_klines(rng: np.random.Generator, sigma: np.ndarray, days: int) -> np.ndarray:
+    """几何随机游走生成的日线，形状 (币种数, days, 6)，列顺序与币安 K 线一致。"""
+    timestamps = _START_MS + np.arange(days) * _DAY_MS
+    returns = rng.normal(0.0, 1.0, (len(sigma), days)) * sigma[:, None]
+    closes = np.exp(np.cumsum(returns, axis=1)) * rng.uniform(0.01, 100.0, (len(sigma), 1))
+    opens = np.concatenate([closes[:, :1], closes[:, :-1]], axis=1)
+    highs = np.maximum(opens, closes) * (1 + rng.uniform(0, 0.03, closes.shape))
+    lows = np.minimum(opens, closes) * (1 - rng.uniform(0, 0.03, closes.shape))
+    volumes = rng.lognormal(13.0, 1.0, closes.shape)
+    # 约 5% 的币种在最后一天放量，触发成交量过滤
+    spikes = rng.random(len(sigma)) < 0.05
+    volumes[spikes, -1] *= 10
+    return np.stack([np.broadcast_to(timestamps, closes.shape), opens, highs, lows, closes, volumes], axis=2)
+
+
+def synthetic_coin_data(coins: int, days: int, seed: int = _SEED) -> List[Dict[str, Any]]:
+    """screen_coins_advanced 的输入：每个币种的 USDT 日线和相对 BTC 的日线 (币安 K 线列表格式)。"""
+    rng = np.random.default_rng(seed)
+    sigma = rng.uniform(0.02, 0.08, coins)
+    usdt, relative = _synthetic_klines(rng, sigma, days), _synthetic_klines(rng, sigma * 0.8, days)
+    return [{'symbol': symbol, 'usdt_klines': usdt[i].tolist(), 'btc_klines': relative[i].tolist()}
+            for i, symbol in enumerate(_symbols(coins))]
+
+
+def synthetic_kline_arrays(coins: int, days: int, seed: int = _SEED) -> Tuple[List[np.ndarray], np.ndarray]:
+    """screen_coin_arrays 的输入：kline_store 格式的 (6, n) 数组，以及作为相对强度基准的 BTC 日线。"""
+    rng = np.random.default_rng(seed)
+    klines = _synthetic_klines(rng, rng.uniform(0.02, 0.08, coins), days)
+    benchmark_klines = _synthetic_klines(rng, np.array([0.03]), days)[0]
+    return [np.ascontiguousarray(k.T) for k in klines], np.ascontiguousarray(benchmark_klines.T)
+
+
+def synthetic_positions(count: int, seed: int = _SEED):
+    rng = np.random.default_rng(seed)
+    raw_positions, tickers = [], {}
+    for base in _symbols(count):
+        symbol = f"{base}/USDT:USDT"
+        entry = float(rng.uniform(0.01, 100.0))
+        amount = float(rng.uniform(1, 1000)) * (1 if rng.random() < 0.5 else -1)
+        raw_positions.append({
+            'symbol': symbol, 'side': 'long' if amount > 0 else 'short', 'contracts': abs(amount),
+            'entryPrice': entry, 'leverage': 10, 'initialMargin': abs(amount) * entry / 10,
+            'info': {'positionAmt': str(amount), 'breakEvenPrice': str(entry * 1.0004), 'positionSide': 'BOTH'},
+        })
+        tickers[symbol] = {'symbol': symbol, 'mark': entry * float(rng.uniform(0.9, 1.1))}
+    return raw_positions, tickers
+
+
+# --- 用例 ---
+@benchmark('trading.run_task_loop',
+           params=[{'items': 50, 'concurrency': 5}, {'items': 200, 'concurrency': 5},
+                   {'items': 200, 'concurrency': 10}],
+           repeat=5, items=lambda items, concurrency: items,
+           info=lambda items, concurrency: {'ideal_ms': -(-items // concurrency) * 2 * 2.0})
+def bench_run_task_loop(items: int, concurrency: int):
+    """每个子任务下单再查单 (两次 2ms±0.5ms 的往返)，衡量任务循环在注入延迟下的吞吐量。"""
+    service = TradingService()
+    exchange = LatencyExchange(latency_ms=2.0, jitter_ms=0.5)
+    plan = [{'coin': symbol, 'value': 100.0, 'side': 'sell'} for symbol in _symbols(items)]
+
+    async def worker(plan_item):
+        order = await exchange.create_order(f"{plan_item['coin']}/USDT:USDT", 'limit', plan_item['side'], 1.0, 1.0)
+        order = await exchange.fetch_order(order['id'], order['symbol'])
+        return order['status'] == 'closed'
+
+    async def run():
+        # 子项互不相同的币种，币种锁无争用 (计入的是加锁本身的开销)；固定并发，与引入自适应并发之前的结果可比
+        await service._run_task_loop(ManagedTask("基准测试", None), plan, worker,
+                                     AdaptiveConcurrencyLimiter.fixed("基准测试", concurrency), "基准测试",
+                                     symbol_of=lambda plan_item: plan_item['coin'],
+                                     work_class_of=lambda plan_item: WorkClass.OPEN)
+    return run
+
+
+_SCREENING_CRITERIA = RebalanceCriteria(top_n=50, min_volume_usd=0).model_dump()
+_SCREENING_DAYS = _SCREENING_CRITERIA['rel_strength_days'] + 5
+
+
+@benchmark('screening.screen_coins_advanced', params=[{'coins': 50}, {'coins': 300}, {'coins': 1000}],
+           repeat=20, items=lambda coins: coins)
+def bench_screen_coins_advanced(coins: int):
+    coin_data = synthetic_coin_data(coins, _SCREENING_DAYS)
+    return lambda: screen_coins_advanced(coin_data, _SCREENING_CRITERIA, ['C0000'])
+
+
+@benchmark('screening.screen_coins_reference', params=[{'coins': 50}, {'coins': 300}, {'coins': 1000}],
+           repeat=5, items=lambda coins: coins)
+def bench_screen_coins_reference(coins: int):
+    """逐币种的参考实现，作为向量化引擎的对照。"""
+    coin_data = synthetic_coin_data(coins, _SCREENING_DAYS)
+    return lambda: screen_coins_reference(coin_data, _SCREENING_CRITERIA, ['C0000'])
+
+
+@benchmark('screening.screen_coin_arrays',
+           params=[{'coins': 50}, {'coins': 300}, {'coins': 1000}, {'coins': 300, 'days': 365}],
+           repeat=20, items=lambda coins, days=_SCREENING_DAYS: coins)
+def bench_screen_coin_arrays(coins: int, days: int = _SCREENING_DAYS):
+    """
+    筛选流水线实际使用的入口：K 线已是列式数组，相对强度由基准日线即时合成。
+    days=365 对应 K 线仓库中保存了一整年日线的情形，相对强度只对齐最后需要的若干根。
+    """
+    klines_list, benchmark_klines = synthetic_kline_arrays(coins, days)
+    symbols = _symbols(coins)
+    return lambda: screen_coin_arrays(symbols, klines_list, benchmark_klines, _SCREENING_CRITERIA, ['C0000'],
+                                      verbose=False)
+
+
+@benchmark('positions.fetch_positions_with_pnl',
+           params=[{'positions': n, 'marks': marks} for n in (10, 100, 500) for marks in ('rest', 'stream')],
+           repeat=20, items=lambda positions, marks: positions)
+def bench_fetch_positions_with_pnl(positions: int, marks: str):
+    """marks=rest 时标记价格来自 fetch_tickers，marks=stream 时全部命中行情推送缓存。"""
+    raw_positions, tickers = synthetic_positions(positions)
+    exchange = PositionsExchange(raw_positions, tickers)
+
+    market_data_cache._marks.clear()
+    if marks == 'stream':
+        # 一个用例的计时远短于 MARK_PRICE_MAX_AGE，推送缓存在整个计时期间保持有效
+        for symbol, ticker in tickers.items():
+            market_data_cache.handle_event(
+                {'e': 'markPriceUpdate', 's': exchange.market(symbol)['id'], 'p': ticker['mark']})
+    return lambda: fetch_positions_with_pnl_async(exchange, 10)
+
+
+@benchmark('websocket.broadcast',
+           params=[{'clients': n, 'stalled': 0} for n in (1, 10, 50, 200)] + [{'clients': 50, 'stalled': 1}],
+           repeat=20, items=lambda clients, stalled: clients * 100)
+async def bench_broadcast(clients: int, stalled: int):
+    """
+    每次向所有客户端广播 100 条进度消息并等待正常客户端收完 (含连接登记和断开)。
+    每条消息属于不同任务，不会在队列中合并；stalled 个客户端的发送永远不返回，不应拖慢其他客户端。
+    """
+    async def run():
+        manager = WebSocketManager()
+        sockets = [NullWebSocket() for _ in range(clients)]
+        connections = [manager.add(socket) for socket in sockets]
+        for _ in range(stalled):
+            manager.add(StalledWebSocket())
+        for i in range(100):
+            manager.publish({"type": "progress_update", "payload": {
+                "success_count": i, "failed_count": 0, "total": 100, "task_name": f"基准测试: {i}/100",
+                "is_final": False, "task_id": f"task-{i}"}})
+        await asyncio.gather(*(connection.drain() for connection in connections))
+        for socket in manager.active_connections:
+            manager.disconnect(socket)
+        await asyncio.sleep(0)  # 让被取消的写协程结束
+        return sum(socket.bytes_sent for socket in sockets)
+    return run
+
+
+def _plan_config(coins: int) -> Dict[str, Any]:
+    symbols = _symbols(coins)
+    return {
+        'enable_long_trades': True, 'enable_short_trades': True,
+        'total_long_position_value': 10000.0, 'total_short_position_value': 5000.0,
+        'long_coin_list': ['BTC', 'ETH'] + symbols[:coins // 2], 'short_coin_list': symbols[coins // 2:],
+    }
+
+
+@benchmark('plan.calculate_trade_plan',
+           params=[{'coins': 10, 'custom_weights': False}, {'coins': 200, 'custom_weights': False},
+                   {'coins': 200, 'custom_weights': True}],
+           repeat=20, number=200, items=lambda coins, custom_weights: coins)
+def bench_calculate_trade_plan(coins: int, custom_weights: bool):
+    config = _plan_config(coins)
+    weights = {coin: 1.0 + i % 5 for i, coin in enumerate(config['long_coin_list'][::2])} if custom_weights else {}
+    return lambda: calculate_trade_plan(config, weights)
@@ -0,0 +1,176 @@
+# backend/benchmarks/harness.py
+import asyncio
+import contextlib
+import gc
+import hashlib
+import inspect
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# 输出格式的版本号，字段含义变化时递增，对比时拒绝不同版本的结果
+SCHEMA_VERSION = 1
+
+
+@dataclass
+class Case:
+    """
+    一个基准用例：setup(**params) 准备输入并返回被计时的可调用对象 (返回值可以是协程，在用例的事件循环中等待)，
+    setup 本身也可以是协程函数，此时在用例的事件循环中执行。
+    """
+    name: str
+    setup: Callable[..., Any]
+    params: List[Dict[str, Any]]
+    repeat: int = 20
+    number: int = 1  # 每次计时内调用的次数，结果按单次调用折算
+    items: Optional[Callable[..., int]] = None  # 单次调用处理的条目数，用于计算吞吐量
+    info: Optional[Callable[..., Dict[str, Any]]] = None  # 附加到结果中的说明性数据 (如理论耗时)
+
+
+_REGISTRY: Dict[str, Case] = {}
+
+
+def benchmark(name: str, params: List[Dict[str, Any]], repeat: int = 20, number: int = 1,
+              items: Optional[Callable[..., int]] = None, info: Optional[Callable[..., Dict[str, Any]]] = None):
+    def decorator(setup: Callable[..., Any]):
+        if name in _REGISTRY:
+            raise ValueError(f"重复注册的基准用例: {name}")
+        _REGISTRY[name] = Case(name, setup, params, repeat, number, items, info)
+        return setup
+    return decorator
+
+
+def registered_cases(pattern: Optional[str] = None) -> List[Case]:
+    return [case for name, case in sorted(_REGISTRY.items()) if not pattern or pattern in name]
+
+
+def _digest(value: Any) -> Optional[str]:
+    """被测函数返回值的摘要：同一输入在不同提交间结果变化时一目了然。"""
+    if value is None:
+        return None
+    return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()[:12]
+
+
+def _measure(case: Case, params: Dict[str, Any], repeat: int, loop: asyncio.AbstractEventLoop) -> Dict[str, Any]:
+    prepared = case.setup(**params)
+    if inspect.isawaitable(prepared):
+        prepared = loop.run_until_complete(prepared)
+
+    def call():
+        result = None
+        for _ in range(case.number):
+            result = prepared()
+            if inspect.isawaitable(result):
+                result = loop.run_until_complete(result)
+        return result
+
+    result = call()  # 预热，同时取得结果摘要
+    timings = []
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) / case.number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    median = statistics.median(timings)
+    entry = {
+        'name': case.name,
+        'params': params,
+        'repeat': repeat,
+        'number': case.number,
+        'min_ms': round(min(timings) * 1000, 4),
+        'median_ms': round(median * 1000, 4),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 4),
+        'stdev_ms': round(statistics.stdev(timings) * 1000, 4) if len(timings) > 1 else 0.0,
+        'result_digest': _digest(result),
+    }
+    if case.items is not None:
+        entry['items'] = case.items(**params)
+        entry['items_per_second'] = round(entry['items'] / median, 1) if median > 0 else None
+    if case.info is not None:
+        entry['info'] = case.info(**params)
+    return entry
+
+
+def run_cases(cases: List[Case], repeat: Optional[int] = None, quick: bool = False,
+              progress: Callable[[Dict[str, Any]], None] = lambda entry: None) -> List[Dict[str, Any]]:
+    """依次运行用例。被测代码中的调试输出 (print) 在计时期间被丢弃，避免终端 I/O 计入耗时。"""
+    results = []
+    for case in cases:
+        case_repeat = repeat or (max(3, case.repeat // 5) if quick else case.repeat)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            for params in case.params:
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    entry = _measure(case, params, case_repeat, loop)
+                results.append(entry)
+                progress(entry)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': _git_commit(),
+        'argv': sys.argv[1:],
+    }
+
+
+def result_key(entry: Dict[str, Any]) -> str:
+    params = ", ".join(f"{k}={v}" for k, v in sorted(entry['params'].items()))
+    return f"{entry['name']}[{params}]"
+
+
+def compare(current: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    按最快一次的耗时与基线逐项对比 (比中位数更少受到调度抖动的影响)，返回变化比例；
+    ratio > 1 + threshold 的条目标记为回退。
+    """
+    if baseline.get('schema') != SCHEMA_VERSION:
+        raise ValueError(f"基线文件的格式版本 {baseline.get('schema')} 与当前版本 {SCHEMA_VERSION} 不一致。")
+    previous = {result_key(entry): entry for entry in baseline.get('results', [])}
+    rows = []
+    for entry in current:
+        old = previous.get(result_key(entry))
+        if old is None or not old['min_ms']:
+            continue
+        ratio = entry['min_ms'] / old['min_ms']
+        rows.append({
+            'key': result_key(entry),
+            'baseline_ms': old['min_ms'],
+            'current_ms': entry['min_ms'],
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1 + threshold,
+            'result_changed': old.get('result_digest') != entry.get('result_digest'),
+        })
+    return rows
@@ -0,0 +1,83 @@
+# backend/benchmarks/parity.py
+"""
+向量化筛选引擎与逐币种参考实现的一致性校验，输入由固定种子随机生成 (币种数、K 线长度、缺失的相对 K 线、
+放量、黑名单和筛选参数都随机变化)，两种方法各运行 --trials 次，任何一次结果不一致即以非零状态退出：
+
+    python -m benchmarks.parity                  # 默认 400 次
+    python -m benchmarks.parity --trials 2000 --seed 7
+"""
+import argparse
+import contextlib
+import io
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# 将 backend 目录添加到 Python 的模块搜索路径中
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.logic.rebalance_logic import screen_coins_advanced, screen_coins_reference  # noqa: E402
+from app.models.schemas import RebalanceCriteria  # noqa: E402
+from benchmarks.cases import synthetic_coin_data  # noqa: E402
+
+METHODS = ('multi_factor_weakest', 'foam')
+
+
+def random_case(rng: np.random.Generator, method: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any], List[str]]:
+    criteria = RebalanceCriteria(
+        method=method,
+        top_n=int(rng.integers(1, 60)),
+        min_volume_usd=0,
+        abs_momentum_days=int(rng.integers(1, 60)),
+        rel_strength_days=int(rng.integers(1, 90)),
+        foam_days=int(rng.integers(1, 10)),
+        rebalance_volume_ma_days=int(rng.integers(1, 30)),
+        rebalance_volume_spike_ratio=float(rng.uniform(1.5, 5.0)),
+    ).model_dump()
+    days = max(criteria['abs_momentum_days'], criteria['rel_strength_days'], criteria['foam_days'],
+               criteria['rebalance_volume_ma_days']) + int(rng.integers(1, 10))
+    coin_data = synthetic_coin_data(int(rng.integers(1, 300)), days, seed=int(rng.integers(2 ** 32)))
+    for data in coin_data:
+        # 部分币种上线时间较短 (K 线不足某些窗口)，约 10% 没有相对 K 线
+        if rng.random() < 0.2:
+            data['usdt_klines'] = data['usdt_klines'][int(rng.integers(1, days)):]
+        if rng.random() < 0.2:
+            data['btc_klines'] = data['btc_klines'][int(rng.integers(1, days)):]
+        if rng.random() < 0.1:
+            data['btc_klines'] = []
+    blacklist = [d['symbol'].lower() for d in coin_data if rng.random() < 0.05]
+    return coin_data, criteria, blacklist
+
+
+def run(trials: int, seed: int) -> int:
+    rng = np.random.default_rng(seed)
+    mismatches = 0
+    for trial in range(trials):
+        for method in METHODS:
+            coin_data, criteria, blacklist = random_case(rng, method)
+            # 参考实现会逐个打印被放量过滤剔除的币种
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = screen_coins_reference(coin_data, criteria, blacklist)
+                actual = screen_coins_advanced(coin_data, criteria, blacklist)
+            if actual != expected:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"不一致: 第 {trial} 次 {method}, {len(coin_data)} 个币种, 参数 {criteria}\n"
+                          f"  参考实现: {expected}\n  向量化:   {actual}")
+    print(f"{trials} 次 x {len(METHODS)} 种方法，不一致 {mismatches} 次。")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.parity", description="校验向量化筛选与参考实现的一致性")
+    parser.add_argument('--trials', type=int, default=400, help="每种方法的随机用例数 (默认 400)")
+    parser.add_argument('--seed', type=int, default=20240101, help="随机种子")
+    args = parser.parse_args()
+    if run(args.trials, args.seed):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
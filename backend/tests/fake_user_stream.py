@@ -0,0 +1,79 @@
+# backend/tests/fake_user_stream.py
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+RECORDED_FRAMES = Path(__file__).resolve().parent / "fixtures" / "order_trade_update.jsonl"
+
+
+def load_frames(path: Path = RECORDED_FRAMES) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class FakeUserStreamServer:
+    """
+    本地的用户数据流 WebSocket 服务，按订单号回放录制的 ORDER_TRADE_UPDATE 帧。
+    UserDataStream 的 ws_base_url 指向 base_url 即可连接；drop() 断开当前连接，
+    accepting=False 时拒绝重连 (模拟数据流中断)。
+    """
+
+    def __init__(self, frames: Optional[List[Dict[str, Any]]] = None):
+        self.frames = frames if frames is not None else load_frames()
+        self.accepting = True
+        self.connections = 0
+        self._sockets: List[web.WebSocketResponse] = []
+        self._connected = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/ws/{listen_key}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}/ws/"
+
+    async def stop(self):
+        await self.drop()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        if not self.accepting:
+            return web.Response(status=503)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self._sockets.append(ws)
+        self._connected.set()
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.ERROR:
+                break
+        return ws
+
+    async def wait_connected(self, timeout: float = 5.0):
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    async def replay(self, order_id: int, statuses: Optional[List[str]] = None):
+        """按录制顺序推送该订单的帧，statuses 不为空时只推送其中状态 (字段 X) 的帧。"""
+        for frame in self.frames:
+            order = frame.get("o", {})
+            if order.get("i") != order_id or (statuses is not None and order.get("X") not in statuses):
+                continue
+            for ws in self._sockets:
+                if not ws.closed:
+                    await ws.send_str(json.dumps(frame))
+
+    async def drop(self):
+        self._connected.clear()
+        sockets, self._sockets = self._sockets, []
+        for ws in sockets:
+            await ws.close()
@@ -0,0 +1,29 @@
+# backend/tests/test_rate_limiter.py
+import asyncio
+import contextlib
+import time
+
+from app.core.work_scheduler import WorkClass, work_class
+from app.logic.rate_limiter import PRIORITY_DEFAULT, WeightRateLimiter
+
+
+def test_queued_requests_are_served_by_work_class():
+    """同一优先级的排队请求按工作类别放行：平仓/撤单 (RISK) 先于挂止盈止损 (PROTECT) 和开仓。"""
+    async def run():
+        limiter = WeightRateLimiter()
+        # 暂停放行，让所有请求都进入队列
+        limiter._blocked_until = time.time() + 0.05
+        served = []
+
+        async def request(name, cls):
+            with work_class(cls) if cls is not None else contextlib.nullcontext():
+                await limiter.acquire(1, PRIORITY_DEFAULT)
+            served.append(name)
+
+        await asyncio.gather(request('open', WorkClass.OPEN), request('none', None),
+                             request('protect', WorkClass.PROTECT), request('risk', WorkClass.RISK))
+        return served
+
+    # 不在调度器中发起的请求与开仓同级，按到达顺序排在开仓之后
+    assert asyncio.run(run()) == ['risk', 'protect', 'open', 'none']
+
@@ -0,0 +1,53 @@
+# backend/tests/test_screening_engine.py
+import contextlib
+import io
+
+import numpy as np
+
+from app.logic import screening_engine
+from app.logic.rebalance_logic import screen_coins_advanced, screen_coins_reference
+from benchmarks.cases import synthetic_kline_arrays
+from benchmarks.parity import METHODS, random_case
+
+
+def test_vectorized_screening_matches_reference():
+    """向量化筛选与逐币种参考实现的结果 (包括并列时的顺序) 完全一致。"""
+    rng = np.random.default_rng(20240101)
+    for trial in range(100):
+        for method in METHODS:
+            coin_data, criteria, blacklist = random_case(rng, method)
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = screen_coins_reference(coin_data, criteria, blacklist)
+                actual = screen_coins_advanced(coin_data, criteria, blacklist)
+            assert actual == expected, (trial, method, criteria)
+
+
+def _relative_klines(klines: np.ndarray, benchmark: np.ndarray) -> list:
+    """原实现：逐根 K 线按时间戳匹配基准，基准 OHLC 均大于 1e-8 时按字段相除。"""
+    bench = {row[0]: row for row in benchmark.T.tolist()}
+    rows = []
+    for row in klines.T.tolist():
+        match = bench.get(row[0])
+        if match and all(v > 1e-8 for v in match[1:5]):
+            rows.append([row[0]] + [row[j] / match[j] for j in range(1, 5)] + [row[5]])
+    return rows
+
+
+def test_relative_panel_matches_per_candle_synthesis():
+    """基准缺少部分 K 线 (或价格为 0) 时，相对面板仍与逐根匹配合成的 K 线一致。"""
+    rng = np.random.default_rng(7)
+    klines_list, benchmark = synthetic_kline_arrays(80, 120, seed=7)
+    klines_list = [k[:, int(rng.integers(0, 110)):] for k in klines_list]
+    klines_list[3] = None
+    benchmark = benchmark[:, rng.random(benchmark.shape[1]) > 0.05]
+    benchmark[1:5, rng.random(benchmark.shape[1]) < 0.02] = 0.0
+
+    for width in (1, 8, 61, 200):
+        actual = screening_engine.relative_panel(klines_list, benchmark, width)
+        expected = screening_engine.KlinePanel.from_klines(
+            [_relative_klines(k, benchmark) if k is not None else None for k in klines_list], width)
+        np.testing.assert_allclose(actual.open, expected.open, rtol=1e-12)
+        np.testing.assert_allclose(actual.close, expected.close, rtol=1e-12)
+        short = expected.lengths < width
+        assert (actual.lengths[short] == expected.lengths[short]).all()
+        assert (actual.lengths[~short] >= width).all()
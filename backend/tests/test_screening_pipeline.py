@@ -0,0 +1,40 @@
+# backend/tests/test_screening_pipeline.py
+import numpy as np
+
+from app.logic import screening_engine, screening_pipeline
+from app.logic.screening_pipeline import ScreeningInputs, rank_screening_inputs
+
+_DAY_MS = 24 * 3600 * 1000
+
+
+def _klines(days: int, last_open_ms: int) -> np.ndarray:
+    ts = last_open_ms - np.arange(days)[::-1] * _DAY_MS
+    close = np.linspace(100.0, 50.0, days)
+    volume = np.full(days, 1000.0)
+    # 最后一根是收盘后刚开始的当日 K 线，成交量接近为零
+    volume[-1] = 1.0
+    return np.vstack([ts, close, close, close, close, volume])
+
+
+def test_ranking_ignores_in_progress_daily_candle(monkeypatch):
+    """日线收盘后 60 秒的快照只用已收盘的 K 线排名，新鲜度中的最后一根 K 线也是已收盘的那根。"""
+    as_of = 1_700_006_400.0 + 60  # UTC 0 点后 60 秒
+    today_ms = 1_700_006_400_000
+    klines = {base: _klines(40, today_ms) for base in ('AAA', 'BBB')}
+    inputs = ScreeningInputs(frozenset(klines), 0, 30, [('AAA', 1e9), ('BBB', 1e9)], klines,
+                             {'BTC': _klines(40, today_ms)}, as_of=as_of)
+    assert inputs.last_candle_ms == today_ms - _DAY_MS
+
+    ranked = []
+    screen = screening_engine.screen_coin_arrays
+
+    def spy(symbols, klines_list, benchmark, *args, **kwargs):
+        ranked.append([int(k[0, -1]) for k in klines_list] + [int(benchmark[0, -1])])
+        return screen(symbols, klines_list, benchmark, *args, **kwargs)
+
+    monkeypatch.setattr(screening_pipeline.screening_engine, 'screen_coin_arrays', spy)
+    criteria = {'method': 'multi_factor_weakest', 'top_n': 5, 'min_volume_usd': 0, 'abs_momentum_days': 10,
+                'rel_strength_days': 10, 'foam_days': 3, 'rebalance_volume_ma_days': 5,
+                'rebalance_volume_spike_ratio': 2.0, 'benchmark': 'BTC'}
+    rank_screening_inputs(inputs, criteria, [], verbose=False)
+    assert ranked == [[today_ms - _DAY_MS] * 3]
@@ -0,0 +1,98 @@
+# backend/tests/test_user_stream.py
+import asyncio
+
+from app.core import user_stream
+from app.core.exchange_manager import exchange_pool
+from app.core.user_stream import UserDataStream
+from app.logic import exchange_logic_async
+from app.logic.exchange_logic_async import _wait_for_order_fill_async
+from app.logic.order_events import OrderEventHub
+from tests.fake_user_stream import FakeUserStreamServer
+
+SYMBOL = 'BTC/USDT:USDT'
+FILLED_ORDER = 8389765  # 录制中分两笔成交的订单
+OPEN_ORDER = 8389766  # 录制中挂出后一直未成交的订单
+
+
+class RestExchange:
+    """只实现 fetch_order 的交易所，记录 REST 查单次数。"""
+
+    def __init__(self, status: str):
+        self.status = status
+        self.fetches = 0
+
+    async def fetch_order(self, order_id, symbol):
+        self.fetches += 1
+        return {'id': order_id, 'symbol': symbol, 'status': self.status}
+
+
+def run_with_stream(monkeypatch, scenario):
+    """启动本地回放服务和指向它的 UserDataStream，等连接建立后运行 scenario(server, hub)。"""
+    monkeypatch.setattr(user_stream, 'load_settings', lambda: {})
+
+    async def run():
+        server = FakeUserStreamServer()
+        await server.start()
+        hub = OrderEventHub()
+        monkeypatch.setattr(exchange_logic_async, 'order_event_hub', hub)
+
+        async def listen_key():
+            return "replay"
+
+        stream = UserDataStream(hub, ws_base_url=server.base_url, listen_key_factory=listen_key,
+                                reconnect_delay=0.05, max_reconnect_delay=0.05)
+        await stream.start()
+        try:
+            await server.wait_connected()
+            while not hub.connected:
+                await asyncio.sleep(0.01)
+            return await scenario(server, hub)
+        finally:
+            await stream.stop()
+            await server.stop()
+            await exchange_pool.close()
+
+    return asyncio.run(run())
+
+
+def _wait(exchange: RestExchange, order_id: int, timeout: float) -> asyncio.Task:
+    return asyncio.create_task(
+        _wait_for_order_fill_async(exchange, str(order_id), SYMBOL, timeout, asyncio.Event()))
+
+
+def test_maker_wait_resolves_on_pushed_fill(monkeypatch):
+    """推送的 FILLED 帧直接结束等待，不需要 REST 查单。"""
+    async def scenario(server, hub):
+        exchange = RestExchange('open')
+        wait = _wait(exchange, FILLED_ORDER, 5.0)
+        await asyncio.sleep(0.05)
+        await server.replay(FILLED_ORDER)
+        return await asyncio.wait_for(wait, 2.0), exchange.fetches
+
+    assert run_with_stream(monkeypatch, scenario) == (True, 0)
+
+
+def test_maker_wait_times_out_without_fill(monkeypatch):
+    """订单一直没有进入终态时等待到超时，并在撤单前用一次 REST 查单确认。"""
+    async def scenario(server, hub):
+        exchange = RestExchange('open')
+        wait = _wait(exchange, OPEN_ORDER, 1.5)
+        await asyncio.sleep(0.05)
+        await server.replay(OPEN_ORDER)
+        return await wait, exchange.fetches
+
+    assert run_with_stream(monkeypatch, scenario) == (False, 1)
+
+
+def test_maker_wait_falls_back_to_rest_when_stream_drops(monkeypatch):
+    """数据流断开且无法重连时，等待中的订单改用 REST 轮询确认成交。"""
+    async def scenario(server, hub):
+        exchange = RestExchange('closed')
+        wait = _wait(exchange, FILLED_ORDER, 5.0)
+        await asyncio.sleep(0.05)
+        server.accepting = False
+        await server.drop()
+        filled = await asyncio.wait_for(wait, 3.0)
+        return filled, exchange.fetches >= 1, hub.connected
+
+    assert run_with_stream(monkeypatch, scenario) == (True, True, False)
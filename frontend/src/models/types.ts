@@ -32,6 +32,11 @@ export interface RebalancePlan {
     percentage: number
   }[]
   error?: string
+  screening_source?: string
+  screened_at?: number
+  data_as_of?: number
+  data_age_seconds?: number
+  last_candle_time?: number
 }
 
 export interface ProgressState {
@@ -41,12 +46,15 @@ export interface ProgressState {
   task_name: string
   show: boolean
   is_final: boolean
+  task_id?: string | null
+  concurrency?: number | null
 }
 
 export interface UserSettings {
   api_key: string
   api_secret: string
   use_testnet: boolean
+  exchange_mode: 'live' | 'simulated'
   enable_proxy: boolean
   proxy_url: string
   leverage: number
@@ -76,6 +84,7 @@ export interface UserSettings {
   // --- 新增字段 ---
   rebalance_volume_ma_days: number
   rebalance_volume_spike_ratio: number
+  rebalance_benchmark: string
 }
 
 export interface RebalanceCriteria {
@@ -88,4 +97,5 @@ export interface RebalanceCriteria {
   // --- 新增字段 ---
   rebalance_volume_ma_days: number
   rebalance_volume_spike_ratio: number
+  benchmark: string
 }
@@ -10,6 +10,7 @@ const defaultSettings: UserSettings = {
   api_key: '',
   api_secret: '',
   use_testnet: true,
+  exchange_mode: 'live',
   enable_proxy: false,
   proxy_url: 'http://127.0.0.1:7890',
   leverage: 20,
@@ -36,6 +37,7 @@ const defaultSettings: UserSettings = {
   rebalance_abs_momentum_days: 30,
   rebalance_rel_strength_days: 60,
   rebalance_foam_days: 1,
+  rebalance_benchmark: 'BTC',
 }
 
 export const useSettingsStore = defineStore('settings', () => {
@@ -24,6 +24,8 @@ export const useUiStore = defineStore('ui', () => {
   const statusMessage = ref('初始化中...')
   const isRunning = ref(false)
   const isStopping = ref(false)
+  // 进度条跟随的任务 (最近一次从本页面启动的任务)；后端可同时运行多个任务
+  const trackedTaskId = ref<string | null>(null)
 
   const progress = ref<ProgressState>({
     success_count: 0,
@@ -67,18 +69,12 @@ export const useUiStore = defineStore('ui', () => {
 
   // (其他函数保持不变)
   function launchTask(endpoint: string, payload: any, taskName: string, totalTasks: number) {
-    if (isRunning.value) {
-      logStore.addLog({
-        message: '已有任务在运行中，请稍后再试。',
-        level: 'warning',
-        timestamp: new Date().toLocaleTimeString(),
-      })
-      return
-    }
+    // 不同任务可以同时运行 (后端按币种加锁)，是否接受由后端决定
     const requestId = `req-${Date.now()}-${Math.floor(Math.random() * 1e6)}`
     const payloadWithId = { ...payload, request_id: requestId }
 
     setStatus(`正在提交: ${taskName}...`, true)
+    trackedTaskId.value = null
     updateProgress({
       success_count: 0,
       failed_count: 0,
@@ -96,6 +92,7 @@ export const useUiStore = defineStore('ui', () => {
       .post(endpoint, payloadWithId)
       .then((response) => {
         console.log('API call successful:', response.data.message)
+        trackedTaskId.value = response.data.task_id ?? null
       })
       .catch((error) => {
         const errorMsg = error.response?.data?.detail || error.message
@@ -127,6 +124,7 @@ export const useUiStore = defineStore('ui', () => {
 
   function updateProgress(data: Omit<ProgressState, 'show'>) {
     if (isStopping.value) return
+    if (data.task_id && trackedTaskId.value && data.task_id !== trackedTaskId.value) return
     clearTimeout(progressResetTimer)
     progress.value = { ...data, show: true }
 
@@ -149,6 +147,7 @@ export const useUiStore = defineStore('ui', () => {
 
       if (is_running && progressData && typeof progressData.total !== 'undefined') {
         isRunning.value = true
+        trackedTaskId.value = progressData.task_id ?? null
         statusMessage.value = `正在执行: ${progressData.task_name}...`
         progress.value = {
           success_count: progressData.success_count || 0,